@@ -0,0 +1,535 @@
+#   Copyright 2026 hidenorly
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import sys
+import os
+import argparse
+import random
+import subprocess
+import time
+import glob
+import json
+import datetime
+import platform
+import tempfile
+
+import get_tozanguchi
+from get_tozanguchi import PrefixIndex
+from get_tozanguchi import SubstringIndex
+from get_tozanguchi import MountainDetailInfo
+from get_tozanguchi import MountainFilterUtil
+from get_tozanguchi import MountainMatcher
+from get_tozanguchi import TozanguchiCache
+from get_tozanguchi import ParkRecord
+from tozanguchi_http import HttpUtil
+from tozanguchi_parser import TozanguchiParser
+from tozanguchi_cache_store import ParkCacheStore, JsonDirParkCacheStore, SqliteParkCacheStore
+
+
+class BenchUtil:
+  # [{"name":str, "scale":int, "msec":float}] to output as json
+  results = []
+
+  @staticmethod
+  def measure(func, repeat = 5):
+    result = None
+    for i in range(repeat):
+      start = time.perf_counter()
+      func()
+      elapsed = time.perf_counter() - start
+      if result == None or elapsed < result:
+        result = elapsed
+    return result
+
+  @staticmethod
+  def report(name, scale, elapsed, baseline = None):
+    speedup = ""
+    if baseline:
+      speedup = f" (x{baseline/elapsed:.1f})" if elapsed else ""
+    print(f'{name:40} x{scale:<4} {elapsed*1000:10.3f} msec{speedup}')
+    BenchUtil.results.append( {"name": name, "scale": scale, "msec": elapsed*1000} )
+
+  @staticmethod
+  def getCommit():
+    result = None
+    try:
+      result = subprocess.run(["git", "rev-parse", "HEAD"], check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, encoding='utf-8', cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except:
+      result = None
+    return result
+
+  @staticmethod
+  def writeResults(path):
+    with open(path, 'w', encoding='UTF-8') as f:
+      json.dump({
+        "commit": BenchUtil.getCommit(),
+        "date": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "results": BenchUtil.results
+      }, f, indent = 2, ensure_ascii=False)
+
+  # returns False if any result is slower than the baseline result by the ratio
+  @staticmethod
+  def compareResults(baselinePath, ratio):
+    result = True
+    with open(baselinePath, 'r', encoding='UTF-8') as f:
+      baseline = json.load(f)
+    baselineResults = {}
+    for aResult in baseline.get("results", []):
+      baselineResults[ (aResult["name"], aResult["scale"]) ] = aResult["msec"]
+    print(f'compared with {baseline.get("commit")} ({baseline.get("date")})')
+    for aResult in BenchUtil.results:
+      key = (aResult["name"], aResult["scale"])
+      if key in baselineResults and baselineResults[key]:
+        _ratio = aResult["msec"] / baselineResults[key]
+        print(f'{aResult["name"]:40} x{aResult["scale"]:<4} {baselineResults[key]:10.3f} -> {aResult["msec"]:10.3f} msec (x{_ratio:.2f})')
+        if _ratio > ratio:
+          print(f'REGRESSION: {aResult["name"]} x{aResult["scale"]} is slower than the baseline by x{_ratio:.2f}', file=sys.stderr)
+          result = False
+    return result
+
+
+class SyntheticCatalogue:
+  # the real keys have the suffix of _2 and so on, then the scaled keys use the suffix which can't be in the real keys
+  SCALED_KEY_SEPARATOR = "#bench"
+
+  @staticmethod
+  def getScaledKey(aKey, i):
+    return f'{aKey}{SyntheticCatalogue.SCALED_KEY_SEPARATOR}{i}'
+
+  @staticmethod
+  def getScaledKeys(keys, scale):
+    result = list(keys)
+    for i in range(2, scale+1):
+      for aKey in keys:
+        result.append( SyntheticCatalogue.getScaledKey(aKey, i) )
+    return result
+
+  @staticmethod
+  def getQueries(keys, numOfQueries = 300, seed = 1):
+    rand = random.Random(seed)
+    result = []
+    keys = list(keys)
+    if keys:
+      for i in range(numOfQueries):
+        aKey = rand.choice(keys)
+        result.append( aKey[0:rand.randint(1, len(aKey))] )
+    return result
+
+  # the same order as getScaledKeys
+  @staticmethod
+  def getScaledTozanguchiDic(dic, scale):
+    result = dict( dic )
+    for i in range(2, scale+1):
+      for aMountain, tozanguchis in dic.items():
+        result[ SyntheticCatalogue.getScaledKey(aMountain, i) ] = { aTozanguchi: SyntheticCatalogue.getScaledKey(theUrl, i) for aTozanguchi, theUrl in tozanguchis.items() }
+    assert len(result) == len(dic) * scale
+    return result
+
+  @staticmethod
+  def getScaledMountainInfoDic(dic, scale):
+    result = dict( dic )
+    for i in range(2, scale+1):
+      for aMountain, info in dic.items():
+        result[ SyntheticCatalogue.getScaledKey(aMountain, i) ] = info
+    assert len(result) == len(dic) * scale
+    return result
+
+  # the park info as the parser outputs
+  @staticmethod
+  def getParkInfo(i, mountainName):
+    return {
+      "登山口名": f'{mountainName}登山口{i}',
+      "主要登山ルート": f'{mountainName}（往復所要時間：{i%5+2}時間{(i*7)%60}分）{mountainName}別ルート（往復所要時間：{100+i%200}分）',
+      "駐車台数": f'約{i%50}台',
+      "緯度経度": f'{33+(i%1000)/250:.4f} {132+(i//1000%1000)/100:.4f}',
+      "トイレ": "あり"
+    }
+
+  # returns {cache key:record} of the urls
+  @staticmethod
+  def getParkRecords(urlsAndMountains):
+    result = {}
+    now = time.time()
+    for i, (theUrl, aMountain) in enumerate(urlsAndMountains):
+      data = SyntheticCatalogue.getParkInfo(i, aMountain.split(SyntheticCatalogue.SCALED_KEY_SEPARATOR)[0])
+      result[ TozanguchiCache.getCacheFilename(theUrl) ] = ParkCacheStore.getRecord(data, now, now + TozanguchiCache.CACHE_EXPIRE_HOURS * 3600, None, None, ParkRecord.getDigest(data))
+    return result
+
+  @staticmethod
+  def getUrlsAndMountains(dic):
+    result = []
+    for aMountain, tozanguchis in dic.items():
+      for aTozanguchi, theUrl in tozanguchis.items():
+        result.append( (theUrl, aMountain) )
+    return result
+
+  @staticmethod
+  def writeParkCache(cacheDir, records, backend):
+    if backend == TozanguchiCache.CACHE_BACKEND_JSON:
+      store = JsonDirParkCacheStore(cacheDir, TozanguchiCache.CACHE_EXPIRE_HOURS)
+    else:
+      if not os.path.exists(cacheDir):
+        os.makedirs(cacheDir)
+      store = SqliteParkCacheStore(os.path.join(cacheDir, TozanguchiCache.CACHE_DB_FILENAME))
+    store.putAll(records)
+    store.close()
+
+
+class MountainKeysBenchmark:
+  @staticmethod
+  def getMountainKeysLinear(keys, key):
+    result = []
+    for dicKey in keys:
+      if dicKey.startswith(key):
+        result.append( dicKey )
+    return result
+
+  @staticmethod
+  def run(keys, scales, repeat):
+    for aScale in scales:
+      _keys = SyntheticCatalogue.getScaledKeys(keys, aScale)
+      queries = SyntheticCatalogue.getQueries(_keys)
+      index = PrefixIndex(_keys)
+      for aQuery in queries:
+        if index.getKeysWithPrefix(aQuery) != MountainKeysBenchmark.getMountainKeysLinear(_keys, aQuery):
+          print(f'mismatch: {aQuery}', file=sys.stderr)
+          exit(-1)
+      linear = BenchUtil.measure(lambda: [MountainKeysBenchmark.getMountainKeysLinear(_keys, aQuery) for aQuery in queries], repeat)
+      indexed = BenchUtil.measure(lambda: [index.getKeysWithPrefix(aQuery) for aQuery in queries], repeat)
+      build = BenchUtil.measure(lambda: PrefixIndex(_keys), repeat)
+      BenchUtil.report("getMountainKeys (linear scan)", aScale, linear)
+      BenchUtil.report("getMountainKeys (prefix index)", aScale, indexed, linear)
+      BenchUtil.report("PrefixIndex build", aScale, build)
+
+
+class MountainDetailInfoBenchmark:
+  @staticmethod
+  def findFirstLinear(keys, value):
+    for i, aKey in enumerate(keys):
+      if aKey.find(value)!=-1:
+        return i
+    return -1
+
+  @staticmethod
+  def getQueries(keys, numOfQueries = 300, seed = 1):
+    rand = random.Random(seed)
+    result = []
+    keys = list(keys)
+    if keys:
+      for i in range(numOfQueries):
+        aKey = rand.choice(keys)
+        start = rand.randint(0, len(aKey)-1)
+        result.append( aKey[start:rand.randint(start+1, len(aKey))] )
+    return result
+
+  @staticmethod
+  def run(keys, scales, repeat):
+    for aScale in scales:
+      _keys = SyntheticCatalogue.getScaledKeys(keys, aScale)
+      queries = MountainDetailInfoBenchmark.getQueries(_keys) + ["存在しない山"]
+      index = SubstringIndex(_keys)
+      for aQuery in queries:
+        if index.findFirst(aQuery) != MountainDetailInfoBenchmark.findFirstLinear(_keys, aQuery):
+          print(f'mismatch: {aQuery}', file=sys.stderr)
+          exit(-1)
+      linear = BenchUtil.measure(lambda: [MountainDetailInfoBenchmark.findFirstLinear(_keys, aQuery) for aQuery in queries], repeat)
+      indexed = BenchUtil.measure(lambda: [index.findFirst(aQuery) for aQuery in queries], repeat)
+      build = BenchUtil.measure(lambda: SubstringIndex(_keys), repeat)
+      BenchUtil.report("getMountainDetailInfo (linear find)", aScale, linear)
+      BenchUtil.report("getMountainDetailInfo (bigram index)", aScale, indexed, linear)
+      BenchUtil.report("SubstringIndex build", aScale, build)
+
+
+class MountainFilterBenchmark:
+  @staticmethod
+  def run(keys, scales, repeat, workDir):
+    MountainMatcher.CACHE_DIR = os.path.join(workDir, "matcher")
+    for aScale in scales:
+      _keys = SyntheticCatalogue.getScaledKeys(keys, aScale)
+      # the climbed list of the every 10th mountains
+      csvPath = os.path.join(workDir, f'climbed{aScale}.lst')
+      with open(csvPath, 'w', encoding='UTF-8') as f:
+        f.write( "\n".join( _keys[::10] ) + "\n" )
+      def filterCold():
+        MountainMatcher.matchers = {}
+        MountainFilterUtil.csvSets = {}
+        for aPath in glob.glob(os.path.join(MountainMatcher.CACHE_DIR, "*.pickle")):
+          os.remove(aPath)
+        MountainFilterUtil.mountainsIncludeExcludeFromFile( set(_keys), [csvPath], [] )
+      cold = BenchUtil.measure(filterCold, repeat)
+      MountainFilterUtil.mountainsIncludeExcludeFromFile( set(_keys), [csvPath], [] )
+      warm = BenchUtil.measure(lambda: MountainFilterUtil.mountainsIncludeExcludeFromFile( set(_keys), [csvPath], [] ), repeat)
+      BenchUtil.report("mountainsIncludeExcludeFromFile (cold)", aScale, cold)
+      BenchUtil.report("mountainsIncludeExcludeFromFile (warm)", aScale, warm, cold)
+
+
+class ParkCacheBenchmark:
+  DEFAULT_CACHE_SIZES = [10000]
+  NUM_OF_QUERIES = 1000
+
+  @staticmethod
+  def useCacheDir(cacheDir, backend):
+    TozanguchiCache.setBackend(backend)
+    if TozanguchiCache.store != None:
+      TozanguchiCache.store.close()
+    TozanguchiCache.store = None
+    TozanguchiCache.records = None
+    TozanguchiCache.CACHE_BASE_DIR = cacheDir
+
+  @staticmethod
+  def run(cacheSizes, repeat, workDir):
+    originalDir = TozanguchiCache.CACHE_BASE_DIR
+    originalBackend = TozanguchiCache.CACHE_BACKEND
+    try:
+      for aSize in cacheSizes:
+        urlsAndMountains = [ (f'https://tozanguchinavi.com/trailhead/trailhead{i}', f'山{i%3000}') for i in range(aSize) ]
+        records = SyntheticCatalogue.getParkRecords(urlsAndMountains)
+        urls = [ theUrl for theUrl, aMountain in random.Random(1).sample(urlsAndMountains, min(aSize, ParkCacheBenchmark.NUM_OF_QUERIES)) ]
+        # the number of the entries is reported as the scale
+        scale = aSize
+        for aBackend in [TozanguchiCache.CACHE_BACKEND_JSON, TozanguchiCache.CACHE_BACKEND_SQLITE]:
+          cacheDir = os.path.join(workDir, f'parkCache_{aBackend}_{aSize}')
+          start = time.perf_counter()
+          SyntheticCatalogue.writeParkCache(cacheDir, records, aBackend)
+          BenchUtil.report(f'park cache write {aBackend}', scale, time.perf_counter() - start)
+          def restore():
+            ParkCacheBenchmark.useCacheDir(cacheDir, aBackend)
+            for theUrl in urls:
+              if TozanguchiCache.getCachedParkInfo(theUrl) == None:
+                print(f'cache miss: {theUrl}', file=sys.stderr)
+                exit(-1)
+          def loadAll():
+            ParkCacheBenchmark.useCacheDir(cacheDir, aBackend)
+            TozanguchiCache.loadAllCache()
+          BenchUtil.report(f'park cache restore {len(urls)} {aBackend}', scale, BenchUtil.measure(restore, repeat))
+          BenchUtil.report(f'park cache loadAllCache {aBackend}', scale, BenchUtil.measure(loadAll, repeat))
+    finally:
+      ParkCacheBenchmark.useCacheDir(originalDir, originalBackend)
+
+
+# the whole main path of get_tozanguchi.py on the synthetic catalogue and park cache
+class EndToEndBenchmark:
+  NUM_OF_MOUNTAINS = 10
+  LAUNCHER = "import sys, runpy; sys.path[0:0] = [sys.argv[1], sys.argv[2]]; script = sys.argv[3]; sys.argv = sys.argv[3:]; runpy.run_path(script, run_name='__main__')"
+
+  @staticmethod
+  def writeDictionaries(dataDir, tozanguchiDic, mountainInfoDic):
+    with open(os.path.join(dataDir, "tozanguchiDic.py"), 'w', encoding='UTF-8') as f:
+      f.write( f'tozanguchiDic={repr(tozanguchiDic)}\n\ndef getTozanguchiDic():\n  return tozanguchiDic\n' )
+    with open(os.path.join(dataDir, "mountainInfoDic.py"), 'w', encoding='UTF-8') as f:
+      f.write( f'mountainInfoDic={repr(mountainInfoDic)}\n\ndef getMountainInfoDic():\n  return mountainInfoDic\n' )
+
+  @staticmethod
+  def execMain(homeDir, dataDir, args):
+    scriptDir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ)
+    env["HOME"] = homeDir
+    subprocess.run([sys.executable, "-c", EndToEndBenchmark.LAUNCHER, dataDir, scriptDir, os.path.join(scriptDir, "get_tozanguchi.py")] + args, check=True, stdout=subprocess.DEVNULL, env=env, cwd=homeDir)
+
+  @staticmethod
+  def run(tozanguchiDic, mountainInfoDic, scales, repeat, workDir):
+    for aScale in scales:
+      homeDir = os.path.join(workDir, f'home{aScale}')
+      dataDir = os.path.join(homeDir, "data")
+      os.makedirs(dataDir)
+      _tozanguchiDic = SyntheticCatalogue.getScaledTozanguchiDic(tozanguchiDic, aScale)
+      EndToEndBenchmark.writeDictionaries(dataDir, _tozanguchiDic, SyntheticCatalogue.getScaledMountainInfoDic(mountainInfoDic, aScale))
+      records = SyntheticCatalogue.getParkRecords( SyntheticCatalogue.getUrlsAndMountains(_tozanguchiDic) )
+      SyntheticCatalogue.writeParkCache(os.path.join(homeDir, ".cache", "tozanguchi"), records, TozanguchiCache.CACHE_BACKEND_SQLITE)
+      mountains = list(_tozanguchiDic.keys())[0:EndToEndBenchmark.NUM_OF_MOUNTAINS]
+      for name, args in [
+          ("get_tozanguchi --listAllCache", ["--listAllCache"]),
+          ("get_tozanguchi --listAllCache --columnar", ["--listAllCache", "--columnar"]),
+          (f'get_tozanguchi {len(mountains)} mountains', mountains),
+          (f'get_tozanguchi {len(mountains)} mountains --compare', mountains + ["--compare"])]:
+        # the first run builds the snapshot and the matcher
+        EndToEndBenchmark.execMain(homeDir, dataDir, args)
+        BenchUtil.report(name, aScale, BenchUtil.measure(lambda: EndToEndBenchmark.execMain(homeDir, dataDir, args), repeat))
+
+
+class ParseBenchmark:
+  PARK_KEYS = ["登山口名", "主要登山ルート", "駐車台数", "緯度経度", "トイレ"]
+  # the saved pages of the equivalence test (tests/test_tozanguchi_parser.py)
+  FIXTURE_DIRS = [ os.path.join(os.path.dirname(os.path.abspath(__file__)), "tests", "fixtures", aDir) for aDir in ["trailhead", "mountains"] ]
+
+  @staticmethod
+  def getSyntheticParkPage(i, name):
+    dts = "".join( [ f'<dt>dummy{j}</dt><dt>{aKey}\n<span>sub</span></dt>' for j, aKey in enumerate(ParseBenchmark.PARK_KEYS) ] )
+    routes = f'{name}（往復所要時間：{i%5+2}時間{(i*7)%60}分）{name}別ルート（往復所要時間：{100+i}分）'
+    values = ["-", f'{name}登山口', routes, f'約{i*3}台', f'35.{i}123 138.{i}456', "あり&nbsp;(&#x6C34;洗)"]
+    dds = "".join( [ f'<dd> {aValue}\n <br>more</dd>' for aValue in values ] )
+    return f'<html><head><script>var a="<dd>";</script></head><body><div class="main"><dl>{dts}</dl><dl>{dds}</dl><img src="x.png"></div></body></html>'
+
+  @staticmethod
+  def getSyntheticListPage(i, numOfMountains = 20):
+    body = []
+    for j in range(numOfMountains):
+      body.append( f'<h3>山{i}_{j}（さん） <small>1000m</small></h3><p class="th_data"><a href="https://example.com/trailhead/trailhead{i*100+j}">登山口{j}</a> <a href="/other">other</a><br><a href=" https://example.com/trailhead/trailhead{i*100+j+1} ">登山口{j}&amp;別</a></p>' )
+    return f'<html><body><nav><a href="/">top</a></nav><article><h2>list</h2>{"".join(body)}</article><article><h3>ignored</h3></article></body></html>'
+
+  @staticmethod
+  def getCorpus(corpusDirs, numOfSyntheticPages = 200):
+    parkPages = []
+    listPages = []
+    for i in range(numOfSyntheticPages):
+      parkPages.append( ParseBenchmark.getSyntheticParkPage(i, f'山{i}') )
+    for i in range(numOfSyntheticPages//20):
+      listPages.append( ParseBenchmark.getSyntheticListPage(i) )
+    for aDir in corpusDirs:
+      for aPath in sorted(glob.glob(os.path.join(aDir, "*.html"))):
+        with open(aPath, 'r', encoding='UTF-8', errors='replace') as f:
+          text = f.read()
+        # saved pages are used for the both since the extractors must be equivalent for any input
+        parkPages.append( text )
+        listPages.append( text )
+    return parkPages, listPages
+
+  # the original extraction raises IndexError for some dt/dd layouts, it must be raised as well
+  @staticmethod
+  def parse(func, page):
+    try:
+      return func(page)
+    except IndexError:
+      return IndexError
+
+  @staticmethod
+  def getMismatches(pages, func, referenceFunc):
+    result = []
+    for i, aPage in enumerate(pages):
+      if ParseBenchmark.parse(func, aPage) != ParseBenchmark.parse(referenceFunc, aPage):
+        result.append(i)
+    return result
+
+  @staticmethod
+  def reportThroughput(name, pages, elapsed, baseline = None):
+    numOfBytes = sum( [ len(aPage.encode('utf-8')) for aPage in pages ] )
+    speedup = f" (x{baseline/elapsed:.1f})" if baseline and elapsed else ""
+    print(f'{name:40} {len(pages)/elapsed:10.1f} pages/sec {numOfBytes/elapsed/1024/1024:8.2f} MB/s{speedup}')
+    BenchUtil.results.append( {"name": name, "scale": 1, "msec": elapsed*1000, "pagesPerSec": len(pages)/elapsed} )
+
+  # serves the pages as the response of HttpUtil.get instead of the network
+  class FixtureResponse:
+    def __init__(self, text):
+      self.text = text
+      self.status_code = 200
+      self.headers = {}
+
+  @staticmethod
+  def getRawParkInfos(pages):
+    result = []
+    originalGet = HttpUtil.get
+    HttpUtil.get = staticmethod(lambda url, etag = None, lastModified = None: ParseBenchmark.FixtureResponse(pages[int(url.rsplit("/", 1)[1])]))
+    try:
+      for i in range(len(pages)):
+        result.append( ParseBenchmark.parse(TozanguchiCache.getRawParkInfo, f'https://fixture/{i}') )
+    finally:
+      HttpUtil.get = originalGet
+    return result
+
+  @staticmethod
+  def run(corpusDirs, repeat):
+    result = True
+    parkPages, listPages = ParseBenchmark.getCorpus(corpusDirs)
+    for name, pages, func, referenceFunc in [
+        ("park page", parkPages, TozanguchiParser.parseParkInfo, TozanguchiParser.parseParkInfoWithSoup),
+        ("list page", listPages, TozanguchiParser.parseArticle, TozanguchiParser.parseArticleWithSoup)]:
+      mismatches = ParseBenchmark.getMismatches(pages, func, referenceFunc)
+      if mismatches:
+        print(f'REGRESSION: {name} extraction differs from BeautifulSoup at {mismatches}', file=sys.stderr)
+        result = False
+      soup = BenchUtil.measure(lambda: [ParseBenchmark.parse(referenceFunc, aPage) for aPage in pages], repeat)
+      streaming = BenchUtil.measure(lambda: [ParseBenchmark.parse(func, aPage) for aPage in pages], repeat)
+      ParseBenchmark.reportThroughput(f'{name} (BeautifulSoup)', pages, soup)
+      ParseBenchmark.reportThroughput(f'{name} (streaming)', pages, streaming, soup)
+    ParseBenchmark.reportThroughput("getRawParkInfo (offline fixture)", parkPages, BenchUtil.measure(lambda: ParseBenchmark.getRawParkInfos(parkPages), repeat))
+    return result
+
+
+class StartupBenchmark:
+  LAZY_MODULES = ["requests", "bs4", "numpy", "tozanguchiDic", "mountainInfoDic"]
+  DEFAULT_BUDGET_MSEC = 100
+
+  @staticmethod
+  def execPython(code):
+    return subprocess.run([sys.executable, "-c", code], check=True, stdout=subprocess.PIPE, encoding='utf-8', cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+
+  @staticmethod
+  def measure(code, repeat):
+    return BenchUtil.measure(lambda: StartupBenchmark.execPython(code), repeat)
+
+  @staticmethod
+  def run(repeat, budgetMsec):
+    result = True
+    # ensure the snapshot is up to date
+    StartupBenchmark.execPython("import get_tozanguchi")
+
+    interpreter = StartupBenchmark.measure("pass", repeat)
+    snapshot = StartupBenchmark.measure("import get_tozanguchi", repeat)
+    legacy = StartupBenchmark.measure("import requests, bs4, tozanguchiDic, mountainInfoDic; tozanguchiDic.getTozanguchiDic(); mountainInfoDic.getMountainInfoDic()", repeat)
+    BenchUtil.report("python startup", 1, interpreter)
+    BenchUtil.report("import (eager requests/bs4/dictionaries)", 1, legacy)
+    BenchUtil.report("import get_tozanguchi (snapshot)", 1, snapshot, legacy)
+
+    loadedModules = StartupBenchmark.execPython(f"import sys, get_tozanguchi; print(' '.join([m for m in {StartupBenchmark.LAZY_MODULES} if m in sys.modules]))").strip()
+    if loadedModules:
+      print(f'REGRESSION: {loadedModules} imported at startup', file=sys.stderr)
+      result = False
+    overhead = (snapshot - interpreter) * 1000
+    if overhead > budgetMsec:
+      print(f'REGRESSION: import overhead {overhead:.1f} msec exceeds the budget {budgetMsec} msec', file=sys.stderr)
+      result = False
+    return result
+
+
+if __name__=="__main__":
+  parser = argparse.ArgumentParser(description='Benchmark tozanguchi lookups')
+  parser.add_argument('-s', '--scale', action='append', type=int, default=[], help='specify catalogue scale e.g. 10')
+  parser.add_argument('-n', '--repeat', action='store', type=int, default=5, help='specify the number of repeat')
+  parser.add_argument('-t', '--target', action='append', default=[], choices=['keys', 'detail', 'filter', 'cache', 'print', 'parse', 'startup'], help='specify benchmark target (default:all)')
+  parser.add_argument('-c', '--corpus', action='append', default=[], help='specify directory of saved *.html pages for parse (default:tests/fixtures)')
+  parser.add_argument('-b', '--budget', action='store', type=float, default=StartupBenchmark.DEFAULT_BUDGET_MSEC, help='specify import time budget msec over python startup')
+  parser.add_argument('-k', '--cacheSize', action='append', type=int, default=[], help=f'specify the number of synthetic park cache entries e.g. 100000 (default:{ParkCacheBenchmark.DEFAULT_CACHE_SIZES})')
+  parser.add_argument('-o', '--output', action='store', default=None, help='specify json file to output the results e.g. bench.json')
+  parser.add_argument('-r', '--baseline', action='store', default=None, help='specify json file of the previous results to compare')
+  parser.add_argument('-x', '--regressionRatio', action='store', type=float, default=1.5, help='specify the ratio to the baseline regarded as regression')
+
+  args = parser.parse_args()
+  scales = args.scale if args.scale else [1, 10, 100]
+  targets = set(args.target) if args.target else set(['keys', 'detail', 'filter', 'cache', 'print', 'parse', 'startup'])
+
+  result = True
+  with tempfile.TemporaryDirectory(prefix="bench_tozanguchi") as workDir:
+    if 'keys' in targets:
+      MountainKeysBenchmark.run( list(get_tozanguchi.tozanguchiDic.keys()), scales, args.repeat )
+    if 'detail' in targets:
+      MountainDetailInfoBenchmark.run( list(MountainDetailInfo.getMountainInfoDic().keys()), scales, args.repeat )
+    if 'filter' in targets:
+      MountainFilterBenchmark.run( list(get_tozanguchi.tozanguchiDic.keys()), scales, args.repeat, workDir )
+    if 'cache' in targets:
+      ParkCacheBenchmark.run( args.cacheSize if args.cacheSize else ParkCacheBenchmark.DEFAULT_CACHE_SIZES, args.repeat, workDir )
+    if 'print' in targets:
+      EndToEndBenchmark.run( dict(get_tozanguchi.tozanguchiDic.items()), MountainDetailInfo.getMountainInfoDic(), scales, args.repeat, workDir )
+    if 'parse' in targets:
+      result = ParseBenchmark.run( args.corpus if args.corpus else ParseBenchmark.FIXTURE_DIRS, args.repeat ) and result
+    if 'startup' in targets:
+      result = StartupBenchmark.run( args.repeat, args.budget ) and result
+
+  if args.output:
+    BenchUtil.writeResults( args.output )
+  if args.baseline:
+    result = BenchUtil.compareResults( args.baseline, args.regressionRatio ) and result
+
+  if not result:
+    exit(1)
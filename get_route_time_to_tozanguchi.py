@@ -13,7 +13,6 @@
 #   limitations under the License.
 
 import sys
-import requests
 import argparse
 import re
 import os
@@ -23,6 +22,13 @@ import glob
 import shlex
 import subprocess
 import time
+import math
+import threading
+import contextvars
+import queue
+import heapq
+import random
+from collections import OrderedDict
 
 from get_tozanguchi import MountainDetailInfo
 from get_tozanguchi import StrUtil
@@ -30,16 +36,13 @@ from get_tozanguchi import TozanguchiCache
 from get_tozanguchi import TozanguchiUtil
 from get_tozanguchi import MountainFilterUtil
 from get_tozanguchi import GeoUtil
+from get_tozanguchi import DataSnapshot
+from get_tozanguchi import TrailheadGeoIndex
+from tozanguchi_stats import Stats
 
-import tozanguchiDic
-import mountainInfoDic
 
-from get_route_time import WebUtil
-from get_route_time import RouteUtil
 
-
-
-tozanguchiDic = tozanguchiDic.getTozanguchiDic()
+tozanguchiDic = DataSnapshot.getTozanguchiDic()
 
 
 
@@ -49,18 +52,41 @@ class GeoCache:
   DEFAULT_CACHE_ID = "geocache"
   CACHE_INFINITE = -1
   DEFAULT_CACHE_EXPIRE_HOURS = 24*30 # 30days
+  # dot files are not matched with the glob of *.json
+  INDEX_FILENAME = ".index.json"
+  INDEX_LOG_FILENAME = ".index.log"
+  INDEX_VERSION = 1
+  MIN_INDEX_LOG_LINES = 1000
+  LAST_UPDATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+  METERS_PER_DEG = 111320.0
 
-  def __init__(self, cacheId = None, expireHour = None, numOfCache = None):
-    self.cacheBaseDir = os.path.join(GeoCache.DEFAULT_CACHE_BASE_DIR, cacheId) if cacheId else JsonCache.DEFAULT_CACHE_ID
-    self.expireHour = expireHour if expireHour else JsonCache.DEFAULT_CACHE_EXPIRE_HOURS
-    self.numOfCache = numOfCache if numOfCache else JsonCache.CACHE_INFINITE
+  # snapPrecision : the number of decimal places of the cache key's latitude and longitude
+  # snapMeters : the tolerance to use the cache of the nearby origin and destination
+  def __init__(self, cacheId = None, expireHour = None, numOfCache = None, snapPrecision = None, snapMeters = 0):
+    self.cacheBaseDir = os.path.join(GeoCache.DEFAULT_CACHE_BASE_DIR, cacheId if cacheId else GeoCache.DEFAULT_CACHE_ID)
+    self.expireHour = expireHour if expireHour else GeoCache.DEFAULT_CACHE_EXPIRE_HOURS
+    self.numOfCache = numOfCache if numOfCache else GeoCache.CACHE_INFINITE
+    self.snapPrecision = snapPrecision
+    self.snapMeters = snapMeters
+    # {filename:[lastAccess, size, lastUpdate, duration_minutes]} in the least recently used order
+    self.index = None
+    self.indexLogLines = 0
+    # {(tag, latCell, lonCell) of the destination:set(filename)} for the tolerance search
+    self.grid = None
+    self.lock = threading.RLock()
 
   def ensureCacheStorage(self):
     if not os.path.exists(self.cacheBaseDir):
       os.makedirs(self.cacheBaseDir)
 
+  def getSnappedValue(self, value):
+    result = value
+    if self.snapPrecision != None:
+      result = f'{float(value):.{self.snapPrecision}f}'
+    return result
+
   def getCacheFilename(self, from_latitude, from_longitude, to_latitude, to_longitude, tag=None):
-    result = f'{from_latitude}_{from_longitude}_{to_latitude}_{to_longitude}'
+    result = f'{self.getSnappedValue(from_latitude)}_{self.getSnappedValue(from_longitude)}_{self.getSnappedValue(to_latitude)}_{self.getSnappedValue(to_longitude)}'
     if tag:
       result = f'{result}_{tag}.json'
     else:
@@ -70,16 +96,185 @@ class GeoCache:
   def getCachePath(self, from_latitude, from_longitude, to_latitude, to_longitude, tag=None):
     return os.path.join(self.cacheBaseDir, self.getCacheFilename(from_latitude, from_longitude, to_latitude, to_longitude, tag))
 
-  def limitNumOfCacheFiles(self):
-    if self.numOfCache!=self.CACHE_INFINITE:
-      files = glob.glob(f'{self.cacheBaseDir}/*.json')
-      files = sorted(files, key=os.path.getmtime, reverse=True)
-      remove_files = files[self.numOfCache:]
-      for aRemoveFile in remove_files:
+  # returns (lat1, lon1, lat2, lon2, tag) from {lat1}_{lon1}_{lat2}_{lon2}_{tag}.json
+  @staticmethod
+  def parseCacheFilename(filename):
+    result = None
+    values = os.path.splitext(filename)[0].split("_")
+    try:
+      result = ( float(values[0]), float(values[1]), float(values[2]), float(values[3]), "_".join(values[4:]) if len(values)>4 else None )
+    except:
+      result = None
+    return result
+
+  @staticmethod
+  def readCacheFile(cachePath):
+    result = None
+    try:
+      with open(cachePath, 'r', encoding='UTF-8') as f:
+        result = json.load(f)
+    except:
+      result = None
+    return result
+
+  @staticmethod
+  def getDurationMinutes(cacheData):
+    data = cacheData.get("data") if cacheData else None
+    return data.get("duration_minutes") if isinstance(data, dict) else None
+
+  # the index entry of the cache file which is not indexed yet
+  def getIndexEntryFromFile(self, filename):
+    result = None
+    cachePath = os.path.join(self.cacheBaseDir, filename)
+    _result = GeoCache.readCacheFile(cachePath)
+    if _result and "lastUpdate" in _result:
+      try:
+        lastUpdate = datetime.strptime(_result["lastUpdate"], GeoCache.LAST_UPDATE_FORMAT).timestamp()
+        stat = os.stat(cachePath)
+        result = [stat.st_mtime, stat.st_size, lastUpdate, GeoCache.getDurationMinutes(_result)]
+      except:
+        result = None
+    return result
+
+  # the index is the snapshot and the appended log of ["put", filename, entry], ["touch", filename, lastAccess] and ["remove", filename]
+  def loadIndex(self):
+    with self.lock:
+      if self.index == None:
+        start = time.perf_counter()
+        index = None
         try:
-          os.remove(aRemoveFile)
+          with open(os.path.join(self.cacheBaseDir, GeoCache.INDEX_FILENAME), 'r', encoding='UTF-8') as f:
+            data = json.load(f)
+          if data.get("version") == GeoCache.INDEX_VERSION:
+            index = OrderedDict( data["entries"] )
         except:
-          pass
+          index = None
+        if index != None:
+          self.indexLogLines = 0
+          try:
+            with open(os.path.join(self.cacheBaseDir, GeoCache.INDEX_LOG_FILENAME), 'r', encoding='UTF-8') as f:
+              for aLine in f:
+                self.indexLogLines = self.indexLogLines + 1
+                try:
+                  GeoCache.applyIndexLog(index, json.loads(aLine))
+                except:
+                  pass
+          except:
+            pass
+        else:
+          # build the index from the existing cache files once
+          index = OrderedDict()
+          entries = []
+          for aPath in glob.glob(f'{self.cacheBaseDir}/*.json'):
+            entry = self.getIndexEntryFromFile( os.path.basename(aPath) )
+            if entry:
+              entries.append( (os.path.basename(aPath), entry) )
+          for filename, entry in sorted( entries, key=lambda x: x[1][0] ):
+            index[filename] = entry
+        self.index = index
+        if not self.indexLogLines:
+          self.compactIndex()
+        Stats.addPhase("route cache index load", time.perf_counter() - start)
+      return self.index
+
+  @staticmethod
+  def applyIndexLog(index, log):
+    if log[0] == "put":
+      index[log[1]] = log[2]
+      index.move_to_end(log[1])
+    elif log[0] == "touch":
+      if log[1] in index:
+        index[log[1]][0] = log[2]
+        index.move_to_end(log[1])
+    elif log[0] == "remove":
+      index.pop(log[1], None)
+
+  def compactIndex(self):
+    if os.path.exists(self.cacheBaseDir):
+      start = time.perf_counter()
+      indexPath = os.path.join(self.cacheBaseDir, GeoCache.INDEX_FILENAME)
+      tmpPath = f'{indexPath}.{os.getpid()}.tmp'
+      with open(tmpPath, 'w', encoding='UTF-8') as f:
+        json.dump({"version":GeoCache.INDEX_VERSION, "entries":list(self.index.items())}, f, ensure_ascii=False)
+      os.replace(tmpPath, indexPath)
+      try:
+        os.remove(os.path.join(self.cacheBaseDir, GeoCache.INDEX_LOG_FILENAME))
+      except:
+        pass
+      self.indexLogLines = 0
+      Stats.addPhase("route cache index compaction", time.perf_counter() - start)
+
+  def appendIndexLogs(self, logs):
+    self.ensureCacheStorage()
+    with open(os.path.join(self.cacheBaseDir, GeoCache.INDEX_LOG_FILENAME), 'a', encoding='UTF-8') as f:
+      for aLog in logs:
+        f.write( json.dumps(aLog, ensure_ascii=False)+"\n" )
+    self.indexLogLines = self.indexLogLines + len(logs)
+    # rewrite the snapshot when the log becomes longer than the index, then the cost is amortized O(1)
+    if self.indexLogLines > max(GeoCache.MIN_INDEX_LOG_LINES, len(self.index)):
+      self.compactIndex()
+
+  def getCell(self, latitude, longitude):
+    cellDeg = self.snapMeters / GeoCache.METERS_PER_DEG
+    return int(math.floor(latitude / cellDeg)), int(math.floor(longitude / cellDeg))
+
+  def getGrid(self):
+    with self.lock:
+      if self.grid == None:
+        self.grid = {}
+        for filename in self.loadIndex().keys():
+          self.updateGrid(filename, True)
+      return self.grid
+
+  def updateGrid(self, filename, isAdded):
+    if self.grid != None and self.snapMeters:
+      values = GeoCache.parseCacheFilename(filename)
+      if values:
+        key = (values[4],) + self.getCell(values[2], values[3])
+        if isAdded:
+          self.grid.setdefault(key, set()).add(filename)
+        elif key in self.grid:
+          self.grid[key].discard(filename)
+
+  # returns the filename of the valid cache whose origin and destination are within snapMeters
+  def findNearbyCacheFilename(self, from_latitude, from_longitude, to_latitude, to_longitude, tag=None, allowExpired=False):
+    result = None
+    lat1, lon1, lat2, lon2 = float(from_latitude), float(from_longitude), float(to_latitude), float(to_longitude)
+    with self.lock:
+      grid = self.getGrid()
+      latCell, lonCell = self.getCell(lat2, lon2)
+      # a longitude cell is narrower than snapMeters apart from the equator
+      lonRange = int(math.ceil( 1.0 / max(0.01, math.cos(math.radians(lat2))) ))
+      minDistance = None
+      for i in range(latCell-1, latCell+2):
+        for j in range(lonCell-lonRange, lonCell+lonRange+1):
+          for filename in grid.get( (tag if tag else None, i, j), () ):
+            values = GeoCache.parseCacheFilename(filename)
+            entry = self.index.get(filename)
+            if entry == None or not (allowExpired or self.isValidTimestamp(entry[2])):
+              continue
+            originDistance = GeoUtil.getDistanceKm(lat1, lon1, values[0], values[1]) * 1000
+            destinationDistance = GeoUtil.getDistanceKm(lat2, lon2, values[2], values[3]) * 1000
+            if originDistance <= self.snapMeters and destinationDistance <= self.snapMeters:
+              if minDistance == None or originDistance+destinationDistance < minDistance:
+                minDistance = originDistance+destinationDistance
+                result = filename
+    return result
+
+  def limitNumOfCacheFiles(self):
+    result = []
+    if self.numOfCache!=self.CACHE_INFINITE:
+      with self.lock:
+        index = self.loadIndex()
+        while len(index) > self.numOfCache:
+          filename, entry = index.popitem(last=False)
+          self.updateGrid(filename, False)
+          result.append( ["remove", filename] )
+          try:
+            os.remove(os.path.join(self.cacheBaseDir, filename))
+          except:
+            pass
+    return result
 
 
   def storeToCache(self, from_latitude, from_longitude, to_latitude, to_longitude, result, tag=None):
@@ -87,13 +282,23 @@ class GeoCache:
     cachePath = self.getCachePath( from_latitude, from_longitude, to_latitude, to_longitude, tag )
     dt_now = datetime.now()
     _result = {
-      "lastUpdate":dt_now.strftime("%Y-%m-%d %H:%M:%S"),
+      "lastUpdate":dt_now.strftime(GeoCache.LAST_UPDATE_FORMAT),
+      "origin": [from_latitude, from_longitude, to_latitude, to_longitude],
       "data": result
     }
     with open(cachePath, 'w', encoding='UTF-8') as f:
       json.dump(_result, f, indent = 4, ensure_ascii=False)
       f.close()
-    self.limitNumOfCacheFiles()
+    with self.lock:
+      index = self.loadIndex()
+      filename = os.path.basename(cachePath)
+      entry = [time.time(), os.path.getsize(cachePath), int(dt_now.timestamp()), result.get("duration_minutes")]
+      index[filename] = entry
+      index.move_to_end(filename)
+      self.updateGrid(filename, True)
+      logs = [ ["put", filename, entry] ]
+      logs.extend( self.limitNumOfCacheFiles() )
+      self.appendIndexLogs(logs)
 
 
   def isValidCache(self, lastUpdateString):
@@ -105,23 +310,116 @@ class GeoCache:
 
     return result
 
-  def restoreFromCache(self, from_latitude, from_longitude, to_latitude, to_longitude, tag=None):
-    result = None
-    cachePath = self.getCachePath( from_latitude, from_longitude, to_latitude, to_longitude, tag )
-    if os.path.exists( cachePath ):
-      with open(cachePath, 'r', encoding='UTF-8') as f:
-        _result = json.load(f)
-        f.close()
+  def isValidTimestamp(self, lastUpdate):
+    return self.expireHour == self.CACHE_INFINITE or time.time() < lastUpdate + self.expireHour * 3600
 
-      if "lastUpdate" in _result:
-        if self.isValidCache( _result["lastUpdate"] ):
+  # allowExpired : return the expired cache too
+  # statName : count the lookup as {statName}.hit, .expired or .miss
+  def restoreFromCache(self, from_latitude, from_longitude, to_latitude, to_longitude, tag=None, allowExpired=False, statName=None):
+    result = None
+    filename = self.getCacheFilename( from_latitude, from_longitude, to_latitude, to_longitude, tag )
+    with self.lock:
+      entry = self.loadIndex().get(filename)
+      if entry == None and os.path.exists( os.path.join(self.cacheBaseDir, filename) ):
+        # stored by the other process
+        entry = self.getIndexEntryFromFile(filename)
+      if (entry == None or not (allowExpired or self.isValidTimestamp(entry[2]))) and self.snapMeters:
+        nearbyFilename = self.findNearbyCacheFilename( from_latitude, from_longitude, to_latitude, to_longitude, tag, allowExpired )
+        if nearbyFilename:
+          filename = nearbyFilename
+          entry = self.index[filename]
+    # the expiry is checked by the index without opening the file
+    if entry != None and (allowExpired or self.isValidTimestamp(entry[2])):
+      _result = GeoCache.readCacheFile( os.path.join(self.cacheBaseDir, filename) )
+      with self.lock:
+        isIndexed = filename in self.index
+        if _result and "data" in _result:
           result = _result["data"]
+          # report the cached origin if the cache of the other origin is used
+          origin = _result["origin"] if "origin" in _result else GeoCache.parseCacheFilename(filename)
+          if origin and ( float(origin[0])!=float(from_latitude) or float(origin[1])!=float(from_longitude) ):
+            result = dict(result)
+            result["cachedOrigin"] = [ origin[0], origin[1], int( GeoUtil.getDistanceKm(float(from_latitude), float(from_longitude), float(origin[0]), float(origin[1])) * 1000 ) ]
+          # mark as the most recently used
+          entry[0] = time.time()
+          self.index[filename] = entry
+          self.index.move_to_end(filename)
+          if not isIndexed:
+            self.updateGrid(filename, True)
+          self.appendIndexLogs( [ ["touch", filename, entry[0]] ] if isIndexed else [ ["put", filename, entry] ] )
+        elif isIndexed:
+          del self.index[filename]
+          self.updateGrid(filename, False)
+          self.appendIndexLogs( [ ["remove", filename] ] )
+    if statName:
+      Stats.count(f'{statName}.{"hit" if result != None else "miss" if entry == None else "expired"}')
 
     return result
 
+  # returns [(lat1, lon1, lat2, lon2, duration_minutes)] of the cached routes by the index without opening the cache files
+  # the duration of the entry indexed by the older version is read from the file once and kept in the index
+  def getCachedDurations(self):
+    result = []
+    with self.lock:
+      index = self.loadIndex()
+      isChanged = False
+      for filename, entry in index.items():
+        if len(entry) < 4:
+          entry.append( GeoCache.getDurationMinutes( GeoCache.readCacheFile( os.path.join(self.cacheBaseDir, filename) ) ) )
+          isChanged = True
+        values = GeoCache.parseCacheFilename(filename)
+        if values and entry[3]:
+          result.append( (values[0], values[1], values[2], values[3], entry[3]) )
+      # the snapshot is rewritten to keep the least recently used order
+      if isChanged:
+        self.compactIndex()
+    return result
+
+  # re-key the existing cache files by the current snapPrecision. the newer one is kept if the keys are collided
+  def migrate(self):
+    result = 0
+    with self.lock:
+      index = self.loadIndex()
+      isChanged = False
+      for filename in list(index.keys()):
+        values = GeoCache.parseCacheFilename(filename)
+        if not values or not filename in index:
+          continue
+        newFilename = self.getCacheFilename( values[0], values[1], values[2], values[3], values[4] )
+        if newFilename == filename:
+          continue
+        cachePath = os.path.join(self.cacheBaseDir, filename)
+        _result = GeoCache.readCacheFile(cachePath)
+        entry = index.pop(filename)
+        self.updateGrid(filename, False)
+        isChanged = True
+        if _result and "data" in _result and ( not newFilename in index or index[newFilename][2] < entry[2] ):
+          if not "origin" in _result:
+            _result["origin"] = [ str(values[0]), str(values[1]), str(values[2]), str(values[3]) ]
+          newCachePath = os.path.join(self.cacheBaseDir, newFilename)
+          with open(newCachePath, 'w', encoding='UTF-8') as f:
+            json.dump(_result, f, indent = 4, ensure_ascii=False)
+          entry[1] = os.path.getsize(newCachePath)
+          if not newFilename in index:
+            self.updateGrid(newFilename, True)
+          index[newFilename] = entry
+          result = result + 1
+        try:
+          os.remove(cachePath)
+        except:
+          pass
+      # keep the least recently used order
+      for filename in sorted( index.keys(), key=lambda x: index[x][0] ):
+        index.move_to_end(filename)
+      # the snapshot is rewritten instead of the log
+      if isChanged:
+        self.compactIndex()
+    return result
+
   @staticmethod
   def clearAllCache(cacheId):
-    files = glob.glob(f'{os.path.join(JsonCache.DEFAULT_CACHE_BASE_DIR, cacheId)}/*.json')
+    cacheDir = os.path.join(GeoCache.DEFAULT_CACHE_BASE_DIR, cacheId)
+    files = glob.glob(f'{cacheDir}/*.json') + [os.path.join(cacheDir, GeoCache.INDEX_FILENAME), os.path.join(cacheDir, GeoCache.INDEX_LOG_FILENAME)]
     for aRemoveFile in files:
       try:
         os.remove(aRemoveFile)
@@ -129,16 +427,101 @@ class GeoCache:
         pass
 
 
+# call the function once for the concurrent calls of the same key and return its result to all of them
+class SingleFlight:
+  def __init__(self, name):
+    self.name = name
+    self.calls = {}
+    self.lock = threading.Lock()
+
+  def do(self, key, func, *args):
+    with self.lock:
+      call = self.calls.get(key)
+      isLeader = call == None
+      if isLeader:
+        call = self.calls[key] = {"event": threading.Event(), "result": None, "error": None}
+    if isLeader:
+      try:
+        call["result"] = func(*args)
+      except Exception as e:
+        call["error"] = e
+      finally:
+        with self.lock:
+          del self.calls[key]
+        call["event"].set()
+    else:
+      Stats.count(f'{self.name}.coalesced')
+      call["event"].wait()
+    if call["error"] != None:
+      raise call["error"]
+    return call["result"]
+
+
+class RouteWorker:
+  def __init__(self):
+    self.driver = None
+    self.driverLock = threading.Lock()
+
+  def close(self):
+    if self.driver:
+      try:
+        self.driver.quit()
+      except:
+        pass
+      self.driver = None
+
+
 class CachedRouteUtil:
-  def __init__(self, cacheId = None, expireHour = None, numOfCache = None, forceReload=False):
-    self.cacheId = cacheId if cacheId else JsonCache.DEFAULT_CACHE_ID
-    self.expireHour = expireHour if expireHour else JsonCache.DEFAULT_CACHE_EXPIRE_HOURS
-    self.numOfCache = numOfCache if numOfCache else JsonCache.CACHE_INFINITE
+  # the cap of the concurrent route queries to avoid the throttling by the routing site
+  MAX_PARALLEL = 4
+  QUERY_INTERVAL_SEC = 0.5
+  # the time of day order of get_timezone_tag()
+  TIMEZONE_TAGS = ["early_morning", "morning", "late_morning", "lunch", "late_lunch", "afternoon", "evening", "night", "midnight"]
+  WEEKEND_PREFIX = "weekday_"
+  # the concurrent queries of the same route are coalesced into one browser query
+  inflight = SingleFlight("route")
+  # the cap is shared by the concurrent queries of the server
+  querySlots = threading.BoundedSemaphore(MAX_PARALLEL)
+  shared = {}
+  sharedLock = threading.Lock()
+
+  def __init__(self, cacheId = None, expireHour = None, numOfCache = None, forceReload=False, snapPrecision = None, snapMeters = 0):
+    self.cacheId = cacheId if cacheId else GeoCache.DEFAULT_CACHE_ID
+    self.expireHour = expireHour if expireHour else GeoCache.DEFAULT_CACHE_EXPIRE_HOURS
+    self.numOfCache = numOfCache if numOfCache else GeoCache.CACHE_INFINITE
 
-    self.cache = GeoCache(self.cacheId, self.expireHour, self.numOfCache)
+    self.cache = GeoCache(self.cacheId, self.expireHour, self.numOfCache, snapPrecision, snapMeters)
     self.forceReload = forceReload
 
     self.driver = None
+    self.driverLock = threading.Lock()
+    self.lock = threading.Lock()
+    self.lastQuery = 0
+
+  # the instance of the same parameters is reused in the process, then the browser and the cache index are kept by the server
+  @staticmethod
+  def getShared(cacheId = None, expireHour = None, numOfCache = None, forceReload=False, snapPrecision = None, snapMeters = 0):
+    key = (cacheId, expireHour, numOfCache, forceReload, snapPrecision, snapMeters)
+    with CachedRouteUtil.sharedLock:
+      if not key in CachedRouteUtil.shared:
+        CachedRouteUtil.shared[key] = CachedRouteUtil(cacheId, expireHour, numOfCache, forceReload, snapPrecision, snapMeters)
+      return CachedRouteUtil.shared[key]
+
+  @staticmethod
+  def closeAll():
+    with CachedRouteUtil.sharedLock:
+      for aRouteUtil in CachedRouteUtil.shared.values():
+        aRouteUtil.close()
+      CachedRouteUtil.shared = {}
+
+  def close(self):
+    with self.driverLock:
+      if self.driver:
+        try:
+          self.driver.quit()
+        except:
+          pass
+        self.driver = None
 
   def get_timezone_tag(self):
     result = None
@@ -168,45 +551,425 @@ class CachedRouteUtil:
         result = "midnight"
 
     if dt_now.weekday()>=5:
-      result = f'weekday_{result}'
+      result = f'{CachedRouteUtil.WEEKEND_PREFIX}{result}'
+
+    return result
 
+  # returns the other tags in the order of the time of day distance. the same weekday/weekend tags are prior to the others
+  @staticmethod
+  def getNearbyTimezoneTags(tag):
+    result = []
+    prefix = ""
+    if tag.startswith(CachedRouteUtil.WEEKEND_PREFIX):
+      prefix = CachedRouteUtil.WEEKEND_PREFIX
+      tag = tag[len(prefix):]
+    otherPrefix = "" if prefix else CachedRouteUtil.WEEKEND_PREFIX
+    tags = CachedRouteUtil.TIMEZONE_TAGS
+    if not tag in tags:
+      return result
+    n = len(tags)
+    pos = tags.index(tag)
+    nearbyTags = sorted( tags, key=lambda x: min( (tags.index(x)-pos) % n, (pos-tags.index(x)) % n ) )
+    for aTag in nearbyTags[1:]:
+      result.append( prefix + aTag )
+    for aTag in nearbyTags:
+      result.append( otherPrefix + aTag )
+    return result
+
+  def getCachedData(self, lat1, lon1, lat2, lon2, statName=None):
+    result = None
+    if not self.forceReload:
+      cacheData = self.cache.restoreFromCache(lat1, lon1, lat2, lon2, self.get_timezone_tag(), statName=statName)
+      if cacheData and cacheData["duration_minutes"]!=0:
+        result = cacheData
+    elif statName:
+      Stats.count(f'{statName}.miss')
     return result
 
-  def get_directions_duration_minutes(self, lat1, lon1, lat2, lon2, retry_max_duration):
+  # returns the cache of the nearby time of day or the expired cache with "approximate":tag
+  def getStaleCachedData(self, lat1, lon1, lat2, lon2):
+    tag = self.get_timezone_tag()
+    nearbyTags = CachedRouteUtil.getNearbyTimezoneTags(tag)
+    for allowExpired, tags in ( (False, nearbyTags), (True, [tag] + nearbyTags) ):
+      for aTag in tags:
+        cacheData = self.cache.restoreFromCache(lat1, lon1, lat2, lon2, aTag, allowExpired)
+        if cacheData and cacheData["duration_minutes"]!=0:
+          result = dict(cacheData)
+          result["approximate"] = aTag
+          Stats.count("routeCache.stale")
+          return result
+    return None
+
+  # keep the interval between the route queries of all the drivers
+  def waitForQueryInterval(self):
+    with self.lock:
+      wait = self.lastQuery + CachedRouteUtil.QUERY_INTERVAL_SEC - time.time()
+      if wait > 0:
+        time.sleep(wait)
+      self.lastQuery = time.time()
+
+  def get_directions_duration_minutes(self, lat1, lon1, lat2, lon2, retry_max_duration, worker = None):
+    isPooled = worker != None
+    worker = worker if worker else self
     duration_minutes = None
     directions_link = None
     tag = self.get_timezone_tag()
-    cacheData = self.cache.restoreFromCache(lat1, lon1, lat2, lon2, tag)
+    cacheData = self.getCachedData(lat1, lon1, lat2, lon2, "routeCache")
 
-    if (cacheData and cacheData["duration_minutes"]!=0) and not self.forceReload:
-      duration_minutes = cacheData["duration_minutes"]
-      directions_link = cacheData["directions_link"]
+    if cacheData:
+      duration_minutes, directions_link = CachedRouteUtil.getCachedRouteTime(cacheData, lat2, lon2)
     else:
-      if not self.driver:
-        self.driver = WebUtil.get_web_driver()
+      duration_minutes, directions_link = CachedRouteUtil.inflight.do( (self.cacheId, lat1, lon1, lat2, lon2, tag), self.queryRoute, lat1, lon1, lat2, lon2, retry_max_duration, worker, isPooled, tag )
+
+    return duration_minutes, directions_link
+
+  # returns (duration_minutes, directions_link) of the cache data
+  @staticmethod
+  def getCachedRouteTime(cacheData, lat2, lon2):
+    if "cachedOrigin" in cacheData:
+      Stats.count("routeCache.snapped")
+      cachedLatitude, cachedLongitude, meters = cacheData["cachedOrigin"]
+      print(f'the cached route from {cachedLatitude} {cachedLongitude} ({meters}m apart) is used for {lat2} {lon2}', file=sys.stderr)
+    return cacheData["duration_minutes"], cacheData["directions_link"]
+
+  # query the route time without the cache and store it
+  def queryRoute(self, lat1, lon1, lat2, lon2, retry_max_duration, worker, isPooled, tag):
+    duration_minutes = None
+    directions_link = None
+    # selenium is imported only when the route query is actually required
+    from get_route_time import WebUtil
+    from get_route_time import RouteUtil
+    # the driver of this instance is shared by the concurrent queries of the server
+    with worker.driverLock, CachedRouteUtil.querySlots:
+      if not worker.driver:
+        with Stats.timed("browser start"):
+          worker.driver = WebUtil.get_web_driver()
 
       retry_duration = 6
       retry_max_count = 1
       if retry_max_duration>=0:
-        retry_max_count = int(retry_max_duration / retry_duration)
+        retry_max_count = max(1, int(retry_max_duration / retry_duration))
       retry_cnt = 0
       while retry_cnt<retry_max_count:
-        duration_minutes, directions_link = RouteUtil.get_directions_duration_minutes(self.driver, lat1, lon1, lat2, lon2)
+        if isPooled:
+          self.waitForQueryInterval()
+        with Stats.timed("route query"):
+          duration_minutes, directions_link = RouteUtil.get_directions_duration_minutes(worker.driver, lat1, lon1, lat2, lon2)
         if duration_minutes != 0:
           break
+        Stats.count("route.failed")
         retry_cnt += 1
-        print("retry:"+str(retry_cnt), file=sys.stderr)
-        time.sleep(retry_duration)
-      if duration_minutes == 0:
-        return None, None
-      _data = {
-        "duration_minutes": duration_minutes,
-        "directions_link": directions_link,
-      }
-      self.cache.storeToCache(latitude, longitude, aGeo[0], aGeo[1], _data, tag)
+        if retry_cnt<retry_max_count:
+          print("retry:"+str(retry_cnt), file=sys.stderr)
+          with Stats.phase("route retry sleep"):
+            time.sleep(retry_duration)
+    if duration_minutes == 0:
+      return None, None
+    _data = {
+      "duration_minutes": duration_minutes,
+      "directions_link": directions_link,
+    }
+    with self.lock:
+      self.cache.storeToCache(lat1, lon1, lat2, lon2, _data, tag)
 
     return duration_minutes, directions_link
 
+  # returns {(lat1, lon1, lat2, lon2):(duration_minutes, directions_link)} resolved by the pool of the drivers
+  def get_directions_duration_minutes_parallel(self, queries, retry_max_duration, parallel):
+    result = {}
+    works = queue.Queue()
+    for aQuery in queries:
+      works.put( aQuery )
+
+    def work():
+      worker = RouteWorker()
+      try:
+        while True:
+          try:
+            aQuery = works.get_nowait()
+          except queue.Empty:
+            break
+          try:
+            result[aQuery] = self.get_directions_duration_minutes(aQuery[0], aQuery[1], aQuery[2], aQuery[3], retry_max_duration, worker)
+          except Exception as e:
+            print(f'failed to get route time {aQuery} : {e}', file=sys.stderr)
+            result[aQuery] = (None, None)
+      finally:
+        worker.close()
+
+    threads = []
+    for i in range( max(1, min(parallel, CachedRouteUtil.MAX_PARALLEL, len(queries))) ):
+      # the worker inherits the stats and the output of the caller's context
+      aThread = threading.Thread(target=contextvars.copy_context().run, args=(work,))
+      aThread.start()
+      threads.append( aThread )
+    for aThread in threads:
+      aThread.join()
+    return result
+
+
+# refresh the route time which is served from the stale cache by a browser in background
+class RouteRefresher:
+  MAX_QUEUE = 32
+
+  def __init__(self, cachedRouteUtil, retry_max_duration, maxQueue = None):
+    self.cachedRouteUtil = cachedRouteUtil
+    self.retry_max_duration = retry_max_duration
+    self.works = queue.Queue( maxQueue if maxQueue else RouteRefresher.MAX_QUEUE )
+    self.requested = set()
+    self.thread = None
+    self.lock = threading.Lock()
+
+  # returns False if the query is already requested or the queue is full
+  def request(self, query):
+    with self.lock:
+      if query in self.requested:
+        return False
+      try:
+        self.works.put_nowait( query )
+      except queue.Full:
+        return False
+      self.requested.add( query )
+      Stats.count("route.refreshRequested")
+      if not self.thread:
+        self.thread = threading.Thread(target=contextvars.copy_context().run, args=(self.run,))
+        self.thread.start()
+    return True
+
+  def run(self):
+    worker = RouteWorker()
+    try:
+      while True:
+        with self.lock:
+          try:
+            aQuery = self.works.get_nowait()
+          except queue.Empty:
+            self.thread = None
+            break
+        try:
+          self.cachedRouteUtil.queryRoute(aQuery[0], aQuery[1], aQuery[2], aQuery[3], self.retry_max_duration, worker, True, self.cachedRouteUtil.get_timezone_tag())
+        except Exception as e:
+          print(f'failed to refresh route time {aQuery} : {e}', file=sys.stderr)
+    finally:
+      worker.close()
+
+  def join(self):
+    while True:
+      with self.lock:
+        aThread = self.thread
+      if not aThread:
+        break
+      aThread.join()
+
+
+# retry the failed route queries by the backoff with jitter while the other route queries go on
+class RouteRetryScheduler:
+  BASE_DELAY_SEC = 6
+  MAX_DELAY_SEC = 60
+
+  def __init__(self, cachedRouteUtil, deadlineSec):
+    self.cachedRouteUtil = cachedRouteUtil
+    self.deadlineSec = deadlineSec
+    # the deadline starts at the first failure, then the time of the ordinary queries isn't counted
+    self.deadline = None
+    # [(retryTime, seq, query)]
+    self.queue = []
+    self.seq = 0
+    # {query:the number of the failed attempts}
+    self.attempts = {}
+
+  @staticmethod
+  def getDelay(attempt):
+    delay = min( RouteRetryScheduler.MAX_DELAY_SEC, RouteRetryScheduler.BASE_DELAY_SEC * (2 ** attempt) )
+    return random.uniform( delay / 2, delay )
+
+  # returns (duration_minutes, directions_link) by the single attempt. (None, None) if failed
+  def query(self, aQuery):
+    try:
+      return self.cachedRouteUtil.get_directions_duration_minutes(aQuery[0], aQuery[1], aQuery[2], aQuery[3], 0)
+    except Exception as e:
+      print(f'failed to get route time {aQuery} : {e}', file=sys.stderr)
+    return None, None
+
+  # returns False if the deadline is over
+  def defer(self, aQuery):
+    attempt = self.attempts.get(aQuery, 0)
+    now = time.time()
+    if self.deadline == None:
+      self.deadline = now + self.deadlineSec
+    if now >= self.deadline:
+      print(f'give up the route time of {aQuery[2]} {aQuery[3]}', file=sys.stderr)
+      Stats.count("retry.gaveUp")
+      self.attempts.pop(aQuery, None)
+      return False
+    delay = min( RouteRetryScheduler.getDelay(attempt), self.deadline - now )
+    self.attempts[aQuery] = attempt + 1
+    self.seq = self.seq + 1
+    heapq.heappush( self.queue, (now + delay, self.seq, aQuery) )
+    Stats.count("retry.deferred")
+    print(f'retry:{attempt+1} {aQuery[2]} {aQuery[3]} after {delay:.1f}sec', file=sys.stderr)
+    return True
+
+  def isDeferred(self, aQuery):
+    return aQuery in self.attempts
+
+  # returns [(query, (duration_minutes, directions_link))] of the succeeded retries which are due. wait for the next retry if block
+  def poll(self, block = False):
+    result = []
+    if block and self.queue:
+      delay = self.queue[0][0] - time.time()
+      if delay > 0:
+        with Stats.phase("retry wait"):
+          time.sleep(delay)
+    now = time.time()
+    while self.queue and self.queue[0][0] <= now:
+      retryTime, seq, aQuery = heapq.heappop( self.queue )
+      routeTime = self.query(aQuery)
+      if routeTime[0] != None:
+        del self.attempts[aQuery]
+        Stats.count("retry.succeeded")
+        result.append( (aQuery, routeTime) )
+      else:
+        self.defer(aQuery)
+    return result
+
+  # items : [(key, query, (duration_minutes, directions_link) or None if not resolved yet)]
+  # yields (key, (duration_minutes, directions_link)) in the order of items and the deferred ones as they arrive
+  def getRouteTimes(self, items):
+    keys = {}
+    for key, aQuery, routeTime in items:
+      keys[aQuery] = key
+    for key, aQuery, routeTime in items:
+      if routeTime != None:
+        yield key, routeTime
+      elif not self.isDeferred(aQuery):
+        routeTime = self.query(aQuery)
+        if routeTime[0] != None:
+          yield key, routeTime
+        else:
+          self.defer(aQuery)
+      for aQuery, routeTime in self.poll():
+        yield keys[aQuery], routeTime
+    while self.queue:
+      for aQuery, routeTime in self.poll(True):
+        yield keys[aQuery], routeTime
+
+
+class RouteTimeEstimator:
+  MIN_SAMPLES = 20
+  HELD_OUT_RATE = 5 # 1/5 of the samples
+  # the 5/95 percentile band of the fewer held-out samples is too noisy to skip the route query
+  MIN_HELD_OUT_SAMPLES = 30
+  # the band of actual/estimated which is regarded as "clearly" out of range
+  LOWER_PERCENTILE = 0.05
+  UPPER_PERCENTILE = 0.95
+
+  def __init__(self, samples):
+    self.samples = samples
+    self.coefficients = None
+    self.lowerRatio = self.upperRatio = None
+    self.report = None
+    if len(samples) >= RouteTimeEstimator.MIN_SAMPLES:
+      trainSamples = []
+      heldOutSamples = []
+      for i, aSample in enumerate(samples):
+        if i % RouteTimeEstimator.HELD_OUT_RATE == 0:
+          heldOutSamples.append( aSample )
+        else:
+          trainSamples.append( aSample )
+      # evaluate the model on the held-out samples, then use all the samples for the estimation
+      coefficients = RouteTimeEstimator.fit(trainSamples)
+      if coefficients:
+        self.report = RouteTimeEstimator.evaluate(coefficients, heldOutSamples)
+        self.lowerRatio = self.report["lowerRatio"]
+        self.upperRatio = self.report["upperRatio"]
+        self.coefficients = RouteTimeEstimator.fit(samples)
+
+  @staticmethod
+  def getFeatures(distanceKm):
+    return [1.0, distanceKm, math.sqrt(distanceKm)]
+
+  # returns [(distanceKm, duration_minutes)] of the route time cache by its index
+  @staticmethod
+  def loadSamples(geoCache):
+    result = []
+    for lat1, lon1, lat2, lon2, duration_minutes in sorted( geoCache.getCachedDurations() ):
+      result.append( (GeoUtil.getDistanceKm(lat1, lon1, lat2, lon2), duration_minutes) )
+    return result
+
+  # least squares by the normal equation
+  @staticmethod
+  def fit(samples):
+    n = len( RouteTimeEstimator.getFeatures(0) )
+    a = [ [0.0] * (n+1) for i in range(n) ]
+    for distanceKm, duration_minutes in samples:
+      features = RouteTimeEstimator.getFeatures(distanceKm)
+      for i in range(n):
+        for j in range(n):
+          a[i][j] += features[i] * features[j]
+        a[i][n] += features[i] * duration_minutes
+    for i in range(n):
+      pivot = max( range(i, n), key=lambda k: abs(a[k][i]) )
+      if abs(a[pivot][i]) < 1e-9:
+        return None
+      a[i], a[pivot] = a[pivot], a[i]
+      for k in range(n):
+        if k != i:
+          factor = a[k][i] / a[i][i]
+          for j in range(i, n+1):
+            a[k][j] -= factor * a[i][j]
+    return [ a[i][n] / a[i][i] for i in range(n) ]
+
+  @staticmethod
+  def estimateByCoefficients(coefficients, distanceKm):
+    return max( 1.0, sum( [ c * f for c, f in zip(coefficients, RouteTimeEstimator.getFeatures(distanceKm)) ] ) )
+
+  @staticmethod
+  def getPercentile(sortedValues, percentile):
+    return sortedValues[ min( len(sortedValues)-1, int( percentile * len(sortedValues) ) ) ]
+
+  @staticmethod
+  def evaluate(coefficients, samples):
+    errors = []
+    ratios = []
+    for distanceKm, duration_minutes in samples:
+      estimated = RouteTimeEstimator.estimateByCoefficients(coefficients, distanceKm)
+      errors.append( abs(estimated - duration_minutes) )
+      ratios.append( duration_minutes / estimated )
+    errors.sort()
+    ratios.sort()
+    return {
+      "heldOut": len(samples),
+      "meanAbsoluteError": sum(errors) / len(errors),
+      "medianAbsoluteError": RouteTimeEstimator.getPercentile(errors, 0.5),
+      "lowerRatio": RouteTimeEstimator.getPercentile(ratios, RouteTimeEstimator.LOWER_PERCENTILE),
+      "upperRatio": RouteTimeEstimator.getPercentile(ratios, RouteTimeEstimator.UPPER_PERCENTILE)
+    }
+
+  def isAvailable(self):
+    return self.coefficients != None
+
+  def estimate(self, lat1, lon1, lat2, lon2):
+    return RouteTimeEstimator.estimateByCoefficients( self.coefficients, GeoUtil.getDistanceKm(float(lat1), float(lon1), float(lat2), float(lon2)) )
+
+  def canPrune(self):
+    return self.isAvailable() and self.report["heldOut"] >= RouteTimeEstimator.MIN_HELD_OUT_SAMPLES
+
+  # True if the actual duration is very likely out of [minMinutes, maxMinutes]. always False if the held-out samples are too few
+  def isClearlyOutOfRange(self, estimated, minMinutes, maxMinutes):
+    if not self.canPrune():
+      return False
+    return ( maxMinutes and estimated * self.lowerRatio > maxMinutes ) or ( minMinutes and estimated * self.upperRatio < minMinutes )
+
+  def printReport(self, file = sys.stderr):
+    if self.isAvailable():
+      report = self.report
+      print(f'route time estimator: {len(self.samples)} samples, held-out {report["heldOut"]} : mean abs error {report["meanAbsoluteError"]:.1f}min, median abs error {report["medianAbsoluteError"]:.1f}min, actual/estimated {report["lowerRatio"]:.2f}-{report["upperRatio"]:.2f}', file=file)
+      if not self.canPrune():
+        print(f'route time estimator: the trailheads are not skipped ({RouteTimeEstimator.MIN_HELD_OUT_SAMPLES} held-out samples required)', file=file)
+    else:
+      print(f'route time estimator: not available ({len(self.samples)} samples, {RouteTimeEstimator.MIN_SAMPLES} required)', file=file)
+
 
 class ExecUtil:
   @staticmethod
@@ -223,8 +986,10 @@ class ExecUtil:
     return result
 
 
-if __name__=="__main__":
-  parser = argparse.ArgumentParser(description='Parse command line options.')
+# waitForRefresh : wait for the background refresh of the stale route time before return. the server doesn't wait
+# returns the refresher which may be still refreshing if not waitForRefresh
+def main(argv = None, waitForRefresh = True):
+  parser = argparse.ArgumentParser(prog=os.path.basename(__file__), description='Parse command line options.')
   parser.add_argument('args', nargs='*', help='mountain name such as 富士山')
   parser.add_argument('-f', '--filter', action='store_true', default=False, help="Specify if you want to filter out with 登山口")
   parser.add_argument('-l', '--longitudelatitude', action='store', default='35.658581 139.745433', help="Specify source place's longitutude latitude")
@@ -241,10 +1006,24 @@ if __name__=="__main__":
   parser.add_argument('-o', '--openNavi', action='store_true', default=False, help='specify if you want to open the route navi')
   parser.add_argument('-g', '--openPark', action='store_true', default=False, help='specify if you want to open the park info.')
   parser.add_argument('-c', '--compare', action='store_true', default=False, help='compare tozanguchi per climbtime')
-  parser.add_argument('-z', '--retry', action='store', type=int, default=180, help='retry max duration sec')
+  parser.add_argument('-z', '--retry', action='store', type=int, default=180, help='specify the max duration sec of the retries of all the failed route queries from the first failure e.g. 180')
+  parser.add_argument('-a', '--near', action='store', nargs=2, type=float, default=None, metavar=('LAT', 'LON'), help='specify latitude longitude to search nearby trailheads (default:--longitudelatitude)')
+  parser.add_argument('-d', '--radius', action='store', type=float, default=0, help='specify radius km to search nearby trailheads e.g. 30')
+  parser.add_argument('-ne', '--noEstimate', action='store_true', default=False, help='specify if you do not want to skip the route query by the estimated route time')
+  parser.add_argument('-eo', '--estimateOnly', action='store_true', default=False, help='specify if you want to use the estimated route time instead of the route query')
+  parser.add_argument('-er', '--estimatorReport', action='store_true', default=False, help='specify if you want to report the estimator error on the held-out route time cache')
+  parser.add_argument('-j', '--parallel', action='store', type=int, default=1, help=f'specify the number of browsers to query route time in parallel (max:{CachedRouteUtil.MAX_PARALLEL})')
+  parser.add_argument('-q', '--nearest', action='store', type=int, default=0, help='specify the number of the nearest trailheads to search e.g. 10')
+  parser.add_argument('-sp', '--snapPrecision', action='store', type=int, default=None, help='specify the number of decimal places of latitude longitude for the route time cache key e.g. 3 (about 100m)')
+  parser.add_argument('-sm', '--snapMeters', action='store', type=float, default=0, help='specify the tolerance meters to use the route time cache of the nearby origin and destination e.g. 200')
+  parser.add_argument('-sl', '--stale', action='store_true', default=False, help='specify if you want to show the route time cache of the other time of day or the expired one until it is refreshed in background')
+  parser.add_argument('-mc', '--migrateCache', action='store_true', default=False, help='specify if you want to re-key the route time cache by --snapPrecision')
+  parser.add_argument('-st', '--stats', '--profile', action='store_true', default=False, help='specify if you want to output the phase time, the cache hit/miss and the latency on stderr')
+  parser.add_argument('-sf', '--statsFormat', action='store', default=Stats.FORMAT_TEXT, choices=[Stats.FORMAT_TEXT, Stats.FORMAT_JSON], help='specify the format of --stats e.g. text, json')
 
-  args = parser.parse_args()
+  args = parser.parse_args(argv)
 
+  start = time.perf_counter()
   mountains = set( args.args )
   mountains = MountainFilterUtil.mountainsIncludeExcludeFromFile( mountains, args.exclude, args.include )
 
@@ -257,34 +1036,83 @@ if __name__=="__main__":
   # search by tozanguchi (and convert to mountain name)
   filter_tozanguchi = set()
   for tozanguchi in list(set(args.args)):
-    for mountainname,tozanguchis in tozanguchiDic.items():
-      if tozanguchi in tozanguchis:
-        mountains.add(mountainname)
-        filter_tozanguchi.add(tozanguchi)
+    for mountainname, aTozanguchi in TozanguchiUtil.getTozanguchis(tozanguchi):
+      mountains.add(mountainname)
+      filter_tozanguchi.add(aTozanguchi)
 
   latitude, longitude = GeoUtil.getLatitudeLongitude(args.longitudelatitude)
+  Stats.addPhase("filter mountains", time.perf_counter() - start)
 
   minRouteTimeMinutes = TozanguchiUtil.getMinutesFromHHMM(args.minTime)
   maxRouteTimeMinutes = TozanguchiUtil.getMinutesFromHHMM(args.maxTime)
   minClimbTimeMinutes = TozanguchiUtil.getMinutesFromHHMM(args.minClimbTime)
   maxClimbTimeMinutes = TozanguchiUtil.getMinutesFromHHMM(args.maxClimbTime)
 
-  cachedRouteUtil = CachedRouteUtil("routeTime", GeoCache.DEFAULT_CACHE_EXPIRE_HOURS, 1000, args.renew)
+  cachedRouteUtil = CachedRouteUtil.getShared("routeTime", GeoCache.DEFAULT_CACHE_EXPIRE_HOURS, 1000, args.renew, args.snapPrecision, args.snapMeters)
+  if args.migrateCache:
+    if args.snapPrecision == None:
+      print('--migrateCache requires --snapPrecision', file=sys.stderr)
+      exit(-1)
+    print(f'{cachedRouteUtil.cache.migrate()} route time caches are re-keyed', file=sys.stderr)
+    if not mountains and not (args.near or args.radius or args.nearest):
+      exit(0)
+
+  # the estimator fitted on the route time cache is used to skip the route query
+  estimator = None
+  if args.estimateOnly or args.estimatorReport or (maxRouteTimeMinutes and not args.noEstimate):
+    with Stats.phase("fit estimator"):
+      estimator = RouteTimeEstimator( RouteTimeEstimator.loadSamples(cachedRouteUtil.cache) )
+    if args.estimatorReport or (args.estimateOnly and not estimator.isAvailable()):
+      estimator.printReport()
+    if not estimator.isAvailable():
+      if args.estimateOnly:
+        print('--estimateOnly requires the route time estimator. query the route time without --estimateOnly to cache more routes', file=sys.stderr)
+        exit(1)
+      estimator = None
+
+  # prefilter by the cached trailhead geolocations before the route query
+  nearTozanguchis = None
+  if args.near or args.radius or args.nearest:
+    start = time.perf_counter()
+    if args.near:
+      nearLatitude, nearLongitude = args.near
+    else:
+      nearLatitude, nearLongitude = float(latitude), float(longitude)
+    geoIndex = TrailheadGeoIndex.getIndex()
+    if args.nearest or not args.radius:
+      candidates = geoIndex.getNearest(nearLatitude, nearLongitude, args.nearest if args.nearest else TrailheadGeoIndex.DEFAULT_NEAREST, args.radius if args.radius else None)
+    else:
+      candidates = geoIndex.getWithinRadius(nearLatitude, nearLongitude, args.radius)
+    nearTozanguchis = set()
+    nearMountains = set()
+    for distance, aMountain, aTozanguchi, theUrl in candidates:
+      nearTozanguchis.add( (aMountain, aTozanguchi) )
+      nearMountains.add( aMountain )
+    nearMountains = MountainFilterUtil.mountainsIncludeExcludeFromFile( nearMountains, args.exclude, [] )
+    mountains = mountains & nearMountains if args.args else nearMountains
+    Stats.addPhase("search nearby trailheads", time.perf_counter() - start)
 
   if len(mountains) == 0 or not latitude or not longitude:
     parser.print_help()
     exit(-1)
 
   # enumerate tozanguchi park geolocations per mountain
+  start = time.perf_counter()
   tozanguchiParkInfos = {}
   detailParkInfo = {}
+  # the trailhead shared by the mountains is looked up once
+  parkInfos = {}
   # search by mountain name (mountains)
   for aMountain in mountains:
     if aMountain in tozanguchiDic:
       tozanguchis = tozanguchiDic[aMountain]
       tozanguchiParkInfos[ aMountain ] = set()
       for aTozanguchi, theUrl in tozanguchis.items():
-        parkInfo = TozanguchiUtil.getParkInfo(theUrl)
+        if nearTozanguchis != None and not (aMountain, aTozanguchi) in nearTozanguchis:
+          continue
+        if not theUrl in parkInfos:
+          parkInfos[theUrl] = TozanguchiUtil.getParkInfo(theUrl)
+        parkInfo = parkInfos[theUrl]
         if parkInfo != None:
           #if args.minPark==0 or ( TozanguchiUtil.getTheNumberOfCarPark(parkInfo) >= int(args.minPark) ):
           if TozanguchiUtil.isAcceptableTozanguchi(aMountain, parkInfo, minClimbTimeMinutes, maxClimbTimeMinutes, int(args.minPark)):
@@ -304,48 +1132,124 @@ if __name__=="__main__":
       sorted_coords_list = sorted(coords_set, key=lambda x: str(x))
       sorted_tozanguchiParkInfos[mountain] = sorted_coords_list
   tozanguchiParkInfos = sorted_tozanguchiParkInfos
+  Stats.addPhase("park info", time.perf_counter() - start)
+
+  # serve the stale route time immediately and refresh it in background if --stale
+  refresher = None
+  if args.stale and not args.renew and not args.estimateOnly:
+    refresher = RouteRefresher(cachedRouteUtil, args.retry)
+
+  # resolve route time by the stale cache, the estimation or the route query
+  start = time.perf_counter()
+  routeTimes = {}
+  approximateGeos = set()
+  estimatedGeos = set()
+  queries = []
+  for aMountainName, tozanguchiParkGeos in tozanguchiParkInfos.items():
+    for aGeo in tozanguchiParkGeos:
+      if estimator or refresher:
+        # the valid cache is read once here and used as is without the route query
+        cacheData = cachedRouteUtil.getCachedData(latitude, longitude, aGeo[0], aGeo[1])
+        if cacheData:
+          Stats.count("routeCache.hit")
+          routeTimes[aGeo] = CachedRouteUtil.getCachedRouteTime(cacheData, aGeo[0], aGeo[1])
+          continue
+        staleData = cachedRouteUtil.getStaleCachedData(latitude, longitude, aGeo[0], aGeo[1]) if refresher else None
+        if staleData:
+          routeTimes[aGeo] = (staleData["duration_minutes"], staleData["directions_link"])
+          approximateGeos.add(aGeo)
+          print(f'the route time of {staleData["approximate"]} is used for {aGeo[0]} {aGeo[1]} until it is refreshed', file=sys.stderr)
+          refresher.request( (latitude, longitude, aGeo[0], aGeo[1]) )
+          continue
+        if estimator:
+          estimated = estimator.estimate(latitude, longitude, aGeo[0], aGeo[1])
+          if maxRouteTimeMinutes and not args.noEstimate and estimator.isClearlyOutOfRange(estimated, minRouteTimeMinutes, maxRouteTimeMinutes):
+            Stats.count("estimator.skipped")
+            routeTimes[aGeo] = (None, None)
+            continue
+          if args.estimateOnly:
+            Stats.count("estimator.used")
+            routeTimes[aGeo] = (int(estimated), "")
+            estimatedGeos.add(aGeo)
+            continue
+      queries.append( (latitude, longitude, aGeo[0], aGeo[1]) )
+  Stats.addPhase("stale cache and estimation", time.perf_counter() - start)
+  # the failed route query is retried by the scheduler within --retry sec in total
+  scheduler = RouteRetryScheduler(cachedRouteUtil, args.retry)
+  if args.parallel > 1 and queries:
+    with Stats.phase("parallel route query"):
+      parallelRouteTimes = cachedRouteUtil.get_directions_duration_minutes_parallel(queries, 0, args.parallel)
+    for aQuery, aRouteTime in parallelRouteTimes.items():
+      if aRouteTime[0] != None:
+        routeTimes[ (aQuery[2], aQuery[3]) ] = aRouteTime
+      else:
+        scheduler.defer(aQuery)
+
+  items = []
+  for aMountainName, tozanguchiParkGeos in tozanguchiParkInfos.items():
+    for aGeo in tozanguchiParkGeos:
+      items.append( ( (aMountainName, aGeo), (latitude, longitude, aGeo[0], aGeo[1]), routeTimes.get(aGeo) ) )
 
   # enumerate route time to the tozanguchi park per mountain
+  start = time.perf_counter()
   conditionedMountains = set()
   n = 0
-  for aMountainName, tozanguchiParkGeos in tozanguchiParkInfos.items():
-    for aGeo in tozanguchiParkGeos:
-      duration_minutes, directions_link = cachedRouteUtil.get_directions_duration_minutes(latitude, longitude, aGeo[0], aGeo[1], args.retry)
-      if duration_minutes == None and directions_link == None:
-        continue
-      if (maxRouteTimeMinutes==0 or duration_minutes>=minRouteTimeMinutes) and (maxRouteTimeMinutes==0 or duration_minutes<=maxRouteTimeMinutes):
-        n = n + 1
-        conditionedMountains.add(aMountainName)
-        _detailParkInfo = detailParkInfo[f'{aGeo[0]}_{aGeo[1]}']
-        if not args.mountainNameOnly:
-          _detailParkInfo["登山口への移動時間"] = '{:d}分 ({:02d}:{:02d})'.format(duration_minutes, int(duration_minutes/60), duration_minutes % 60)
-          if args.compare:
-              # tozanguchi compare dump mode
-              if _detailParkInfo['主要登山ルート']:
-                for aRoute in _detailParkInfo['主要登山ルート']:
-                  if aMountainName in aRoute:
-                    route_time = aRoute[len(aMountainName):]
-                    pos = route_time.find("：")
-                    if pos!=-1:
-                      route_time = route_time[pos+1:len(route_time)-1]
-                    transport_time = _detailParkInfo["登山口への移動時間"]
-                    pos = transport_time.find("(")
-                    if pos!=-1:
-                      transport_time = transport_time[pos+1:len(transport_time)-1]
-                    print(f'{StrUtil.ljust_jp(aMountainName,12)} {StrUtil.ljust_jp(_detailParkInfo["登山口"],18)} {StrUtil.ljust_jp(transport_time,6)} {StrUtil.ljust_jp(route_time,10)} {_detailParkInfo["駐車台数"]}')
+  for (aMountainName, aGeo), (duration_minutes, directions_link) in scheduler.getRouteTimes(items):
+    if duration_minutes == None and directions_link == None:
+      continue
+    if (maxRouteTimeMinutes==0 or duration_minutes>=minRouteTimeMinutes) and (maxRouteTimeMinutes==0 or duration_minutes<=maxRouteTimeMinutes):
+      n = n + 1
+      conditionedMountains.add(aMountainName)
+      _detailParkInfo = detailParkInfo[f'{aGeo[0]}_{aGeo[1]}']
+      if not args.mountainNameOnly:
+        _detailParkInfo["登山口への移動時間"] = '{:d}分 ({:02d}:{:02d})'.format(duration_minutes, int(duration_minutes/60), duration_minutes % 60)
+        # the stale route time is shown as 約 and the estimated one as 推定
+        marker = "推定" if aGeo in estimatedGeos else "約" if aGeo in approximateGeos else ""
+        _detailParkInfo["登山口への移動時間"] = marker + _detailParkInfo["登山口への移動時間"]
+        if args.compare:
+            # tozanguchi compare dump mode
+            if _detailParkInfo['主要登山ルート']:
+              for aRoute in _detailParkInfo['主要登山ルート']:
+                if aMountainName in aRoute:
+                  route_time = aRoute[len(aMountainName):]
+                  pos = route_time.find("：")
+                  if pos!=-1:
+                    route_time = route_time[pos+1:len(route_time)-1]
+                  transport_time = _detailParkInfo["登山口への移動時間"]
+                  pos = transport_time.find("(")
+                  if pos!=-1:
+                    transport_time = marker + transport_time[pos+1:len(transport_time)-1]
+                  print(f'{StrUtil.ljust_jp(aMountainName,12)} {StrUtil.ljust_jp(_detailParkInfo["登山口"],18)} {StrUtil.ljust_jp(transport_time,6)} {StrUtil.ljust_jp(route_time,10)} {_detailParkInfo["駐車台数"]}')
+        else:
+          if args.noDetails:
+            print(f'{aMountainName} {aGeo[0]} {aGeo[1]} {duration_minutes} {"estimated" if aGeo in estimatedGeos else directions_link}')
           else:
-            if args.noDetails:
-              print(f'{aMountainName} {aGeo[0]} {aGeo[1]} {duration_minutes} {directions_link}')
-            else:
-              print(aMountainName)
-              TozanguchiUtil.showListAndDic(_detailParkInfo, 22, 4)
-        if args.openNavi:
-          if n>=2:
-            time.sleep(0.5)
-          ExecUtil.open(directions_link)
-        if args.openPark and "url" in _detailParkInfo:
-          ExecUtil.open(_detailParkInfo["url"])
+            print(aMountainName)
+            TozanguchiUtil.showListAndDic(_detailParkInfo, 22, 4)
+      if args.openNavi and directions_link:
+        if n>=2:
+          time.sleep(0.5)
+        ExecUtil.open(directions_link)
+      if args.openPark and "url" in _detailParkInfo:
+        ExecUtil.open(_detailParkInfo["url"])
 
   if args.mountainNameOnly:
     conditionedMountains = sorted(conditionedMountains)
     print( " ".join(conditionedMountains) )
+  Stats.addPhase("route time and output", time.perf_counter() - start)
+
+  # the result is already shown. wait for the background refresh to store the cache
+  if refresher and waitForRefresh:
+    sys.stdout.flush()
+    with Stats.phase("background refresh wait"):
+      refresher.join()
+
+  if args.stats:
+    sys.stdout.flush()
+    Stats.printReport( args.statsFormat )
+
+  return refresher
+
+
+if __name__=="__main__":
+  main()
@@ -13,7 +13,6 @@
 #   limitations under the License.
 
 import sys
-import requests
 import argparse
 import unicodedata
 import csv
@@ -25,21 +24,161 @@ import re
 import shlex
 import subprocess
 import time
+import threading
+import contextvars
+import bisect
+import hashlib
+import pickle
+import marshal
+import importlib.util
+import math
+
+from tozanguchi_http import HttpUtil, HostThrottle
+from tozanguchi_parser import TozanguchiParser
+from tozanguchi_dic_file import TozanguchiDicFile
+from tozanguchi_cache_store import ParkCacheStore, JsonDirParkCacheStore, SqliteParkCacheStore, ParkCacheMigration
+from tozanguchi_archive import RawPageArchive
+from tozanguchi_stats import Stats
+
+# numpy is optional and imported on demand (see TrailheadTable)
+numpy = None
+
+
+class DataSnapshot:
+  VERSION = 2
+  SNAPSHOT_PATH = os.path.expanduser("~")+"/.cache/tozanguchi/dataSnapshot.marshal"
+  SOURCE_MODULES = ["tozanguchiDic", "mountainInfoDic"]
+  data = None
+  tozanguchiDic = None
 
-from bs4 import BeautifulSoup
-import tozanguchiDic
-import mountainInfoDic
+  @staticmethod
+  def getSource(name, path):
+    if path and os.path.exists(path):
+      stat = os.stat(path)
+      return [name, path, stat.st_mtime_ns, stat.st_size]
+    return [name, path, None, None]
+
+  @staticmethod
+  def getSources():
+    result = []
+    for aModule in DataSnapshot.SOURCE_MODULES:
+      spec = importlib.util.find_spec(aModule)
+      path = spec.origin if spec else None
+      result.append( DataSnapshot.getSource(aModule, path) )
+      if aModule == "tozanguchiDic" and path:
+        # the data file emitted by tozanguchi_list_mountains.py --format jsonl
+        result.append( DataSnapshot.getSource(aModule+TozanguchiDicFile.DATA_EXT, TozanguchiDicFile.getDataPath(path)) )
+    return result
+
+  # the module updated after the import is reloaded in the long running process
+  @staticmethod
+  def importModule(name):
+    module = sys.modules.get(name)
+    return importlib.reload(module) if module else importlib.import_module(name)
+
+  @staticmethod
+  def build(sources):
+    _tozanguchiDic = DataSnapshot.importModule("tozanguchiDic").getTozanguchiDic()
+    _mountainInfoDic = DataSnapshot.importModule("mountainInfoDic").getMountainInfoDic()
+    # the data file is kept out of the snapshot and loaded on demand
+    isDicFile = isinstance(_tozanguchiDic, TozanguchiDicFile)
+    return {
+      "version": DataSnapshot.VERSION,
+      "sources": sources,
+      "tozanguchiDic": None if isDicFile else _tozanguchiDic,
+      "tozanguchiDicPath": os.path.abspath(_tozanguchiDic.path) if isDicFile else None,
+      "mountainInfoDic": _mountainInfoDic,
+      "mountainKeyIndex": PrefixIndex( _tozanguchiDic.keys() ).getState(),
+      "mountainInfoIndex": SubstringIndex( _mountainInfoDic.keys() ).getState(),
+      "tozanguchiIndex": TozanguchiUtil.buildTozanguchiIndex( _tozanguchiDic )
+    }
+
+  @staticmethod
+  def load():
+    if DataSnapshot.data == None:
+      start = time.perf_counter()
+      sources = DataSnapshot.getSources()
+      data = None
+      try:
+        with open(DataSnapshot.SNAPSHOT_PATH, 'rb') as f:
+          data = marshal.load(f)
+      except:
+        data = None
+      if not isinstance(data, dict) or data.get("version") != DataSnapshot.VERSION or data.get("sources") != sources:
+        Stats.count("snapshot.rebuild")
+        data = DataSnapshot.build(sources)
+        try:
+          snapshotDir = os.path.dirname(DataSnapshot.SNAPSHOT_PATH)
+          if not os.path.exists(snapshotDir):
+            os.makedirs(snapshotDir)
+          tmpPath = f'{DataSnapshot.SNAPSHOT_PATH}.{os.getpid()}.tmp'
+          with open(tmpPath, 'wb') as f:
+            marshal.dump(data, f)
+          os.replace(tmpPath, DataSnapshot.SNAPSHOT_PATH)
+        except:
+          pass
+      DataSnapshot.data = data
+      Stats.addPhase("load dictionary", time.perf_counter() - start)
+    return DataSnapshot.data
+
+  @staticmethod
+  def get(key):
+    return DataSnapshot.load().get(key)
+
+  # True if the dictionaries are updated e.g. by tozanguchi_list_mountains.py while the server is running
+  @staticmethod
+  def isUpdated():
+    return DataSnapshot.data != None and DataSnapshot.getSources() != DataSnapshot.data.get("sources")
+
+  # rebuild the snapshot and the indexes. returns the new tozanguchiDic for the modules which imported it
+  @staticmethod
+  def reload():
+    global tozanguchiDic
+    DataSnapshot.data = None
+    DataSnapshot.tozanguchiDic = None
+    MountainDetailInfo.mountainInfoDic = MountainDetailInfo.mountainInfoIndex = MountainDetailInfo.mountainInfos = None
+    TozanguchiUtil.mountainKeyIndex = TozanguchiUtil.tozanguchiIndex = None
+    TrailheadGeoIndex.index = None
+    tozanguchiDic = DataSnapshot.getTozanguchiDic()
+    return tozanguchiDic
+
+  @staticmethod
+  def getTozanguchiDic():
+    if DataSnapshot.tozanguchiDic == None:
+      path = DataSnapshot.get("tozanguchiDicPath")
+      DataSnapshot.tozanguchiDic = TozanguchiDicFile(path) if path else DataSnapshot.get("tozanguchiDic")
+    return DataSnapshot.tozanguchiDic
 
-tozanguchiDic = tozanguchiDic.getTozanguchiDic()
 
 class MountainDetailInfo:
-  mountainInfoDic = mountainInfoDic.getMountainInfoDic()
+  mountainInfoDic = None
+  mountainInfoIndex = None
+  mountainInfos = None
+
+  @staticmethod
+  def getMountainInfoDic():
+    if MountainDetailInfo.mountainInfoDic == None:
+      MountainDetailInfo.mountainInfoDic = DataSnapshot.get("mountainInfoDic")
+    return MountainDetailInfo.mountainInfoDic
 
+  @staticmethod
+  def getMountainInfoIndex():
+    if MountainDetailInfo.mountainInfoIndex == None:
+      _mountainInfoDic = MountainDetailInfo.getMountainInfoDic()
+      if _mountainInfoDic is DataSnapshot.get("mountainInfoDic"):
+        MountainDetailInfo.mountainInfoIndex = SubstringIndex.fromState( DataSnapshot.get("mountainInfoIndex") )
+      else:
+        MountainDetailInfo.mountainInfoIndex = SubstringIndex( _mountainInfoDic.keys() )
+      MountainDetailInfo.mountainInfos = list( _mountainInfoDic.values() )
+    return MountainDetailInfo.mountainInfoIndex
+
+  @staticmethod
   def getMountainDetailInfo(mountainName):
     result = None
 
-    if( mountainName in MountainDetailInfo.mountainInfoDic):
-      result = MountainDetailInfo.mountainInfoDic[mountainName]
+    _mountainInfoDic = MountainDetailInfo.getMountainInfoDic()
+    if( mountainName in _mountainInfoDic):
+      result = _mountainInfoDic[mountainName]
     else:
       pos = mountainName.find("_")
       if pos != -1:
@@ -47,10 +186,9 @@ class MountainDetailInfo:
       pos = mountainName.find("（")
       if pos != -1:
         mountainName = mountainName[0 : pos - 1 ]
-      for aMountainName, anInfo in MountainDetailInfo.mountainInfoDic.items():
-        if aMountainName.find( mountainName )!=-1:
-          result = anInfo
-          break
+      pos = MountainDetailInfo.getMountainInfoIndex().findFirst( mountainName )
+      if pos != -1:
+        result = MountainDetailInfo.mountainInfos[pos]
 
     return result
 
@@ -75,15 +213,226 @@ class StrUtil:
     return result
 
 
+class PrefixIndex:
+  def __init__(self, keys):
+    self.order = {}
+    for i, aKey in enumerate(keys):
+      self.order[aKey] = i
+    self.sortedKeys = sorted(self.order.keys())
+
+  def getKeysWithPrefix(self, prefix):
+    result = []
+    i = bisect.bisect_left(self.sortedKeys, prefix)
+    while i < len(self.sortedKeys) and self.sortedKeys[i].startswith(prefix):
+      result.append( self.sortedKeys[i] )
+      i = i + 1
+    # keep the original key order
+    return sorted( result, key=lambda aKey: self.order[aKey] )
+
+  def getState(self):
+    return [self.order, self.sortedKeys]
+
+  @staticmethod
+  def fromState(state):
+    result = PrefixIndex([])
+    result.order, result.sortedKeys = state
+    return result
+
+
+class SubstringIndex:
+  def __init__(self, keys):
+    self.keys = list(keys)
+    self.postings = {}
+    for i, aKey in enumerate(self.keys):
+      for aGram in SubstringIndex.getGrams(aKey):
+        if not aGram in self.postings:
+          self.postings[aGram] = []
+        postings = self.postings[aGram]
+        if not postings or postings[-1] != i:
+          postings.append(i)
+
+  @staticmethod
+  def getGrams(key):
+    # character unigram and bigram
+    result = set(key)
+    for i in range(len(key)-1):
+      result.add( key[i:i+2] )
+    return result
+
+  # returns the first position of key which contains the value as same as find()!=-1 over the keys
+  def findFirst(self, value):
+    if value == "":
+      return 0 if self.keys else -1
+
+    grams = [value] if len(value) == 1 else [value[i:i+2] for i in range(len(value)-1)]
+    candidates = None
+    for aGram in sorted( set(grams), key=lambda aGram: len(self.postings.get(aGram, [])) ):
+      postings = self.postings.get(aGram)
+      if not postings:
+        return -1
+      candidates = set(postings) if candidates == None else candidates.intersection(postings)
+      if not candidates:
+        return -1
+
+    for i in sorted(candidates):
+      if self.keys[i].find(value) != -1:
+        return i
+    return -1
+
+  def getState(self):
+    return [self.keys, self.postings]
+
+  @staticmethod
+  def fromState(state):
+    result = SubstringIndex([])
+    result.keys, result.postings = state
+    return result
+
+
+class ParkRecord(dict):
+  VERSION = 1
+
+  def __init__(self, data, digest = None):
+    super().__init__(data)
+    if not ParkRecord.isValidDigest(digest):
+      digest = ParkRecord.getDigest(data)
+    self.digest = digest
+    self.climbTimeMinutes = {}
+
+  def copy(self):
+    return ParkRecord(self, self.digest)
+
+  @staticmethod
+  def isValidDigest(digest):
+    return digest != None and digest.get("version") == ParkRecord.VERSION
+
+  @staticmethod
+  def parseRoutes(routes):
+    result = []
+    for aRoute in routes.split("）"):
+      aRoute = aRoute.strip()
+      if aRoute:
+        result.append( aRoute+")" )
+    return result
+
+  @staticmethod
+  def parseRouteMinutes(aRoute):
+    result = None
+    pos = aRoute.find("往復所要時間：")
+    if pos!=-1:
+      pos2 = aRoute.find("分)", pos)
+      if pos2!=-1:
+        value = aRoute[pos+7:pos2]
+        try:
+          pos = value.find("時間")
+          if pos!=-1:
+            result = int(value[0:pos])*60+int(value[pos+2:len(value)])
+          else:
+            result = int(value)
+        except ValueError:
+          result = None
+    return result
+
+  @staticmethod
+  def parseTheNumberOfCarPark(parks):
+    pos = parks.find("台")
+    if pos!=-1:
+      parks = parks[0:pos]
+    return StrUtil.toInt( parks )
+
+  @staticmethod
+  def getDigest(data):
+    routes = []
+    if isinstance(data.get("主要登山ルート"), str):
+      routes = ParkRecord.parseRoutes( data["主要登山ルート"] )
+    latitude = longitude = None
+    if "緯度経度" in data:
+      latitude, longitude = GeoUtil.getLatitudeLongitude( data["緯度経度"] )
+    return {
+      "version": ParkRecord.VERSION,
+      "routes": routes,
+      "routeMinutes": [ ParkRecord.parseRouteMinutes(aRoute) for aRoute in routes ],
+      "park": ParkRecord.parseTheNumberOfCarPark( data["駐車台数"] ) if "駐車台数" in data else 0,
+      "latitude": float(latitude) if latitude else None,
+      "longitude": float(longitude) if longitude else None
+    }
+
+  def getClimbTimeMinutes(self, mountainNames):
+    # the climb time of the last route which starts with one of the mountain names
+    mountainNames = tuple(mountainNames)
+    if not mountainNames in self.climbTimeMinutes:
+      result = 0
+      for aRoute, minutes in zip( self.digest["routes"], self.digest["routeMinutes"] ):
+        if minutes != None and aRoute.startswith(mountainNames):
+          result = minutes
+      self.climbTimeMinutes[mountainNames] = result
+    return self.climbTimeMinutes[mountainNames]
+
+
 class TozanguchiCache:
   CACHE_BASE_DIR = os.path.expanduser("~")+"/.cache/tozanguchi"
-  CACHE_EXPIRE_HOURS = 24*365 # approx. 1 year
+  CACHE_EXPIRE_HOURS = 24*365 # approx. 1 year. expired entry is revalidated by conditional GET
+  # --maxAge of the current context. the entry older than this is revalidated regardless of the stored expiry
+  maxAgeHours = contextvars.ContextVar("maxAgeHours", default=None)
+  CACHE_BACKEND_SQLITE = "sqlite"
+  CACHE_BACKEND_JSON = "json"
+  CACHE_BACKEND = CACHE_BACKEND_SQLITE
+  CACHE_DB_FILENAME = "parkCache.db"
+  ARCHIVE_DIR = CACHE_BASE_DIR+"/archive"
+  store = None
+  records = None
+  recordsModifiedTime = None
+  archive = None
 
   @staticmethod
   def ensureCacheStorage():
     if not os.path.exists(TozanguchiCache.CACHE_BASE_DIR):
       os.makedirs(TozanguchiCache.CACHE_BASE_DIR)
 
+  @staticmethod
+  def setBackend(backend):
+    if TozanguchiCache.CACHE_BACKEND != backend:
+      if TozanguchiCache.store != None:
+        TozanguchiCache.store.close()
+      TozanguchiCache.store = None
+      TozanguchiCache.records = None
+      TozanguchiCache.CACHE_BACKEND = backend
+
+  @staticmethod
+  def getJsonDirStore():
+    return JsonDirParkCacheStore(TozanguchiCache.CACHE_BASE_DIR, TozanguchiCache.CACHE_EXPIRE_HOURS)
+
+  @staticmethod
+  def getStore():
+    if TozanguchiCache.store == None:
+      if TozanguchiCache.CACHE_BACKEND == TozanguchiCache.CACHE_BACKEND_JSON:
+        TozanguchiCache.store = TozanguchiCache.getJsonDirStore()
+      else:
+        TozanguchiCache.ensureCacheStorage()
+        store = SqliteParkCacheStore(os.path.join(TozanguchiCache.CACHE_BASE_DIR, TozanguchiCache.CACHE_DB_FILENAME))
+        if store.isEmpty():
+          # migrate one-json-file-per-url layout into the single file store
+          ParkCacheMigration.migrate(TozanguchiCache.getJsonDirStore(), store)
+        TozanguchiCache.store = store
+    return TozanguchiCache.store
+
+  # True if the loaded records are updated e.g. by tozanguchi_warm_cache.py while the server is running
+  @staticmethod
+  def isUpdated():
+    return TozanguchiCache.records != None and TozanguchiCache.getStore().getModifiedTime() != TozanguchiCache.recordsModifiedTime
+
+  # the records are loaded again on demand. the running query keeps using the records it got
+  @staticmethod
+  def reload():
+    TozanguchiCache.records = None
+    TrailheadGeoIndex.index = None
+
+  @staticmethod
+  def getArchive():
+    if TozanguchiCache.archive == None:
+      TozanguchiCache.archive = RawPageArchive(TozanguchiCache.ARCHIVE_DIR)
+    return TozanguchiCache.archive
+
   @staticmethod
   def getCacheFilename(url):
     result = url
@@ -97,17 +446,28 @@ class TozanguchiCache:
     return TozanguchiCache.CACHE_BASE_DIR+"/"+TozanguchiCache.getCacheFilename(url)
 
   @staticmethod
-  def storeParkInfoAsCache(url, result):
-    TozanguchiCache.ensureCacheStorage()
-    cachePath = TozanguchiCache.getCachePath( url )
-    dt_now = datetime.datetime.now()
-    result["lastUpdate"] = dt_now.strftime("%Y-%m-%d %H:%M:%S")
-
-    with open(cachePath, 'w', encoding='UTF-8') as f:
-      json.dump(result, f, indent = 4, ensure_ascii=False)
-      f.close()
+  def storeParkInfoAsCache(url, result, etag = None, lastModified = None):
+    key = TozanguchiCache.getCacheFilename(url)
+    lastUpdate = time.time()
+    expire = lastUpdate + TozanguchiCache.CACHE_EXPIRE_HOURS * 3600
+    digest = result.digest if isinstance(result, ParkRecord) else ParkRecord.getDigest(result)
+    record = ParkCacheStore.getRecord(dict(result), lastUpdate, expire, etag, lastModified, digest)
+    with Stats.timed("park cache write"):
+      TozanguchiCache.getStore().put(key, record)
+    records = TozanguchiCache.records
+    if records != None:
+      records[key] = record
 
-    del result["lastUpdate"]
+  @staticmethod
+  def invalidate(urls):
+    store = TozanguchiCache.getStore()
+    for aUrl in urls:
+      key = TozanguchiCache.getCacheFilename(aUrl)
+      store.remove(key)
+      TozanguchiCache.getArchive().remove(key)
+      records = TozanguchiCache.records
+      if records != None:
+        records.pop(key, None)
 
   @staticmethod
   def isValidCache( lastUpdateString ):
@@ -120,89 +480,292 @@ class TozanguchiCache:
     return result
 
   @staticmethod
-  def restoreParkInfoAsCache(cachePath):
-    result = None
-    with open(cachePath, 'r', encoding='UTF-8') as f:
-      _result = json.load(f)
+  def upgradeRecord(record):
+    # digest the record stored by the older version
+    result = False
+    if not ParkRecord.isValidDigest( record.get("digest") ):
+      record["digest"] = ParkRecord.getDigest( record["data"] )
+      result = True
+    return result
+
+  @staticmethod
+  def loadAllCache():
+    # the records may be dropped by reload() of the concurrent query
+    records = TozanguchiCache.records
+    if records == None:
+      with Stats.phase("load all park cache"):
+        TozanguchiCache.recordsModifiedTime = TozanguchiCache.getStore().getModifiedTime()
+        records = TozanguchiCache.getStore().loadAll()
+      upgradedRecords = {}
+      for aKey, aRecord in records.items():
+        if TozanguchiCache.upgradeRecord( aRecord ):
+          upgradedRecords[aKey] = aRecord
+      if upgradedRecords:
+        TozanguchiCache.getStore().putAll( upgradedRecords )
+      TozanguchiCache.records = records
+    return records
 
-    if "lastUpdate" in _result:
-      if TozanguchiCache.isValidCache( _result["lastUpdate"] ):
-        del _result["lastUpdate"]
-        result = _result
+  @staticmethod
+  def getCacheRecord(url):
+    key = TozanguchiCache.getCacheFilename(url)
+    records = TozanguchiCache.records
+    if records != None:
+      return records.get(key)
+    with Stats.timed("park cache read"):
+      record = TozanguchiCache.getStore().get(key)
+    if record != None and TozanguchiCache.upgradeRecord( record ):
+      TozanguchiCache.getStore().put( key, record )
+    return record
+
+  @staticmethod
+  def getParkRecord(record):
+    return ParkRecord( record["data"], record.get("digest") )
 
+  @staticmethod
+  def getExpire(record):
+    # the expiry stored with the entry unless --maxAge is specified
+    result = record["expire"]
+    maxAgeHours = TozanguchiCache.maxAgeHours.get()
+    if maxAgeHours:
+      result = min( result, record["lastUpdate"] + maxAgeHours * 3600 )
     return result
 
+  @staticmethod
+  def isValidRecord(record):
+    return time.time() < TozanguchiCache.getExpire( record )
+
+  # count the cache lookup as hit, expired or miss
+  @staticmethod
+  def countLookup(record, result):
+    if result != None:
+      Stats.count("parkCache.hit")
+    elif record != None:
+      Stats.count("parkCache.expired")
+    else:
+      Stats.count("parkCache.miss")
+
   @staticmethod
   def getCachedParkInfo(url):
     result = None
-    cachePath = TozanguchiCache.getCachePath( url )
-    if os.path.exists( cachePath ):
-      result = TozanguchiCache.restoreParkInfoAsCache( cachePath )
+    record = TozanguchiCache.getCacheRecord( url )
+    if record != None and TozanguchiCache.isValidRecord( record ):
+      result = TozanguchiCache.getParkRecord( record )
+    TozanguchiCache.countLookup( record, result )
 
     return result
 
   @staticmethod
   def getRawParkInfo(url):
-    result = {}
-    res = requests.get(url)
-    soup = BeautifulSoup(res.text, 'html.parser')
-    if None != soup:
-      dts = soup.find_all("dt")
-      dds = soup.find_all("dd")
-      # i should be starting from 0 and shoud use dts[i], dds[i] and should not require to split
-      i = 1
-      while( i<len(dts) and i<len(dds) ):
-        key = dts[i*2-1].text.strip().split("\n")[0].strip()
-        value = dds[i].text.strip().split("\n")[0].strip()
-        result[key] = value
-        i=i+1
+    res = HttpUtil.get(url)
+    return TozanguchiCache.parseRawParkInfo(res.text)
+
+  @staticmethod
+  def parseRawParkInfo(html):
+    with Stats.timed("parse park page"):
+      return TozanguchiParser.parseParkInfo(html)
 
+  @staticmethod
+  def fetchParkInfo(url, record = None):
+    etag = lastModified = None
+    if record != None:
+      etag = record.get("etag")
+      lastModified = record.get("lastModified")
+    res = HttpUtil.get(url, etag, lastModified)
+    if res.status_code >= 400:
+      # keep the cached park as is. the error page must not overwrite it
+      if record != None:
+        print(f'failed to refresh {url} : {res.status_code}', file=sys.stderr)
+        return TozanguchiCache.getParkRecord( record )
+      # the caller skips the park
+      print(f'failed to get {url} : {res.status_code}', file=sys.stderr)
+      return None
+    etag, lastModified = HttpUtil.getValidators(res, etag, lastModified)
+    if record != None and HttpUtil.isNotModified(res):
+      # revalidated. just extend the expiry
+      Stats.count("parkCache.revalidated")
+      result = TozanguchiCache.getParkRecord( record )
+    else:
+      TozanguchiCache.archiveRawParkInfo( url, res.text )
+      result = TozanguchiCache.getParkRecordFromRawParkInfo( TozanguchiCache.parseRawParkInfo( res.text ) )
+    TozanguchiCache.storeParkInfoAsCache( url, result, etag, lastModified )
     return result
 
   @staticmethod
-  def getParkInfo(url, forceReload = False, noneIfCacheMiss = False):
-    result = TozanguchiCache.getCachedParkInfo( url )
+  def getParkRecordFromRawParkInfo(result):
+    latitude = longitude = None
+    if "緯度経度" in result:
+      latitude, longitude = GeoUtil.getLatitudeLongitude(result["緯度経度"])
+      result["緯度経度"] = f"{latitude} {longitude}"
+    try:
+      # you need to symlink get_mapcode in the same path
+      from get_mapcode import get_mapcode
+      result["mapcode"] = get_mapcode(latitude, longitude)
+    except:
+      pass
+    return ParkRecord( result )
+
+  # keep the raw page to rebuild the park cache by --reparse without the download
+  @staticmethod
+  def archiveRawParkInfo(url, html):
+    try:
+      with Stats.timed("archive raw page"):
+        TozanguchiCache.getArchive().put( TozanguchiCache.getCacheFilename(url), url, html )
+    except Exception as e:
+      print(f'failed to archive {url} : {e}', file=sys.stderr)
+
+  # rebuild the park cache from the archived raw pages. the expiry and the validators of the cached park are kept
+  @staticmethod
+  def reparseAll(processes = None):
+    records = {}
+    with Stats.phase("parse archived pages"):
+      pages = TozanguchiCache.getArchive().reparse(processes)
+    cachedRecords = TozanguchiCache.loadAllCache()
+    for key, url, fetched, parkInfo in pages:
+      if parkInfo == None:
+        print(f'failed to parse the archived {url}', file=sys.stderr)
+        continue
+      result = TozanguchiCache.getParkRecordFromRawParkInfo( dict(parkInfo) )
+      record = cachedRecords.get(key)
+      if record != None:
+        records[key] = ParkCacheStore.getRecord(dict(result), record["lastUpdate"], record["expire"], record.get("etag"), record.get("lastModified"), result.digest)
+      else:
+        records[key] = ParkCacheStore.getRecord(dict(result), fetched, fetched + TozanguchiCache.CACHE_EXPIRE_HOURS * 3600, None, None, result.digest)
+    if records:
+      TozanguchiCache.getStore().putAll( records )
+      cachedRecords.update( records )
+    return len(records)
+
+  # cachedRecords : {url:record} which are already read from the store
+  @staticmethod
+  def getParkInfo(url, forceReload = False, noneIfCacheMiss = False, cachedRecords = None):
+    record = cachedRecords[url] if cachedRecords != None and url in cachedRecords else TozanguchiCache.getCacheRecord( url )
+    result = None
+    if record != None and TozanguchiCache.isValidRecord( record ):
+      result = TozanguchiCache.getParkRecord( record )
+    TozanguchiCache.countLookup( record, result )
     if (result == None or forceReload) and (noneIfCacheMiss == False):
-      result = TozanguchiCache.getRawParkInfo( url )
-      latitude = longitude = None
-      if "緯度経度" in result:
-        latitude, longitude = GeoUtil.getLatitudeLongitude(result["緯度経度"])
-        result["緯度経度"] = f"{latitude} {longitude}"
-      try:
-        # you need to symlink get_mapcode in the same path
-        from get_mapcode import get_mapcode
-        result["mapcode"] = get_mapcode(latitude, longitude)
-      except:
-        pass
-      TozanguchiCache.storeParkInfoAsCache( url, result )
+      # --renew downloads the page unconditionally
+      result = TozanguchiCache.fetchParkInfo( url, None if forceReload else record )
     return result
 
 
 
+class TozanguchiFetcher:
+  DEFAULT_MAX_WORKERS = 4
+  DEFAULT_MAX_PER_HOST = 2
+  DEFAULT_INTERVAL_SEC = 0.5
+
+  def __init__(self, maxWorkers = None, maxPerHost = None, interval = None):
+    self.maxWorkers = maxWorkers if maxWorkers else TozanguchiFetcher.DEFAULT_MAX_WORKERS
+    self.maxPerHost = maxPerHost if maxPerHost else TozanguchiFetcher.DEFAULT_MAX_PER_HOST
+    self.interval = interval if interval!=None else TozanguchiFetcher.DEFAULT_INTERVAL_SEC
+    self.throttle = HostThrottle(self.maxPerHost, self.interval)
+
+  def _fetch(self, url, forceReload, cachedRecords):
+    try:
+      return self.throttle.call(url, TozanguchiFetcher._fetchParkInfo, url, forceReload, cachedRecords)
+    except:
+      return None
+
+  @staticmethod
+  def _fetchParkInfo(url, forceReload, cachedRecords = None):
+    record = None
+    if not forceReload:
+      record = cachedRecords[url] if cachedRecords != None and url in cachedRecords else TozanguchiCache.getCacheRecord(url)
+    return TozanguchiCache.fetchParkInfo(url, record)
+
+  # cachedRecords : {url:record} which are already read from the store
+  def fetch(self, urls, forceReload = False, cachedRecords = None):
+    result = {}
+    if urls:
+      from concurrent.futures import ThreadPoolExecutor
+      with ThreadPoolExecutor(max_workers=self.maxWorkers) as executor:
+        futures = {}
+        for aUrl in urls:
+          # the worker inherits the stats and the output of the caller's context
+          futures[aUrl] = executor.submit(contextvars.copy_context().run, self._fetch, aUrl, forceReload, cachedRecords)
+        for aUrl, aFuture in futures.items():
+          parkInfo = aFuture.result()
+          if parkInfo != None:
+            result[aUrl] = parkInfo
+    return result
+
+
 class TozanguchiUtil:
+  # cachedRecords : {url:record} is filled by the read records to reuse them without reading the store again
   @staticmethod
-  def getMountainKeys(key):
+  def getUrlsToFetch(mountainKeys, excludes, forceReload = False, cachedRecords = None):
     result = []
-    for dicKey, value in tozanguchiDic.items():
-      if dicKey.startswith(key):
-        result.append( dicKey )
+    urls = set()
+    for aMountain in mountainKeys:
+      if not MountainFilterUtil.isMatchedMountainRobust( excludes, aMountain ):
+        for aTozanguchi, theUrl in tozanguchiDic[aMountain].items():
+          if not theUrl in urls:
+            urls.add( theUrl )
+            if forceReload:
+              result.append( theUrl )
+              continue
+            record = TozanguchiCache.getCacheRecord( theUrl )
+            if cachedRecords != None:
+              cachedRecords[theUrl] = record
+            if record == None or not TozanguchiCache.isValidRecord( record ):
+              result.append( theUrl )
     return result
 
+  mountainKeyIndex = None
+
+  @staticmethod
+  def getMountainKeyIndex():
+    if TozanguchiUtil.mountainKeyIndex == None:
+      if tozanguchiDic is DataSnapshot.getTozanguchiDic():
+        TozanguchiUtil.mountainKeyIndex = PrefixIndex.fromState( DataSnapshot.get("mountainKeyIndex") )
+      else:
+        TozanguchiUtil.mountainKeyIndex = PrefixIndex( tozanguchiDic.keys() )
+    return TozanguchiUtil.mountainKeyIndex
+
+  @staticmethod
+  def getMountainKeys(key):
+    return TozanguchiUtil.getMountainKeyIndex().getKeysWithPrefix(key)
+
+  tozanguchiIndex = None
+
+  @staticmethod
+  def buildTozanguchiIndex(_tozanguchiDic):
+    result = {}
+    for aMountain, tozanguchis in _tozanguchiDic.items():
+      for aTozanguchi, theUrl in tozanguchis.items():
+        for aKey in [aTozanguchi, theUrl]:
+          if not aKey in result:
+            result[aKey] = []
+          result[aKey].append( (aMountain, aTozanguchi) )
+    return result
+
+  @staticmethod
+  def getTozanguchiIndex():
+    if TozanguchiUtil.tozanguchiIndex == None:
+      if tozanguchiDic is DataSnapshot.getTozanguchiDic():
+        TozanguchiUtil.tozanguchiIndex = DataSnapshot.get("tozanguchiIndex")
+      else:
+        TozanguchiUtil.tozanguchiIndex = TozanguchiUtil.buildTozanguchiIndex( tozanguchiDic )
+    return TozanguchiUtil.tozanguchiIndex
+
+  # returns [(mountain key, tozanguchi name)] of the tozanguchi name or url
+  @staticmethod
+  def getTozanguchis(tozanguchiOrUrl):
+    return TozanguchiUtil.getTozanguchiIndex().get(tozanguchiOrUrl, [])
+
   @staticmethod
   def maintainParkInfo(result):
     if result!=None and "主要登山ルート" in result:
-      routes = result["主要登山ルート"].split("）")
-      newRoutes = []
-      for aRoute in routes:
-        aRoute = aRoute.strip()
-        if aRoute:
-          newRoutes.append( aRoute+")" )
-      result["主要登山ルート"] = newRoutes
+      if isinstance(result, ParkRecord):
+        result["主要登山ルート"] = list( result.digest["routes"] )
+      else:
+        result["主要登山ルート"] = ParkRecord.parseRoutes( result["主要登山ルート"] )
     return result
 
   @staticmethod
-  def getParkInfo(url, forceReload = False, noneIfCacheMiss = False):
-    result = TozanguchiCache.getParkInfo(url, forceReload, noneIfCacheMiss)
+  def getParkInfo(url, forceReload = False, noneIfCacheMiss = False, cachedRecords = None):
+    result = TozanguchiCache.getParkInfo(url, forceReload, noneIfCacheMiss, cachedRecords)
 
     return TozanguchiUtil.maintainParkInfo(result)
 
@@ -243,6 +806,9 @@ class TozanguchiUtil:
       mountainName = mountainName[0:pos-1]
     _mountains = mountainName.split("・")
 
+    if isinstance(parkInfo, ParkRecord):
+      return parkInfo.getClimbTimeMinutes( _mountains )
+
     if "主要登山ルート" in parkInfo:
       climbTimes = parkInfo["主要登山ルート"]
       for aClimbTime in climbTimes:
@@ -279,12 +845,10 @@ class TozanguchiUtil:
   @staticmethod
   def getTheNumberOfCarPark(parkInfo):
     result = 0
-    if "駐車台数" in parkInfo:
-      parks = parkInfo["駐車台数"]
-      pos = parks.find("台")
-      if pos!=-1:
-        parks = parks[0:pos]
-      result = StrUtil.toInt( parks ) #int( parks )
+    if isinstance(parkInfo, ParkRecord):
+      result = parkInfo.digest["park"]
+    elif "駐車台数" in parkInfo:
+      result = ParkRecord.parseTheNumberOfCarPark( parkInfo["駐車台数"] )
 
     return result
 
@@ -318,7 +882,158 @@ class TozanguchiUtil:
             print( "  " + StrUtil.ljust_jp(aTozanguchi, 18) + " : " + aClimbTime + theNumOfCarInPark + "\t" + url)
             break;
 
+class TrailheadTable:
+  @staticmethod
+  def isAvailable():
+    global numpy
+    if numpy == None:
+      try:
+        import numpy
+      except ImportError:
+        return False
+    return True
+
+  def __init__(self, mountainKeys, excludes):
+    self.mountains = []
+    self.rows = []
+    mountainIndexes = []
+    climbTimes = []
+    nameClimbTimes = []
+    parks = []
+    for aMountain in mountainKeys:
+      if not MountainFilterUtil.isMatchedMountainRobust( excludes, aMountain ):
+        mountainIndex = len(self.mountains)
+        self.mountains.append( aMountain )
+        for aTozanguchi, theUrl in tozanguchiDic[aMountain].items():
+          parkInfo = TozanguchiUtil.getParkInfo(theUrl, False, True)
+          if parkInfo != None:
+            self.rows.append( (aMountain, aTozanguchi, theUrl, parkInfo) )
+            mountainIndexes.append( mountainIndex )
+            climbTimes.append( TozanguchiUtil.getClimbTimeMinutes(aMountain, parkInfo) )
+            # the first sort key of the per-row path
+            nameClimbTimes.append( TozanguchiUtil.getClimbTimeMinutes(aMountain, aTozanguchi) )
+            parks.append( TozanguchiUtil.getTheNumberOfCarPark(parkInfo) )
+
+    self.mountainIndex = numpy.array(mountainIndexes, dtype=numpy.int32)
+    self.climbTime = numpy.array(climbTimes, dtype=numpy.int32)
+    self.nameClimbTime = numpy.array(nameClimbTimes, dtype=numpy.int32)
+    self.park = numpy.array(parks, dtype=numpy.int32)
+
+  def getMask(self, minClimbTimeMinutes=0, maxClimbTimeMinutes=0, minPark=0):
+    # same condition as TozanguchiUtil.isAcceptableTozanguchi
+    mask = self.park >= int(minPark)
+    if maxClimbTimeMinutes:
+      mask &= self.climbTime <= maxClimbTimeMinutes
+    if minClimbTimeMinutes:
+      mask &= self.climbTime >= minClimbTimeMinutes
+    return mask
+
+  # returns {mountain:[(tozanguchi, url, parkInfo)]} in the dictionary order and {mountain:[tozanguchi]} in the sorted order
+  def getAcceptedTozanguchis(self, minClimbTimeMinutes=0, maxClimbTimeMinutes=0, minPark=0, sortReverse=False):
+    indexes = numpy.flatnonzero( self.getMask(minClimbTimeMinutes, maxClimbTimeMinutes, minPark) )
+    # stable sort per mountain. reverse keeps the original order for the same key as sorted(reverse=True)
+    sign = -1 if sortReverse else 1
+    order = numpy.lexsort( (sign*self.climbTime[indexes], sign*self.nameClimbTime[indexes], self.mountainIndex[indexes]) )
+
+    accepted = {}
+    for i in indexes:
+      aMountain, aTozanguchi, theUrl, parkInfo = self.rows[i]
+      if not aMountain in accepted:
+        accepted[aMountain] = []
+      accepted[aMountain].append( (aTozanguchi, theUrl, parkInfo) )
+    sortedTozanguchis = {}
+    for i in indexes[order]:
+      aMountain, aTozanguchi, theUrl, parkInfo = self.rows[i]
+      if not aMountain in sortedTozanguchis:
+        sortedTozanguchis[aMountain] = []
+      sortedTozanguchis[aMountain].append( aTozanguchi )
+    return accepted, sortedTozanguchis
+
+
+class MountainMatcher:
+  CACHE_DIR = os.path.join(TozanguchiCache.CACHE_BASE_DIR, "matcher")
+  VERSION = 1
+  TERMINAL = None
+  matchers = {}
+
+  def __init__(self, entries = []):
+    self.root = {}
+    for anEntry in entries:
+      self.add( anEntry )
+
+  def add(self, entry):
+    node = self.root
+    for aChar in entry:
+      if not aChar in node:
+        node[aChar] = {}
+      node = node[aChar]
+    node[MountainMatcher.TERMINAL] = True
+
+  # same as MountainFilterUtil.isMatchedMountainRobust: any entry is a prefix of search or search is a prefix of any entry
+  def isMatched(self, search):
+    node = self.root
+    if not node:
+      return False
+    if MountainMatcher.TERMINAL in node:
+      return True
+    for aChar in search:
+      node = node.get(aChar)
+      if node == None:
+        return False
+      if MountainMatcher.TERMINAL in node:
+        return True
+    return True
+
+  @staticmethod
+  def getCsvFiles(csvFilesList):
+    result = []
+    for csvFiles in csvFilesList:
+      for aCsvFile in str(csvFiles).split(","):
+        result.append( os.path.expanduser( aCsvFile ) )
+    return result
+
+  @staticmethod
+  def getCacheKey(csvFiles):
+    stats = []
+    for aCsvFile in csvFiles:
+      aCsvFile = os.path.abspath( aCsvFile )
+      if os.path.exists( aCsvFile ):
+        stat = os.stat( aCsvFile )
+        stats.append( [aCsvFile, stat.st_mtime_ns, stat.st_size] )
+      else:
+        stats.append( [aCsvFile, None, None] )
+    return hashlib.sha1( json.dumps( [MountainMatcher.VERSION, stats] ).encode("utf-8") ).hexdigest()
+
+  @staticmethod
+  def load(csvFilesList):
+    csvFiles = MountainMatcher.getCsvFiles( csvFilesList )
+    cacheKey = MountainMatcher.getCacheKey( csvFiles )
+    if not cacheKey in MountainMatcher.matchers:
+      matcher = MountainMatcher()
+      cachePath = os.path.join( MountainMatcher.CACHE_DIR, cacheKey+".pickle" )
+      try:
+        # the trie is stored as plain dict to share it between __main__ of the both tools
+        with open(cachePath, 'rb') as f:
+          matcher.root = pickle.load(f)
+      except:
+        entries = set()
+        for aCsvFile in csvFiles:
+          entries = entries | MountainFilterUtil.getSetOfCsvs( aCsvFile )
+        matcher = MountainMatcher( entries )
+        try:
+          if not os.path.exists( MountainMatcher.CACHE_DIR ):
+            os.makedirs( MountainMatcher.CACHE_DIR )
+          with open(cachePath, 'wb') as f:
+            pickle.dump(matcher.root, f)
+        except:
+          pass
+      MountainMatcher.matchers[cacheKey] = matcher
+    return MountainMatcher.matchers[cacheKey]
+
+
 class MountainFilterUtil:
+  csvSets = {}
+
   @staticmethod
   def openCsv( fileName, delimiter="," ):
     result = []
@@ -340,6 +1055,8 @@ class MountainFilterUtil:
 
   @staticmethod
   def isMatchedMountainRobust(arrayData, search):
+    if isinstance(arrayData, MountainMatcher):
+      return arrayData.isMatched(search)
     result = False
     for aData in arrayData:
       if aData.startswith(search) or search.startswith(aData):
@@ -353,17 +1070,22 @@ class MountainFilterUtil:
     csvFiles = str(csvFiles).split(",")
     for aCsvFile in csvFiles:
       aCsvFile = os.path.expanduser( aCsvFile )
-      theSet = set( itertools.chain.from_iterable( MountainFilterUtil.openCsv( aCsvFile ) ) )
-      result = result.union( theSet )
+      # read each file once per process
+      mtime = os.path.getmtime( aCsvFile ) if os.path.exists( aCsvFile ) else None
+      if not (aCsvFile, mtime) in MountainFilterUtil.csvSets:
+        MountainFilterUtil.csvSets[ (aCsvFile, mtime) ] = set( itertools.chain.from_iterable( MountainFilterUtil.openCsv( aCsvFile ) ) )
+      result = result.union( MountainFilterUtil.csvSets[ (aCsvFile, mtime) ] )
     return result
 
+  @staticmethod
+  def getMatcher( csvFilesList ):
+    return MountainMatcher.load( csvFilesList )
+
   @staticmethod
   def mountainsIncludeExcludeFromFile( mountains, excludeFile, includeFile ):
     result = set()
     includes = set()
-    excludes = set()
-    for anExclude in excludeFile:
-      excludes =  excludes | MountainFilterUtil.getSetOfCsvs( anExclude )
+    excludes = MountainFilterUtil.getMatcher( excludeFile )
     for anInclude in includeFile:
       includes = includes | MountainFilterUtil.getSetOfCsvs( anInclude )
     for aMountain in includes:
@@ -376,7 +1098,7 @@ class MountainFilterUtil:
   @staticmethod
   def mountainsHashExcludeFromFile( mountains, excludeFile ):
     result = {}
-    excludes = MountainFilterUtil.getSetOfCsvs( excludeFile )
+    excludes = MountainFilterUtil.getMatcher( [excludeFile] )
     for aMountainName, theMountainInfo in mountains:
       if not MountainFilterUtil.isMatchedMountainRobust( excludes, aMountainName ):
         result[ aMountainName ] = theMountainInfo
@@ -395,6 +1117,113 @@ class GeoUtil:
       longitude = match.group(2)
     return latitude, longitude
 
+  EARTH_RADIUS_KM = 6371.0
+
+  @staticmethod
+  def getDistanceKm(latitude1, longitude1, latitude2, longitude2):
+    # haversine
+    lat1 = math.radians(latitude1)
+    lat2 = math.radians(latitude2)
+    a = math.sin((lat2-lat1)/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(math.radians(longitude2-longitude1)/2)**2
+    return 2 * GeoUtil.EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class TrailheadGeoIndex:
+  CELL_DEG = 0.1
+  KM_PER_DEG = math.pi * GeoUtil.EARTH_RADIUS_KM / 180
+  DEFAULT_NEAREST = 10
+  index = None
+
+  # points : [(latitude, longitude, mountain, tozanguchi, url)]
+  def __init__(self, points):
+    self.cells = {}
+    self.minCell = self.maxCell = None
+    for aPoint in points:
+      key = TrailheadGeoIndex.getCellKey(aPoint[0], aPoint[1])
+      if not key in self.cells:
+        self.cells[key] = []
+      self.cells[key].append( aPoint )
+    if self.cells:
+      self.minCell = ( min([aKey[0] for aKey in self.cells]), min([aKey[1] for aKey in self.cells]) )
+      self.maxCell = ( max([aKey[0] for aKey in self.cells]), max([aKey[1] for aKey in self.cells]) )
+
+  @staticmethod
+  def getCellKey(latitude, longitude):
+    return ( math.floor(latitude / TrailheadGeoIndex.CELL_DEG), math.floor(longitude / TrailheadGeoIndex.CELL_DEG) )
+
+  @staticmethod
+  def build(_tozanguchiDic):
+    points = []
+    records = TozanguchiCache.loadAllCache()
+    for aMountain, tozanguchis in _tozanguchiDic.items():
+      for aTozanguchi, theUrl in tozanguchis.items():
+        record = records.get( TozanguchiCache.getCacheFilename(theUrl) )
+        if record != None and record.get("digest"):
+          latitude = record["digest"]["latitude"]
+          longitude = record["digest"]["longitude"]
+          if latitude and longitude:
+            points.append( (float(latitude), float(longitude), aMountain, aTozanguchi, theUrl) )
+    return TrailheadGeoIndex(points)
+
+  @staticmethod
+  def getIndex():
+    index = TrailheadGeoIndex.index
+    if index == None:
+      index = TrailheadGeoIndex.index = TrailheadGeoIndex.build( tozanguchiDic )
+    return index
+
+  # the minimum distance to the cells which are apart from the center cell by ring
+  @staticmethod
+  def getRingDistanceKm(latitude, ring):
+    cosLatitude = math.cos( math.radians( min(90.0, abs(latitude) + ring * TrailheadGeoIndex.CELL_DEG) ) )
+    return max(0, ring-1) * TrailheadGeoIndex.CELL_DEG * TrailheadGeoIndex.KM_PER_DEG * cosLatitude
+
+  def getMaxRing(self, centerKey):
+    return max( abs(centerKey[0]-self.minCell[0]), abs(centerKey[0]-self.maxCell[0]), abs(centerKey[1]-self.minCell[1]), abs(centerKey[1]-self.maxCell[1]) )
+
+  def getRingPoints(self, centerKey, ring):
+    result = []
+    for i in range(centerKey[0]-ring, centerKey[0]+ring+1):
+      for j in range(centerKey[1]-ring, centerKey[1]+ring+1):
+        if max(abs(i-centerKey[0]), abs(j-centerKey[1])) == ring:
+          result.extend( self.cells.get( (i, j), [] ) )
+    return result
+
+  # returns [(distanceKm, mountain, tozanguchi, url)] sorted by the distance
+  def getWithinRadius(self, latitude, longitude, radiusKm):
+    result = []
+    if self.cells:
+      latitudeDelta = radiusKm / TrailheadGeoIndex.KM_PER_DEG
+      cosLatitude = max( 1e-6, math.cos( math.radians( min(89.9, abs(latitude) + latitudeDelta) ) ) )
+      minKey = TrailheadGeoIndex.getCellKey( latitude - latitudeDelta, longitude - latitudeDelta / cosLatitude )
+      maxKey = TrailheadGeoIndex.getCellKey( latitude + latitudeDelta, longitude + latitudeDelta / cosLatitude )
+      for i in range( max(minKey[0], self.minCell[0]), min(maxKey[0], self.maxCell[0])+1 ):
+        for j in range( max(minKey[1], self.minCell[1]), min(maxKey[1], self.maxCell[1])+1 ):
+          for aPoint in self.cells.get( (i, j), [] ):
+            distance = GeoUtil.getDistanceKm(latitude, longitude, aPoint[0], aPoint[1])
+            if distance <= radiusKm:
+              result.append( (distance, aPoint[2], aPoint[3], aPoint[4]) )
+    return sorted(result)
+
+  def getNearest(self, latitude, longitude, n, radiusKm = None):
+    result = []
+    if self.cells and n > 0:
+      centerKey = TrailheadGeoIndex.getCellKey(latitude, longitude)
+      maxRing = self.getMaxRing(centerKey)
+      ring = 0
+      while ring <= maxRing:
+        ringDistance = TrailheadGeoIndex.getRingDistanceKm(latitude, ring)
+        # the rest can't be nearer than the found n points or can't be within the radius
+        if ( len(result) >= n and ringDistance > result[n-1][0] ) or ( radiusKm != None and ringDistance > radiusKm ):
+          break
+        for aPoint in self.getRingPoints(centerKey, ring):
+          distance = GeoUtil.getDistanceKm(latitude, longitude, aPoint[0], aPoint[1])
+          if radiusKm == None or distance <= radiusKm:
+            result.append( (distance, aPoint[2], aPoint[3], aPoint[4]) )
+        result.sort()
+        ring = ring + 1
+    return result[0:n]
+
 
 class ExecUtil:
   @staticmethod
@@ -411,8 +1240,11 @@ class ExecUtil:
     return result
 
 
-if __name__=="__main__":
-  parser = argparse.ArgumentParser(description='Parse command line options.')
+tozanguchiDic = DataSnapshot.getTozanguchiDic()
+
+
+def main(argv = None):
+  parser = argparse.ArgumentParser(prog=os.path.basename(__file__), description='Parse command line options.')
   parser.add_argument('args', nargs='*', help='mountain name such as 富士山')
   parser.add_argument('-c', '--compare', action='store_true', default=False, help='compare tozanguchi per climbtime')
   parser.add_argument('-r', '--renew', action='store_true', default=False, help='get latest data although cache exists')
@@ -428,12 +1260,34 @@ if __name__=="__main__":
   parser.add_argument('-nd', '--noDetails', action='store_true', default=False, help='specify if you want to disable to output the mountain info.')
   parser.add_argument('-ll', '--latitudeLongitudeOnly', action='store_true', default=False, help='specify if you want to output tozanguchi latitude longitude only')
   parser.add_argument('-o', '--openUrl', action='store_true', default=False, help='specify if you want to open the url')
-
-  args = parser.parse_args()
-
+  parser.add_argument('-j', '--parallel', action='store', type=int, default=TozanguchiFetcher.DEFAULT_MAX_WORKERS, help='specify the number of concurrent fetches for cache miss e.g. 4')
+  parser.add_argument('-jh', '--maxPerHost', action='store', type=int, default=TozanguchiFetcher.DEFAULT_MAX_PER_HOST, help='specify the number of concurrent fetches per host e.g. 2')
+  parser.add_argument('-cl', '--columnar', action='store_true', default=False, help='specify if you want to use numpy based filter for --listAllCache')
+  parser.add_argument('-cb', '--cacheBackend', action='store', default=TozanguchiCache.CACHE_BACKEND, choices=[TozanguchiCache.CACHE_BACKEND_SQLITE, TozanguchiCache.CACHE_BACKEND_JSON], help='specify the park cache backend')
+  parser.add_argument('-ji', '--interval', action='store', type=float, default=TozanguchiFetcher.DEFAULT_INTERVAL_SEC, help='specify the interval sec between fetches per host e.g. 0.5')
+  parser.add_argument('-ma', '--maxAge', action='store', type=float, default=None, help='specify the max age hours of the park cache to revalidate the older one e.g. 720 (default:the expiry stored with each park)')
+  parser.add_argument('-rp', '--reparse', action='store_true', default=False, help='specify if you want to rebuild the park cache from the archived raw pages without the download')
+  parser.add_argument('-jp', '--processes', action='store', type=int, default=None, help='specify the number of processes to parse the archived pages for --reparse (default:the number of cpus)')
+  parser.add_argument('-st', '--stats', '--profile', action='store_true', default=False, help='specify if you want to output the phase time, the cache hit/miss and the latency on stderr')
+  parser.add_argument('-sf', '--statsFormat', action='store', default=Stats.FORMAT_TEXT, choices=[Stats.FORMAT_TEXT, Stats.FORMAT_JSON], help='specify the format of --stats e.g. text, json')
+
+  args = parser.parse_args(argv)
+
+  TozanguchiCache.setBackend( args.cacheBackend )
+  TozanguchiCache.maxAgeHours.set( args.maxAge )
+
+  if args.reparse:
+    print(f'{TozanguchiCache.reparseAll(args.processes)} park caches are rebuilt from the archived pages', file=sys.stderr)
+    if not args.args and not args.listAllCache:
+      if args.stats:
+        Stats.printReport( args.statsFormat )
+      exit(0)
+
+  start = time.perf_counter()
   mountainKeys = set()
   mountains = set()
   if args.listAllCache:
+    TozanguchiCache.loadAllCache()
     mountains = set( tozanguchiDic.keys() )
   else:
     mountains = set( args.args )
@@ -447,35 +1301,74 @@ if __name__=="__main__":
     keys = TozanguchiUtil.getMountainKeys(aMountain)
     for aMountainKey in keys:
       mountainKeys.add( aMountainKey )
+    # tozanguchi name or url is also acceptable
+    for aMountainKey, aTozanguchi in TozanguchiUtil.getTozanguchis(aMountain):
+      mountainKeys.add( aMountainKey )
 
   minClimbTimeMinutes = TozanguchiUtil.getMinutesFromHHMM(args.minTime)
   maxClimbTimeMinutes = TozanguchiUtil.getMinutesFromHHMM(args.maxTime)
 
-  excludes = MountainFilterUtil.getSetOfCsvs( args.exclude )
+  excludes = MountainFilterUtil.getMatcher( args.exclude )
+  Stats.addPhase("filter mountains", time.perf_counter() - start)
+
+  # fetch cache missed (or renew) parks concurrently in advance
+  urlsToFetch = set()
+  prefetched = {}
+  cachedRecords = {}
+  if not args.listAllCache:
+    with Stats.phase("prefetch park info"):
+      fetcher = TozanguchiFetcher( args.parallel, args.maxPerHost, args.interval )
+      urls = TozanguchiUtil.getUrlsToFetch( mountainKeys, excludes, args.renew, cachedRecords )
+      urlsToFetch = set( urls )
+      prefetched = fetcher.fetch( urls, args.renew, cachedRecords )
+
+  # filter and sort the whole cached tozanguchis at once
+  acceptedTozanguchis = None
+  if args.listAllCache and args.columnar and TrailheadTable.isAvailable():
+    with Stats.phase("columnar filter"):
+      table = TrailheadTable( mountainKeys, excludes )
+      acceptedTozanguchis, sortedTozanguchis = table.getAcceptedTozanguchis( minClimbTimeMinutes, maxClimbTimeMinutes, args.minPark, args.sortReverse )
+
+  start = time.perf_counter()
   mountainNames = set()
   urlMap = {}
   n = 0
   for aMountain in mountainKeys:
     if not MountainFilterUtil.isMatchedMountainRobust( excludes, aMountain ):
-      tozanguchi = tozanguchiDic[aMountain]
+      accepted = []
+      if acceptedTozanguchis != None:
+        accepted = acceptedTozanguchis.get( aMountain, [] )
+      else:
+        tozanguchi = tozanguchiDic[aMountain]
+        for aTozanguchi, theUrl in tozanguchi.items():
+          if theUrl in urlsToFetch:
+            # the lookup is counted here, not in the prefilter. the failed park isn't fetched again
+            TozanguchiCache.countLookup( None if args.renew else cachedRecords.get(theUrl), None )
+            parkInfo = TozanguchiUtil.maintainParkInfo( prefetched[theUrl].copy() ) if theUrl in prefetched else None
+          else:
+            parkInfo = TozanguchiUtil.getParkInfo(theUrl, args.renew, args.listAllCache, cachedRecords)
+          if parkInfo != None and TozanguchiUtil.isAcceptableTozanguchi( aMountain, parkInfo, minClimbTimeMinutes, maxClimbTimeMinutes, args.minPark ):
+            accepted.append( (aTozanguchi, theUrl, parkInfo) )
+
       result = {}
-      for aTozanguchi, theUrl in tozanguchi.items():
-        parkInfo = TozanguchiUtil.getParkInfo(theUrl, args.renew, args.listAllCache)
-        if parkInfo != None and TozanguchiUtil.isAcceptableTozanguchi( aMountain, parkInfo, minClimbTimeMinutes, maxClimbTimeMinutes, args.minPark ):
-          n = n + 1
-          result [ aTozanguchi ] = parkInfo
-          urlMap[ str(parkInfo) ] = theUrl
-          if args.openUrl:
-            if n>=2:
-              time.sleep(0.5)
-            ExecUtil.open(theUrl)
+      for aTozanguchi, theUrl, parkInfo in accepted:
+        n = n + 1
+        result [ aTozanguchi ] = parkInfo
+        urlMap[ str(parkInfo) ] = theUrl
+        if args.openUrl:
+          if n>=2:
+            time.sleep(0.5)
+          ExecUtil.open(theUrl)
 
       if not args.mountainNameOnly and not args.latitudeLongitudeOnly and len(result)!=0:
         print(aMountain + ":")
         if not args.compare and not args.noDetails:
           TozanguchiUtil.printMountainDetailInfo( aMountain )
 
-      result = dict( sorted( result.items(), reverse=args.sortReverse, key=lambda _data: ( TozanguchiUtil.getClimbTimeMinutes(aMountain, _data[0]), TozanguchiUtil.getClimbTimeMinutes(aMountain, _data[1]) ) ) )
+      if acceptedTozanguchis != None:
+        result = { aTozanguchi : result[aTozanguchi] for aTozanguchi in sortedTozanguchis.get( aMountain, [] ) }
+      else:
+        result = dict( sorted( result.items(), reverse=args.sortReverse, key=lambda _data: ( TozanguchiUtil.getClimbTimeMinutes(aMountain, _data[0]), TozanguchiUtil.getClimbTimeMinutes(aMountain, _data[1]) ) ) )
 
       for aTozanguchi, parkInfo in result.items():
         mountainNames = mountainNames.union( set( aMountain.split("・") ) )
@@ -504,3 +1397,12 @@ if __name__=="__main__":
       if not MountainFilterUtil.isMatchedMountainRobust( excludes, aMountain ):
         print( aMountain + " ", end="" )
     print( "" )
+  Stats.addPhase("filter, sort and output", time.perf_counter() - start)
+
+  if args.stats:
+    sys.stdout.flush()
+    Stats.printReport( args.statsFormat )
+
+
+if __name__=="__main__":
+  main()
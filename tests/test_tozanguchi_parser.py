@@ -0,0 +1,107 @@
+#   Copyright 2026 hidenorly
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import sys
+import glob
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tozanguchi_parser import TozanguchiParser
+
+try:
+  import bs4
+except ImportError:
+  bs4 = None
+
+
+# the saved pages of tests/fixtures. put more saved pages there to check them as well
+class Fixtures:
+  BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+  TRAILHEAD_DIR = os.path.join(BASE_DIR, "trailhead")
+  MOUNTAINS_DIR = os.path.join(BASE_DIR, "mountains")
+
+  # returns [(filename, text)]
+  @staticmethod
+  def getPages(baseDir):
+    result = []
+    for aPath in sorted(glob.glob(os.path.join(baseDir, "*.html"))):
+      with open(aPath, 'r', encoding='UTF-8') as f:
+        result.append( (os.path.basename(aPath), f.read()) )
+    return result
+
+
+# the streaming extraction must return the same as the BeautifulSoup one of the original implementation
+@unittest.skipIf(bs4 == None, "BeautifulSoup is not installed")
+class TestParkInfoEquivalence(unittest.TestCase):
+  REQUIRED_KEYS = ["登山口名", "主要登山ルート", "駐車台数", "緯度経度"]
+
+  def assertSameParkInfo(self, name, html):
+    result = TozanguchiParser.parseParkInfo(html)
+    expected = TozanguchiParser.parseParkInfoWithSoup(html)
+    self.assertEqual(list(result.keys()), list(expected.keys()), name)
+    for aKey, aValue in expected.items():
+      with self.subTest(page=name, key=aKey):
+        self.assertEqual(result[aKey], aValue)
+
+  def test_trailhead_pages(self):
+    pages = Fixtures.getPages(Fixtures.TRAILHEAD_DIR)
+    self.assertTrue(pages)
+    for name, html in pages:
+      self.assertSameParkInfo(name, html)
+      parkInfo = TozanguchiParser.parseParkInfo(html)
+      for aKey in TestParkInfoEquivalence.REQUIRED_KEYS:
+        with self.subTest(page=name, key=aKey):
+          self.assertTrue(parkInfo.get(aKey))
+
+  # the extraction must be equivalent for any page
+  def test_mountain_pages(self):
+    for name, html in Fixtures.getPages(Fixtures.MOUNTAINS_DIR):
+      self.assertSameParkInfo(name, html)
+
+
+@unittest.skipIf(bs4 == None, "BeautifulSoup is not installed")
+class TestArticleEquivalence(unittest.TestCase):
+  def assertSameArticle(self, name, html):
+    result = TozanguchiParser.parseArticle(html)
+    expected = TozanguchiParser.parseArticleWithSoup(html)
+    if expected == None:
+      self.assertIsNone(result, name)
+      return
+    self.assertIsNotNone(result, name)
+    mountainNames, tozanguchis = result
+    expectedMountainNames, expectedTozanguchis = expected
+    self.assertEqual(mountainNames, expectedMountainNames, name)
+    self.assertEqual(len(tozanguchis), len(expectedTozanguchis), name)
+    for i, links in enumerate(expectedTozanguchis):
+      with self.subTest(page=name, th_data=i):
+        self.assertEqual(tozanguchis[i], links)
+
+  def test_mountain_pages(self):
+    pages = Fixtures.getPages(Fixtures.MOUNTAINS_DIR)
+    self.assertTrue(pages)
+    for name, html in pages:
+      self.assertSameArticle(name, html)
+      mountainNames, tozanguchis = TozanguchiParser.parseArticle(html)
+      self.assertTrue(mountainNames, name)
+      self.assertTrue(tozanguchis, name)
+
+  def test_trailhead_pages(self):
+    for name, html in Fixtures.getPages(Fixtures.TRAILHEAD_DIR):
+      self.assertSameArticle(name, html)
+
+
+if __name__=="__main__":
+  unittest.main()
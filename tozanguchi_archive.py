@@ -0,0 +1,153 @@
+#   Copyright 2026 hidenorly
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import zlib
+import time
+import hashlib
+import sqlite3
+import threading
+
+from tozanguchi_parser import TozanguchiParser
+
+
+# the raw pages as {sha256[:2]}/{sha256}.z compressed by zlib and the map of key:(url, sha256, fetched) in sqlite
+# the same page is stored once and the page which is no longer referred is removed
+class RawPageArchive:
+  DB_FILENAME = "archive.db"
+  OBJECT_EXT = ".z"
+  COMPRESS_LEVEL = 9
+  CHUNKS_PER_PROCESS = 4
+
+  def __init__(self, baseDir):
+    self.baseDir = baseDir
+    self.conn = None
+    self.lock = threading.Lock()
+
+  # the archive is created on the first put
+  def getConnection(self):
+    if self.conn == None:
+      if not os.path.exists(self.baseDir):
+        os.makedirs(self.baseDir)
+      conn = sqlite3.connect(os.path.join(self.baseDir, RawPageArchive.DB_FILENAME), check_same_thread=False)
+      conn.execute("PRAGMA journal_mode=WAL")
+      conn.execute("PRAGMA synchronous=NORMAL")
+      conn.execute("CREATE TABLE IF NOT EXISTS page (key TEXT PRIMARY KEY, url TEXT NOT NULL, sha TEXT NOT NULL, fetched REAL NOT NULL)")
+      conn.execute("CREATE INDEX IF NOT EXISTS page_sha ON page (sha)")
+      conn.commit()
+      self.conn = conn
+    return self.conn
+
+  def exists(self):
+    return self.conn != None or os.path.exists(os.path.join(self.baseDir, RawPageArchive.DB_FILENAME))
+
+  @staticmethod
+  def getDigest(data):
+    return hashlib.sha256(data).hexdigest()
+
+  def getObjectPath(self, sha):
+    return os.path.join(self.baseDir, sha[0:2], sha+RawPageArchive.OBJECT_EXT)
+
+  def writeObject(self, sha, data):
+    path = self.getObjectPath(sha)
+    if not os.path.exists(path):
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+      tmpPath = f'{path}.{os.getpid()}.tmp'
+      with open(tmpPath, 'wb') as f:
+        f.write(zlib.compress(data, RawPageArchive.COMPRESS_LEVEL))
+      os.replace(tmpPath, path)
+
+  def removeObjectIfUnused(self, sha):
+    if self.getConnection().execute("SELECT 1 FROM page WHERE sha=? LIMIT 1", (sha,)).fetchone() == None:
+      try:
+        os.remove(self.getObjectPath(sha))
+      except:
+        pass
+
+  # returns the sha256 of the stored page
+  def put(self, key, url, text, fetched = None):
+    data = text.encode("utf-8")
+    sha = RawPageArchive.getDigest(data)
+    with self.lock:
+      self.writeObject(sha, data)
+      conn = self.getConnection()
+      row = conn.execute("SELECT sha FROM page WHERE key=?", (key,)).fetchone()
+      conn.execute("INSERT OR REPLACE INTO page (key, url, sha, fetched) VALUES (?, ?, ?, ?)", (key, url, sha, fetched if fetched else time.time()))
+      conn.commit()
+      if row and row[0] != sha:
+        self.removeObjectIfUnused(row[0])
+    return sha
+
+  def remove(self, key):
+    if self.exists():
+      with self.lock:
+        conn = self.getConnection()
+        row = conn.execute("SELECT sha FROM page WHERE key=?", (key,)).fetchone()
+        if row:
+          conn.execute("DELETE FROM page WHERE key=?", (key,))
+          conn.commit()
+          self.removeObjectIfUnused(row[0])
+
+  @staticmethod
+  def readObject(path):
+    with open(path, 'rb') as f:
+      return zlib.decompress(f.read()).decode("utf-8")
+
+  def get(self, key):
+    result = None
+    if self.exists():
+      with self.lock:
+        row = self.getConnection().execute("SELECT sha FROM page WHERE key=?", (key,)).fetchone()
+      if row:
+        result = RawPageArchive.readObject(self.getObjectPath(row[0]))
+    return result
+
+  # returns [(key, url, sha, fetched)]
+  def getPages(self):
+    result = []
+    if self.exists():
+      with self.lock:
+        result = self.getConnection().execute("SELECT key, url, sha, fetched FROM page ORDER BY key").fetchall()
+    return result
+
+  # this runs in the worker process, then only the parser is required there
+  @staticmethod
+  def parseObject(path):
+    try:
+      return TozanguchiParser.parseParkInfo( RawPageArchive.readObject(path) )
+    except:
+      return None
+
+  # returns [(key, url, fetched, the parsed park info or None if failed)]. the pages are parsed by the processes (default:the number of cpus)
+  def reparse(self, processes = None):
+    pages = self.getPages()
+    shas = sorted( set( [ aPage[2] for aPage in pages ] ) )
+    parsed = {}
+    if shas:
+      processes = max(1, min(processes if processes else (os.cpu_count() or 1), len(shas)))
+      chunksize = max(1, int(len(shas) / (processes * RawPageArchive.CHUNKS_PER_PROCESS)))
+      paths = [ self.getObjectPath(aSha) for aSha in shas ]
+      if processes == 1:
+        parsed = dict( zip( shas, map( RawPageArchive.parseObject, paths ) ) )
+      else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+          parsed = dict( zip( shas, executor.map( RawPageArchive.parseObject, paths, chunksize=chunksize ) ) )
+    return [ (key, url, fetched, parsed.get(sha)) for key, url, sha, fetched in pages ]
+
+  def close(self):
+    with self.lock:
+      if self.conn != None:
+        self.conn.close()
+      self.conn = None
@@ -0,0 +1,242 @@
+#   Copyright 2026 hidenorly
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import glob
+import json
+import time
+import datetime
+import sqlite3
+import threading
+
+
+class ParkCacheStore:
+  LAST_UPDATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+  @staticmethod
+  def toTimestamp(lastUpdateString):
+    return datetime.datetime.strptime(lastUpdateString, ParkCacheStore.LAST_UPDATE_FORMAT).timestamp()
+
+  @staticmethod
+  def toLastUpdateString(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp).strftime(ParkCacheStore.LAST_UPDATE_FORMAT)
+
+  @staticmethod
+  def isValidRecord(record, now = None):
+    if now == None:
+      now = time.time()
+    return now < record["expire"]
+
+  @staticmethod
+  def getRecord(data, lastUpdate, expire, etag = None, lastModified = None, digest = None):
+    return {"data": data, "lastUpdate": lastUpdate, "expire": expire, "etag": etag, "lastModified": lastModified, "digest": digest}
+
+  # returns {"data":dict, "lastUpdate":timestamp, "expire":timestamp, "etag":str, "lastModified":str, "digest":dict} or None
+  def get(self, key):
+    return None
+
+  def put(self, key, record):
+    pass
+
+  def putAll(self, records):
+    for aKey, aRecord in records.items():
+      self.put(aKey, aRecord)
+
+  def remove(self, key):
+    pass
+
+  def keys(self):
+    return []
+
+  # returns the modification time to know the update by the other process. None if unknown
+  def getModifiedTime(self):
+    return None
+
+  @staticmethod
+  def getFileModifiedTime(path):
+    try:
+      return os.stat(path).st_mtime_ns
+    except OSError:
+      return None
+
+  # returns {key:record}
+  def loadAll(self):
+    result = {}
+    for aKey in self.keys():
+      record = self.get(aKey)
+      if record != None:
+        result[aKey] = record
+    return result
+
+  def close(self):
+    pass
+
+
+class JsonDirParkCacheStore(ParkCacheStore):
+  KEY_ETAG = "_etag"
+  KEY_LAST_MODIFIED = "_lastModified"
+  KEY_DIGEST = "_digest"
+
+  def __init__(self, baseDir, expireHours):
+    self.baseDir = baseDir
+    self.expireHours = expireHours
+
+  def ensureCacheStorage(self):
+    if not os.path.exists(self.baseDir):
+      os.makedirs(self.baseDir)
+
+  def getCachePath(self, key):
+    return os.path.join(self.baseDir, key)
+
+  def get(self, key):
+    result = None
+    cachePath = self.getCachePath(key)
+    if os.path.isfile(cachePath):
+      try:
+        with open(cachePath, 'r', encoding='UTF-8') as f:
+          data = json.load(f)
+      except:
+        data = None
+      if isinstance(data, dict) and "lastUpdate" in data:
+        lastUpdate = ParkCacheStore.toTimestamp(data["lastUpdate"])
+        del data["lastUpdate"]
+        etag = data.pop(JsonDirParkCacheStore.KEY_ETAG, None)
+        lastModified = data.pop(JsonDirParkCacheStore.KEY_LAST_MODIFIED, None)
+        digest = data.pop(JsonDirParkCacheStore.KEY_DIGEST, None)
+        result = ParkCacheStore.getRecord(data, lastUpdate, lastUpdate + self.expireHours * 3600, etag, lastModified, digest)
+    return result
+
+  def put(self, key, record):
+    self.ensureCacheStorage()
+    _data = dict(record["data"])
+    _data["lastUpdate"] = ParkCacheStore.toLastUpdateString(record["lastUpdate"])
+    if record.get("etag"):
+      _data[JsonDirParkCacheStore.KEY_ETAG] = record["etag"]
+    if record.get("lastModified"):
+      _data[JsonDirParkCacheStore.KEY_LAST_MODIFIED] = record["lastModified"]
+    if record.get("digest"):
+      _data[JsonDirParkCacheStore.KEY_DIGEST] = record["digest"]
+    with open(self.getCachePath(key), 'w', encoding='UTF-8') as f:
+      json.dump(_data, f, indent = 4, ensure_ascii=False)
+      f.close()
+
+  def remove(self, key):
+    try:
+      os.remove(self.getCachePath(key))
+    except:
+      pass
+
+  # the cache file is overwritten in place, then the directory's mtime isn't enough
+  def getModifiedTime(self):
+    result = ParkCacheStore.getFileModifiedTime(self.baseDir)
+    if result != None:
+      for anEntry in os.scandir(self.baseDir):
+        if anEntry.is_file() and not "." in anEntry.name:
+          result = max( result, anEntry.stat().st_mtime_ns )
+    return result
+
+  def keys(self):
+    result = []
+    for aPath in glob.glob(os.path.join(self.baseDir, "*")):
+      if os.path.isfile(aPath) and not "." in os.path.basename(aPath):
+        result.append(os.path.basename(aPath))
+    return result
+
+
+class SqliteParkCacheStore(ParkCacheStore):
+  def __init__(self, dbPath):
+    self.dbPath = dbPath
+    dirName = os.path.dirname(dbPath)
+    if dirName and not os.path.exists(dirName):
+      os.makedirs(dirName)
+    self.lock = threading.Lock()
+    self.conn = sqlite3.connect(dbPath, check_same_thread=False)
+    self.conn.execute("PRAGMA journal_mode=WAL")
+    self.conn.execute("PRAGMA synchronous=NORMAL")
+    self.conn.execute("CREATE TABLE IF NOT EXISTS park (key TEXT PRIMARY KEY, data TEXT NOT NULL, lastUpdate REAL NOT NULL, expire REAL NOT NULL, etag TEXT, lastModified TEXT, digest TEXT)")
+    self.ensureColumns({"etag":"TEXT", "lastModified":"TEXT", "digest":"TEXT"})
+    self.conn.commit()
+
+  def ensureColumns(self, columns):
+    existingColumns = set()
+    for aRow in self.conn.execute("PRAGMA table_info(park)"):
+      existingColumns.add(aRow[1])
+    for aColumn, aType in columns.items():
+      if not aColumn in existingColumns:
+        self.conn.execute(f"ALTER TABLE park ADD COLUMN {aColumn} {aType}")
+
+  @staticmethod
+  def toRecord(row):
+    return ParkCacheStore.getRecord(json.loads(row[0]), row[1], row[2], row[3], row[4], json.loads(row[5]) if row[5] else None)
+
+  @staticmethod
+  def toRow(key, record):
+    digest = record.get("digest")
+    return (key, json.dumps(record["data"], ensure_ascii=False), record["lastUpdate"], record["expire"], record.get("etag"), record.get("lastModified"), json.dumps(digest, ensure_ascii=False) if digest else None)
+
+  def get(self, key):
+    result = None
+    with self.lock:
+      row = self.conn.execute("SELECT data, lastUpdate, expire, etag, lastModified, digest FROM park WHERE key=?", (key,)).fetchone()
+    if row:
+      result = SqliteParkCacheStore.toRecord(row)
+    return result
+
+  def put(self, key, record):
+    with self.lock:
+      self.conn.execute("INSERT OR REPLACE INTO park (key, data, lastUpdate, expire, etag, lastModified, digest) VALUES (?, ?, ?, ?, ?, ?, ?)", SqliteParkCacheStore.toRow(key, record))
+      self.conn.commit()
+
+  def putAll(self, records):
+    with self.lock:
+      self.conn.executemany("INSERT OR REPLACE INTO park (key, data, lastUpdate, expire, etag, lastModified, digest) VALUES (?, ?, ?, ?, ?, ?, ?)", [SqliteParkCacheStore.toRow(aKey, aRecord) for aKey, aRecord in records.items()])
+      self.conn.commit()
+
+  def remove(self, key):
+    with self.lock:
+      self.conn.execute("DELETE FROM park WHERE key=?", (key,))
+      self.conn.commit()
+
+  def keys(self):
+    with self.lock:
+      return [row[0] for row in self.conn.execute("SELECT key FROM park")]
+
+  # the commit goes to the -wal file until the checkpoint
+  def getModifiedTime(self):
+    times = [ aTime for aTime in [ ParkCacheStore.getFileModifiedTime(self.dbPath), ParkCacheStore.getFileModifiedTime(self.dbPath+"-wal") ] if aTime != None ]
+    return max(times) if times else None
+
+  def isEmpty(self):
+    with self.lock:
+      return self.conn.execute("SELECT 1 FROM park LIMIT 1").fetchone() == None
+
+  def loadAll(self):
+    result = {}
+    with self.lock:
+      rows = self.conn.execute("SELECT key, data, lastUpdate, expire, etag, lastModified, digest FROM park").fetchall()
+    for aRow in rows:
+      result[aRow[0]] = SqliteParkCacheStore.toRecord(aRow[1:])
+    return result
+
+  def close(self):
+    with self.lock:
+      self.conn.close()
+
+
+class ParkCacheMigration:
+  @staticmethod
+  def migrate(fromStore, toStore):
+    records = fromStore.loadAll()
+    toStore.putAll(records)
+    return len(records)
@@ -0,0 +1,81 @@
+#   Copyright 2026 hidenorly
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import sys
+import os
+import json
+import argparse
+import urllib.request
+import urllib.error
+
+
+# the thin client of tozanguchi_server.py. only the standard library is imported to start quickly
+class QueryClient:
+  DEFAULT_URL = "http://127.0.0.1:8765"
+  SERVER_ENV = "TOZANGUCHI_SERVER"
+  TIMEOUT_SEC = 3600
+
+  # the relative path such as -e climbedMountains.lst is resolved by the client's current directory
+  @staticmethod
+  def getArgs(args):
+    result = []
+    for anArg in args:
+      if not os.path.isabs(anArg) and os.path.isfile(anArg):
+        anArg = os.path.abspath(anArg)
+      result.append(anArg)
+    return result
+
+  # returns {"exitCode":int, "stdout":str, "stderr":str} or None if the server isn't running
+  @staticmethod
+  def query(url, command, args):
+    request = urllib.request.Request(
+      url.rstrip("/")+"/query",
+      data=json.dumps({"command": command, "args": QueryClient.getArgs(args)}, ensure_ascii=False).encode("utf-8"),
+      headers={"Content-Type": "application/json"})
+    try:
+      with urllib.request.urlopen(request, timeout=QueryClient.TIMEOUT_SEC) as res:
+        return json.loads(res.read())
+    except urllib.error.URLError as e:
+      if isinstance(e.reason, ConnectionError):
+        return None
+      raise
+
+  # run the command line in this process instead of the server
+  @staticmethod
+  def runLocally(command, args):
+    path = command if os.path.dirname(command) else os.path.join(os.path.dirname(os.path.abspath(__file__)), command)
+    if not path.endswith(".py"):
+      path = path+".py"
+    sys.stdout.flush()
+    os.execv(sys.executable, [sys.executable, path] + args)
+
+
+if __name__=="__main__":
+  parser = argparse.ArgumentParser(description='Run get_tozanguchi.py or get_route_time_to_tozanguchi.py on tozanguchi_server.py with the same command line')
+  parser.add_argument('-s', '--server', action='store', default=os.environ.get(QueryClient.SERVER_ENV, QueryClient.DEFAULT_URL), help=f'specify the server url (default:${QueryClient.SERVER_ENV} or {QueryClient.DEFAULT_URL})')
+  parser.add_argument('-nf', '--noFallback', action='store_true', default=False, help='specify if you do not want to run the command locally when the server is not running')
+  parser.add_argument('command', help='specify the command e.g. get_tozanguchi.py')
+  parser.add_argument('args', nargs=argparse.REMAINDER, help='the arguments of the command e.g. 富士山 -c')
+
+  args = parser.parse_args()
+
+  result = QueryClient.query(args.server, args.command, args.args)
+  if result == None:
+    if args.noFallback:
+      print(f'the server {args.server} is not running', file=sys.stderr)
+      exit(1)
+    QueryClient.runLocally(args.command, args.args)
+  sys.stderr.write(result["stderr"])
+  sys.stdout.write(result["stdout"])
+  exit(result["exitCode"])
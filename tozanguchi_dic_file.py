@@ -0,0 +1,143 @@
+#   Copyright 2026 hidenorly
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import json
+import mmap
+import threading
+from collections.abc import Mapping
+
+
+# {mountain:{tozanguchi:url}} as JSON Lines of [mountain, {tozanguchi:url}] with the offset index file
+class TozanguchiDicFile(Mapping):
+  VERSION = 1
+  DATA_EXT = ".jsonl"
+  INDEX_EXT = ".idx"
+
+  def __init__(self, path):
+    self.path = path
+    self.file = None
+    self.data = None
+    self.offsets = None
+    self.values = {}
+    self.lock = threading.Lock()
+
+  @staticmethod
+  def getDataPath(modulePath):
+    return os.path.splitext(modulePath)[0] + TozanguchiDicFile.DATA_EXT
+
+  @staticmethod
+  def getIndexPath(path):
+    return path + TozanguchiDicFile.INDEX_EXT
+
+  @staticmethod
+  def writeAtomically(path, data):
+    tmpPath = f'{path}.{os.getpid()}.tmp'
+    with open(tmpPath, 'wb') as f:
+      f.write(data)
+    os.replace(tmpPath, path)
+
+  @staticmethod
+  def getIndex(stat, offsets):
+    return {"version": TozanguchiDicFile.VERSION, "size": stat.st_size, "mtime": stat.st_mtime_ns, "offsets": offsets}
+
+  @staticmethod
+  def isValidIndex(index, stat):
+    return index.get("version") == TozanguchiDicFile.VERSION and index.get("size") == stat.st_size and index.get("mtime") == stat.st_mtime_ns
+
+  @staticmethod
+  def writeIndex(path, stat, offsets):
+    TozanguchiDicFile.writeAtomically(TozanguchiDicFile.getIndexPath(path), json.dumps(TozanguchiDicFile.getIndex(stat, offsets), ensure_ascii=False).encode("utf-8"))
+
+  @staticmethod
+  def write(path, dic):
+    lines = []
+    offsets = {}
+    offset = 0
+    for aMountain, tozanguchis in dic.items():
+      line = (json.dumps([aMountain, tozanguchis], ensure_ascii=False)+"\n").encode("utf-8")
+      offsets[aMountain] = [offset, len(line)]
+      offset = offset + len(line)
+      lines.append(line)
+    # the index is bound to the data file's size and mtime, then the stale index is rebuilt on load
+    TozanguchiDicFile.writeAtomically(path, b"".join(lines))
+    TozanguchiDicFile.writeIndex(path, os.stat(path), offsets)
+
+  @staticmethod
+  def buildOffsets(data):
+    result = {}
+    offset = 0
+    size = len(data)
+    while offset < size:
+      pos = data.find(b"\n", offset)
+      end = pos+1 if pos!=-1 else size
+      aMountain = json.loads(data[offset:end])[0]
+      result[aMountain] = [offset, end-offset]
+      offset = end
+    return result
+
+  def load(self):
+    with self.lock:
+      if self.offsets == None:
+        self.file = open(self.path, 'rb')
+        stat = os.fstat(self.file.fileno())
+        # mmap doesn't accept the empty file
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else b""
+        offsets = None
+        try:
+          with open(TozanguchiDicFile.getIndexPath(self.path), 'r', encoding='UTF-8') as f:
+            index = json.load(f)
+          if TozanguchiDicFile.isValidIndex(index, stat):
+            offsets = index["offsets"]
+        except:
+          offsets = None
+        if offsets == None:
+          offsets = TozanguchiDicFile.buildOffsets(self.data)
+          try:
+            TozanguchiDicFile.writeIndex(self.path, stat, offsets)
+          except:
+            pass
+        self.offsets = offsets
+    return self.offsets
+
+  def close(self):
+    with self.lock:
+      if isinstance(self.data, mmap.mmap):
+        self.data.close()
+      if self.file != None:
+        self.file.close()
+      self.file = None
+      self.data = None
+      self.offsets = None
+      self.values = {}
+
+  def __getitem__(self, key):
+    if key in self.values:
+      return self.values[key]
+    offsets = self.load()
+    if not key in offsets:
+      raise KeyError(key)
+    offset, length = offsets[key]
+    result = json.loads(self.data[offset:offset+length])[1]
+    self.values[key] = result
+    return result
+
+  def __contains__(self, key):
+    return key in self.load()
+
+  def __iter__(self):
+    return iter(self.load())
+
+  def __len__(self):
+    return len(self.load())
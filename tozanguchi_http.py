@@ -0,0 +1,135 @@
+#   Copyright 2026 hidenorly
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import json
+import hashlib
+import threading
+import time
+import urllib.parse
+
+from tozanguchi_stats import Stats
+
+
+class HttpUtil:
+  PAGE_CACHE_DIR = os.path.expanduser("~")+"/.cache/tozanguchi/pages"
+  POOL_CONNECTIONS = 4
+  POOL_MAXSIZE = 8
+  TIMEOUT_SEC = 30
+  STATUS_NOT_MODIFIED = 304
+  session = None
+  lock = threading.Lock()
+
+  @staticmethod
+  def getSession():
+    with HttpUtil.lock:
+      if HttpUtil.session == None:
+        # requests is imported only when the network access is actually required
+        import requests
+        from requests.adapters import HTTPAdapter
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=HttpUtil.POOL_CONNECTIONS, pool_maxsize=HttpUtil.POOL_MAXSIZE)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({"Accept-Encoding": "gzip, deflate"})
+        HttpUtil.session = session
+    return HttpUtil.session
+
+  @staticmethod
+  def get(url, etag = None, lastModified = None):
+    headers = {}
+    if etag:
+      headers["If-None-Match"] = etag
+    if lastModified:
+      headers["If-Modified-Since"] = lastModified
+    with Stats.timed("http get"):
+      res = HttpUtil.getSession().get(url, headers=headers, timeout=HttpUtil.TIMEOUT_SEC)
+    Stats.count(f'http.status.{res.status_code}')
+    return res
+
+  @staticmethod
+  def isNotModified(res):
+    return res.status_code == HttpUtil.STATUS_NOT_MODIFIED
+
+  @staticmethod
+  def getValidators(res, etag = None, lastModified = None):
+    # 304 may omit the validators, then keep the previous ones
+    return res.headers.get("ETag", etag), res.headers.get("Last-Modified", lastModified)
+
+  @staticmethod
+  def getPageCachePath(url, cacheDir):
+    return os.path.join(cacheDir, hashlib.sha1(url.encode("utf-8")).hexdigest()+".json")
+
+  @staticmethod
+  def getText(url, cacheDir = None):
+    cacheDir = cacheDir if cacheDir else HttpUtil.PAGE_CACHE_DIR
+    cachePath = HttpUtil.getPageCachePath(url, cacheDir)
+    cache = None
+    if os.path.exists(cachePath):
+      try:
+        with open(cachePath, 'r', encoding='UTF-8') as f:
+          cache = json.load(f)
+      except:
+        cache = None
+
+    etag = lastModified = None
+    if cache:
+      etag = cache.get("etag")
+      lastModified = cache.get("lastModified")
+    res = HttpUtil.get(url, etag, lastModified)
+    if cache and HttpUtil.isNotModified(res):
+      return cache["text"]
+    if res.status_code >= 400:
+      raise IOError(f'{res.status_code} {url}')
+
+    text = res.text
+    etag, lastModified = HttpUtil.getValidators(res)
+    if etag or lastModified:
+      if not os.path.exists(cacheDir):
+        os.makedirs(cacheDir)
+      with open(cachePath, 'w', encoding='UTF-8') as f:
+        json.dump({"url":url, "etag":etag, "lastModified":lastModified, "text":text}, f, ensure_ascii=False)
+    return text
+
+
+class HostThrottle:
+  def __init__(self, maxPerHost, interval):
+    self.maxPerHost = maxPerHost
+    self.interval = interval
+    self.hosts = {}
+    self.lock = threading.Lock()
+
+  def getHost(self, url):
+    hostname = urllib.parse.urlparse(url).netloc
+    with self.lock:
+      if not hostname in self.hosts:
+        self.hosts[hostname] = {
+          "semaphore": threading.Semaphore(self.maxPerHost),
+          "lock": threading.Lock(),
+          "lastAccess": 0
+        }
+      return self.hosts[hostname]
+
+  # call func with the concurrency limit and the politeness interval between request starts per host
+  def call(self, url, func, *args):
+    host = self.getHost(url)
+    with host["semaphore"]:
+      with host["lock"]:
+        wait = host["lastAccess"] + self.interval - time.time()
+        if wait > 0:
+          # the waits of the concurrent fetches overlap, then this isn't a phase of the wall time
+          Stats.observe("throttle wait", wait)
+          time.sleep(wait)
+        host["lastAccess"] = time.time()
+      return func(*args)
@@ -14,8 +14,14 @@
 
 import time
 import sys
-import requests
-from bs4 import BeautifulSoup
+import os
+import json
+import hashlib
+import argparse
+import importlib.util
+from tozanguchi_http import HttpUtil, HostThrottle
+from tozanguchi_parser import TozanguchiParser
+from tozanguchi_dic_file import TozanguchiDicFile
 
 def isMountainLink(url):
   return url.find("trailhead/trailhead")!=-1
@@ -53,60 +59,302 @@ def getMountainName(name):
     name = name[0:index]
   return name.strip()
 
-def getLinks(articleUrl, result):
-  if result == None:
-    result = {}
-  res = requests.get(articleUrl)
-  soup = BeautifulSoup(res.text, 'html.parser') #use html instead of res.text
-  article = soup.find("article", {})
+# returns [[mountainName, {tozanguchi:url}]] in the page order
+def getPageLinks(text):
+  result = []
+  article = TozanguchiParser.parseArticle(text)
   if None != article:
-      mountains = article.find_all("h3")
+      mountains, tozanguchiLinks = article
       mountainNames = []
       for aMountain in mountains:
-        mountainNames.append( getMountainName( aMountain.get_text().strip() ) )
+        mountainNames.append( getMountainName( aMountain.strip() ) )
       mountainMax = len(mountainNames)
-      tozanguchis = article.find_all("p", {"class":"th_data"})
       i = 0
-      for aTozanguchi in tozanguchis:
-        theLinks = aTozanguchi.find_all("a")
+      for theLinks in tozanguchiLinks:
         theMountainName = ""
         if i<mountainMax:
           theMountainName = mountainNames[i]
           i=i+1
         tozanguchis = {}
-        for aTozanguchiLink in theLinks:
-          theUrl = aTozanguchiLink.get("href").strip()
-          theText = aTozanguchiLink.get_text().strip()
+        for theUrl, theText in theLinks:
+          theUrl = theUrl.strip()
+          theText = theText.strip()
           if isMountainLink(theUrl):
             tozanguchis[getUniqueKeyValue(tozanguchis, theText, theUrl)] = theUrl
-        result[ getUniqueKey(result, theMountainName) ] = tozanguchis
+        result.append( [theMountainName, tozanguchis] )
   return result
 
+def mergeLinks(result, pageLinks):
+  for theMountainName, tozanguchis in pageLinks:
+    result[ getUniqueKey(result, theMountainName) ] = tozanguchis
+  return result
 
-if __name__=="__main__":
-  links={}
-  if len(sys.argv) == 5:
-    if sys.argv[1].startswith("http"):
-      links = getLinks(sys.argv[1], links)
-    if sys.argv[2].startswith("http"):
-      targetLink = sys.argv[2]
-      i=int(sys.argv[3])
-      maxPages = int(sys.argv[4])
-      while i<=maxPages:
-        time.sleep(1)
-        links = getLinks(targetLink+str(i), links)
-        i=i+1
-
-    print("tozanguchiDic={")
-    for theText, theUrl in links.items():
-      if isinstance(theUrl, dict):
-        print('  "'+theText+'":{')
-        for tozanguchi, link in theUrl.items():
-          print('    "'+tozanguchi + '":"' +link+'",')
-        print('  },')
-    print("}")
-
-    print('''
+def getLinks(articleUrl, result):
+  if result == None:
+    result = {}
+  return mergeLinks( result, getPageLinks( HttpUtil.getText(articleUrl) ) )
+
+def getPageUrls(firstUrl, pageUrl, startPage, maxPages):
+  result = []
+  if firstUrl.startswith("http"):
+    result.append( firstUrl )
+  if pageUrl.startswith("http"):
+    for i in range(startPage, maxPages+1):
+      result.append( pageUrl+str(i) )
+  return result
+
+def getDicSource(links):
+  result = ["tozanguchiDic={"]
+  for theText, theUrl in links.items():
+    if isinstance(theUrl, dict):
+      result.append('  "'+theText+'":{')
+      for tozanguchi, link in theUrl.items():
+        result.append('    "'+tozanguchi + '":"' +link+'",')
+      result.append('  },')
+  result.append("}")
+  result.append('''
 def getTozanguchiDic():
   return tozanguchiDic
-''')
\ No newline at end of file
+''')
+  return "\n".join(result)+"\n"
+
+# the compatible module of getTozanguchiDic() over the data file
+def getDicFileShimSource(dataPath):
+  return f'''import os
+from tozanguchi_dic_file import TozanguchiDicFile
+
+tozanguchiDic = TozanguchiDicFile(os.path.join(os.path.dirname(os.path.abspath(__file__)), "{os.path.basename(dataPath)}"))
+
+def getTozanguchiDic():
+  return tozanguchiDic
+'''
+
+def writeText(path, text):
+  tmpPath = f'{path}.{os.getpid()}.tmp'
+  with open(tmpPath, 'w', encoding='UTF-8') as f:
+    f.write( text )
+  os.replace(tmpPath, path)
+
+def writeDic(path, links, format):
+  if format == "jsonl":
+    dataPath = TozanguchiDicFile.getDataPath(path)
+    TozanguchiDicFile.write(dataPath, links)
+    writeText(path, getDicFileShimSource(dataPath))
+  else:
+    writeText(path, getDicSource(links))
+
+# whether the output is already written in the format
+def isDicWritten(path, format):
+  result = False
+  if os.path.exists(path):
+    with open(path, 'r', encoding='UTF-8') as f:
+      isShim = "TozanguchiDicFile" in f.read(1024)
+    result = isShim == (format == "jsonl")
+    if result and isShim:
+      result = os.path.exists( TozanguchiDicFile.getDataPath(path) )
+  return result
+
+
+class CrawlCheckpoint:
+  CHECKPOINT_DIR = os.path.expanduser("~")+"/.cache/tozanguchi/crawl"
+  CHECKPOINT_EXPIRE_HOURS = 24
+
+  def __init__(self, baseDir = None, expireHours = None):
+    self.baseDir = baseDir if baseDir else CrawlCheckpoint.CHECKPOINT_DIR
+    self.expireHours = expireHours if expireHours!=None else CrawlCheckpoint.CHECKPOINT_EXPIRE_HOURS
+
+  def getPath(self, url):
+    return os.path.join(self.baseDir, hashlib.sha1(url.encode("utf-8")).hexdigest()+".json")
+
+  def load(self, url):
+    result = None
+    path = self.getPath(url)
+    if os.path.exists(path) and time.time() < os.path.getmtime(path) + self.expireHours * 3600:
+      try:
+        with open(path, 'r', encoding='UTF-8') as f:
+          data = json.load(f)
+        if data.get("url") == url:
+          result = data["links"]
+      except:
+        result = None
+    return result
+
+  def store(self, url, pageLinks):
+    if not os.path.exists(self.baseDir):
+      os.makedirs(self.baseDir)
+    path = self.getPath(url)
+    tmpPath = f'{path}.{os.getpid()}.tmp'
+    with open(tmpPath, 'w', encoding='UTF-8') as f:
+      json.dump({"url":url, "links":pageLinks}, f, ensure_ascii=False)
+    os.replace(tmpPath, path)
+
+  def remove(self, urls):
+    for aUrl in urls:
+      try:
+        os.remove(self.getPath(aUrl))
+      except:
+        pass
+
+
+class TozanguchiCrawler:
+  DEFAULT_MAX_WORKERS = 2
+  DEFAULT_MAX_PER_HOST = 2
+  DEFAULT_INTERVAL_SEC = 1.0
+
+  def __init__(self, checkpoint, maxWorkers = None, maxPerHost = None, interval = None):
+    self.checkpoint = checkpoint
+    self.maxWorkers = maxWorkers if maxWorkers else TozanguchiCrawler.DEFAULT_MAX_WORKERS
+    maxPerHost = maxPerHost if maxPerHost else TozanguchiCrawler.DEFAULT_MAX_PER_HOST
+    interval = interval if interval!=None else TozanguchiCrawler.DEFAULT_INTERVAL_SEC
+    self.throttle = HostThrottle(maxPerHost, interval)
+
+  def _crawl(self, url):
+    pageLinks = getPageLinks( self.throttle.call(url, HttpUtil.getText, url) )
+    self.checkpoint.store(url, pageLinks)
+    return pageLinks
+
+  # returns {mountain:{tozanguchi:url}}, [failed url]
+  def crawl(self, urls):
+    pages = {}
+    failedUrls = []
+    urlsToFetch = []
+    for aUrl in urls:
+      pageLinks = self.checkpoint.load(aUrl)
+      if pageLinks != None:
+        pages[aUrl] = pageLinks
+      else:
+        urlsToFetch.append(aUrl)
+
+    if urlsToFetch:
+      from concurrent.futures import ThreadPoolExecutor
+      with ThreadPoolExecutor(max_workers=self.maxWorkers) as executor:
+        futures = {}
+        for aUrl in urlsToFetch:
+          futures[aUrl] = executor.submit(self._crawl, aUrl)
+        for aUrl, aFuture in futures.items():
+          try:
+            pages[aUrl] = aFuture.result()
+          except Exception as e:
+            print(f'failed to get {aUrl} : {e}', file=sys.stderr)
+            failedUrls.append(aUrl)
+
+    # merge in the page order since the unique key depends on the preceding pages
+    result = {}
+    if not failedUrls:
+      for aUrl in urls:
+        mergeLinks(result, pages[aUrl])
+    return result, failedUrls
+
+
+class TozanguchiDicDiff:
+  @staticmethod
+  def loadDic(path):
+    result = {}
+    if path and os.path.exists(path):
+      spec = importlib.util.spec_from_file_location("previousTozanguchiDic", path)
+      module = importlib.util.module_from_spec(spec)
+      spec.loader.exec_module(module)
+      dic = module.getTozanguchiDic()
+      result = dict( dic.items() )
+      if isinstance(dic, TozanguchiDicFile):
+        # the data file may be replaced by the new dictionary
+        dic.close()
+    return result
+
+  # returns {"added":[mountain], "removed":[mountain], "changed":{mountain:{"added":{tozanguchi:url}, "removed":{tozanguchi:url}}}}
+  @staticmethod
+  def getDiff(previous, current):
+    result = {"added":[], "removed":[], "changed":{}}
+    for aMountain, tozanguchis in current.items():
+      if not aMountain in previous:
+        result["added"].append(aMountain)
+      elif previous[aMountain] != tozanguchis:
+        previousTozanguchis = previous[aMountain]
+        result["changed"][aMountain] = {
+          "added": { aTozanguchi:theUrl for aTozanguchi, theUrl in tozanguchis.items() if previousTozanguchis.get(aTozanguchi)!=theUrl },
+          "removed": { aTozanguchi:theUrl for aTozanguchi, theUrl in previousTozanguchis.items() if tozanguchis.get(aTozanguchi)!=theUrl }
+        }
+    for aMountain in previous.keys():
+      if not aMountain in current:
+        result["removed"].append(aMountain)
+    return result
+
+  @staticmethod
+  def isChanged(diff):
+    return bool( diff["added"] or diff["removed"] or diff["changed"] )
+
+  @staticmethod
+  def getLinkSet(dic):
+    result = set()
+    for aMountain, tozanguchis in dic.items():
+      for aTozanguchi, theUrl in tozanguchis.items():
+        result.add( (aMountain, aTozanguchi, theUrl) )
+    return result
+
+  # the url which is added, removed or moved to another mountain/trailhead name
+  @staticmethod
+  def getChangedUrls(previous, current):
+    changedLinks = TozanguchiDicDiff.getLinkSet(previous).symmetric_difference( TozanguchiDicDiff.getLinkSet(current) )
+    return set( [ theUrl for aMountain, aTozanguchi, theUrl in changedLinks ] )
+
+  @staticmethod
+  def printDiff(diff, file = sys.stderr):
+    for aMountain in diff["added"]:
+      print(f'+ {aMountain}', file=file)
+    for aMountain in diff["removed"]:
+      print(f'- {aMountain}', file=file)
+    for aMountain, tozanguchis in diff["changed"].items():
+      print(f'* {aMountain}', file=file)
+      for aTozanguchi, theUrl in tozanguchis["added"].items():
+        print(f'  + {aTozanguchi} {theUrl}', file=file)
+      for aTozanguchi, theUrl in tozanguchis["removed"].items():
+        print(f'  - {aTozanguchi} {theUrl}', file=file)
+
+
+if __name__=="__main__":
+  parser = argparse.ArgumentParser(description='Crawl tozanguchi list pages and output tozanguchiDic')
+  parser.add_argument('args', nargs='*', help='specify first page url, page url prefix, start page and max page e.g. https://tozanguchinavi.com/mt https://tozanguchinavi.com/mt/page/ 2 96')
+  parser.add_argument('-o', '--output', action='store', default=None, help='specify output file e.g. tozanguchiDic.py (default:stdout)')
+  parser.add_argument('-f', '--format', action='store', default='jsonl', choices=['jsonl', 'py'], help='specify output format of --output. jsonl writes the data file and the loader module')
+  parser.add_argument('-p', '--previous', action='store', default=None, help='specify previous tozanguchiDic.py to compare (default:output)')
+  parser.add_argument('-x', '--invalidate', action='store_true', default=False, help='specify if you want to invalidate park cache of changed trailheads')
+  parser.add_argument('-c', '--checkpoint', action='store', default=CrawlCheckpoint.CHECKPOINT_DIR, help='specify checkpoint directory')
+  parser.add_argument('-n', '--restart', action='store_true', default=False, help='specify if you want to discard checkpoints of previous run')
+  parser.add_argument('-j', '--parallel', action='store', type=int, default=TozanguchiCrawler.DEFAULT_MAX_WORKERS, help='specify the number of concurrent page fetch')
+  parser.add_argument('-jh', '--maxPerHost', action='store', type=int, default=TozanguchiCrawler.DEFAULT_MAX_PER_HOST, help='specify the max concurrent requests per host')
+  parser.add_argument('-ji', '--interval', action='store', type=float, default=TozanguchiCrawler.DEFAULT_INTERVAL_SEC, help='specify the min interval sec between requests per host')
+
+  args = parser.parse_args()
+  if len(args.args) == 4:
+    urls = getPageUrls(args.args[0], args.args[1], int(args.args[2]), int(args.args[3]))
+    checkpoint = CrawlCheckpoint(args.checkpoint)
+    if args.restart:
+      checkpoint.remove(urls)
+
+    crawler = TozanguchiCrawler(checkpoint, args.parallel, args.maxPerHost, args.interval)
+    links, failedUrls = crawler.crawl(urls)
+    if failedUrls:
+      print(f'{len(failedUrls)} pages are failed. run again to resume from the checkpoints', file=sys.stderr)
+      exit(1)
+
+    previousPath = args.previous if args.previous else args.output
+    previous = TozanguchiDicDiff.loadDic(previousPath)
+    diff = TozanguchiDicDiff.getDiff(previous, links)
+    if previous:
+      TozanguchiDicDiff.printDiff(diff)
+
+    if args.output:
+      # keep the unchanged dictionary as is not to rebuild the derived data
+      if not previous or TozanguchiDicDiff.isChanged(diff) or os.path.abspath(previousPath)!=os.path.abspath(args.output) or not isDicWritten(args.output, args.format):
+        writeDic(args.output, links, args.format)
+    else:
+      sys.stdout.write( getDicSource(links) )
+
+    if args.invalidate and previous:
+      changedUrls = TozanguchiDicDiff.getChangedUrls(previous, links)
+      if changedUrls:
+        from get_tozanguchi import TozanguchiCache
+        TozanguchiCache.invalidate(changedUrls)
+        print(f'{len(changedUrls)} park caches are invalidated', file=sys.stderr)
+
+    checkpoint.remove(urls)
@@ -0,0 +1,260 @@
+#   Copyright 2026 hidenorly
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+from html.parser import HTMLParser
+import html.entities
+
+
+class ElementTextParser(HTMLParser):
+  # same as the void elements of BeautifulSoup's html.parser tree builder
+  VOID_ELEMENTS = set(["area", "base", "br", "col", "embed", "hr", "img", "input", "keygen", "link", "menuitem", "meta", "param", "source", "track", "wbr", "basefont", "bgsound", "command", "frame", "image", "isindex", "nextid", "spacer"])
+  NON_TEXT_ELEMENTS = set(["script", "style", "template"])
+  PRESERVE_WHITESPACE_ELEMENTS = set(["pre", "textarea"])
+  ASCII_SPACES = str.maketrans("", "", "\x20\x0a\x09\x0c\x0d")
+
+  def __init__(self):
+    super().__init__(convert_charrefs=False)
+    # [tag, collector or None]
+    self.stack = []
+    self.collectors = []
+    self.nonText = 0
+    self.preserveWhitespace = 0
+    self.data = []
+    self.closedVoidElements = []
+
+  def getCollector(self, tag, attrs):
+    return None
+
+  def handle_starttag(self, tag, attrs):
+    self.flushData()
+    collector = self.getCollector(tag, attrs)
+    if collector != None:
+      self.collectors.append(collector)
+    if tag in ElementTextParser.VOID_ELEMENTS:
+      # the following end tag of the void element is consumed without closing anything
+      self.closedVoidElements.append(tag)
+    else:
+      self.stack.append( [tag, collector] )
+      if tag in ElementTextParser.NON_TEXT_ELEMENTS:
+        self.nonText = self.nonText + 1
+      if tag in ElementTextParser.PRESERVE_WHITESPACE_ELEMENTS:
+        self.preserveWhitespace = self.preserveWhitespace + 1
+
+  def handle_startendtag(self, tag, attrs):
+    self.flushData()
+    collector = self.getCollector(tag, attrs)
+    if collector != None:
+      self.collectors.append(collector)
+
+  def handle_endtag(self, tag):
+    if tag in self.closedVoidElements:
+      self.closedVoidElements.remove(tag)
+      return
+    self.flushData()
+    # close up to the latest same tag as BeautifulSoup does. ignore the unopened end tag
+    for i in range(len(self.stack)-1, -1, -1):
+      if self.stack[i][0] == tag:
+        while len(self.stack) > i:
+          aTag, collector = self.stack.pop()
+          if collector != None:
+            self.collectors = [ aCollector for aCollector in self.collectors if not aCollector is collector ]
+            self.onClose(aTag, collector)
+          if aTag in ElementTextParser.NON_TEXT_ELEMENTS:
+            self.nonText = self.nonText - 1
+          if aTag in ElementTextParser.PRESERVE_WHITESPACE_ELEMENTS:
+            self.preserveWhitespace = self.preserveWhitespace - 1
+        break
+
+  # resolve the references as same as BeautifulSoup does
+  def handle_entityref(self, name):
+    character = html.entities.html5.get(name+";")
+    self.handle_data( character if character else "&"+name )
+
+  def handle_charref(self, name):
+    if name.startswith("x") or name.startswith("X"):
+      codepoint = int(name.lstrip("xX"), 16)
+    else:
+      codepoint = int(name)
+    data = None
+    if codepoint < 256:
+      try:
+        data = bytearray([codepoint]).decode("windows-1252")
+      except UnicodeDecodeError:
+        pass
+    if not data:
+      try:
+        data = chr(codepoint)
+      except (ValueError, OverflowError):
+        pass
+    self.handle_data( data if data else "\N{REPLACEMENT CHARACTER}" )
+
+  def handle_data(self, data):
+    self.data.append(data)
+
+  def handle_comment(self, data):
+    self.flushData()
+
+  def handle_decl(self, decl):
+    self.flushData()
+
+  def handle_pi(self, data):
+    self.flushData()
+
+  def close(self):
+    super().close()
+    self.flushData()
+
+  # a text between tags is a string node. the whitespace only node is collapsed as same as BeautifulSoup does
+  def flushData(self):
+    if self.data:
+      data = "".join(self.data)
+      self.data = []
+      if not self.preserveWhitespace and data.translate(ElementTextParser.ASCII_SPACES) == "":
+        data = "\n" if "\n" in data else " "
+      if not self.nonText:
+        for aCollector in self.collectors:
+          if aCollector["text"] != None:
+            aCollector["text"].append(data)
+
+  def onClose(self, tag, collector):
+    pass
+
+
+class ParkInfoParser(ElementTextParser):
+  def __init__(self):
+    super().__init__()
+    self.dts = []
+    self.dds = []
+
+  def getCollector(self, tag, attrs):
+    result = None
+    if tag == "dt" or tag == "dd":
+      result = {"text":[]}
+      if tag == "dt":
+        self.dts.append(result)
+      else:
+        self.dds.append(result)
+    return result
+
+
+class ArticleParser(ElementTextParser):
+  def __init__(self):
+    super().__init__()
+    self.inArticle = False
+    self.articleFound = False
+    self.thData = None
+    self.mountainNames = []
+    self.tozanguchis = []
+
+  @staticmethod
+  def hasClass(attrs, className):
+    for aKey, aValue in attrs:
+      if aKey == "class" and aValue != None and ( aValue == className or className in aValue.split() ):
+        return True
+    return False
+
+  def getCollector(self, tag, attrs):
+    result = None
+    if not self.articleFound:
+      if tag == "article":
+        self.articleFound = True
+        self.inArticle = True
+        result = {"type":"article", "text":None}
+    elif self.inArticle:
+      if tag == "h3":
+        result = {"type":"h3", "text":[]}
+        self.mountainNames.append(result)
+      elif tag == "p" and ArticleParser.hasClass(attrs, "th_data"):
+        result = {"type":"th_data", "text":[], "links":[]}
+        self.tozanguchis.append(result)
+      elif tag == "a":
+        thDatas = [ aCollector for aCollector in self.collectors if aCollector["type"] == "th_data" ]
+        if thDatas:
+          href = dict(attrs).get("href")
+          result = {"type":"a", "text":[], "href":href if href else ""}
+          for aCollector in thDatas:
+            aCollector["links"].append(result)
+    return result
+
+  def onClose(self, tag, collector):
+    if collector["type"] == "article":
+      self.inArticle = False
+
+
+class TozanguchiParser:
+  @staticmethod
+  def getFirstLine(text):
+    return text.strip().split("\n")[0].strip()
+
+  @staticmethod
+  def parseParkInfo(html):
+    result = {}
+    parser = ParkInfoParser()
+    parser.feed(html)
+    parser.close()
+    dts = parser.dts
+    dds = parser.dds
+    # i should be starting from 0 and shoud use dts[i], dds[i] and should not require to split
+    i = 1
+    while( i<len(dts) and i<len(dds) ):
+      key = TozanguchiParser.getFirstLine( "".join(dts[i*2-1]["text"]) )
+      value = TozanguchiParser.getFirstLine( "".join(dds[i]["text"]) )
+      result[key] = value
+      i=i+1
+    return result
+
+  # reference implementation by BeautifulSoup
+  @staticmethod
+  def parseParkInfoWithSoup(html):
+    from bs4 import BeautifulSoup
+    result = {}
+    soup = BeautifulSoup(html, 'html.parser')
+    if None != soup:
+      dts = soup.find_all("dt")
+      dds = soup.find_all("dd")
+      i = 1
+      while( i<len(dts) and i<len(dds) ):
+        key = dts[i*2-1].text.strip().split("\n")[0].strip()
+        value = dds[i].text.strip().split("\n")[0].strip()
+        result[key] = value
+        i=i+1
+    return result
+
+  # returns [h3 text], [[(href, text)] per p.th_data] in the first article or None
+  @staticmethod
+  def parseArticle(html):
+    parser = ArticleParser()
+    parser.feed(html)
+    parser.close()
+    if not parser.articleFound:
+      return None
+    mountainNames = [ "".join(aMountain["text"]) for aMountain in parser.mountainNames ]
+    tozanguchis = []
+    for aTozanguchi in parser.tozanguchis:
+      tozanguchis.append( [ (aLink["href"], "".join(aLink["text"])) for aLink in aTozanguchi["links"] ] )
+    return mountainNames, tozanguchis
+
+  # reference implementation by BeautifulSoup
+  @staticmethod
+  def parseArticleWithSoup(html):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    article = soup.find("article", {})
+    if None == article:
+      return None
+    mountainNames = [ aMountain.get_text() for aMountain in article.find_all("h3") ]
+    tozanguchis = []
+    for aTozanguchi in article.find_all("p", {"class":"th_data"}):
+      tozanguchis.append( [ (aLink.get("href") or "", aLink.get_text()) for aLink in aTozanguchi.find_all("a") ] )
+    return mountainNames, tozanguchis
@@ -0,0 +1,219 @@
+#   Copyright 2026 hidenorly
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import sys
+import io
+import os
+import json
+import time
+import argparse
+import threading
+import contextvars
+import traceback
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+# the stream which is switched per query to capture its output. the threads started by copy_context().run inherit the capture
+class SwitchableStream(io.TextIOBase):
+  def __init__(self, stream, name):
+    self.stream = stream
+    self.capture = contextvars.ContextVar(name, default=None)
+
+  @property
+  def encoding(self):
+    return "utf-8"
+
+  def getStream(self):
+    capture = self.capture.get()
+    return capture if capture != None else self.stream
+
+  def setStream(self, stream):
+    self.capture.set(stream)
+
+  def write(self, s):
+    return self.getStream().write(s)
+
+  def flush(self):
+    self.getStream().flush()
+
+
+# run the queries of the command lines concurrently in the process which keeps the dictionaries, the indexes, the caches and the browser
+class QueryServer:
+  DEFAULT_HOST = "127.0.0.1"
+  DEFAULT_PORT = 8765
+  # {command:{the keyword arguments of main()}}
+  COMMANDS = {
+    "get_tozanguchi": {},
+    "get_route_time_to_tozanguchi": {"waitForRefresh": False}
+  }
+
+  def __init__(self):
+    self.modules = {}
+    self.stdout = None
+    self.stderr = None
+    self.startTime = time.time()
+    self.requests = 0
+    self.lastQueryStats = None
+    self.lock = threading.Lock()
+    # the running queries and whether the reload is waiting for them
+    self.condition = threading.Condition()
+    self.running = 0
+    self.reloading = False
+
+  # the streams are replaced before the import since the default argument of file=sys.stderr is bound at the import
+  def load(self):
+    self.stdout = sys.stdout = SwitchableStream(sys.stdout, "stdout")
+    self.stderr = sys.stderr = SwitchableStream(sys.stderr, "stderr")
+    import importlib
+    for aCommand in QueryServer.COMMANDS.keys():
+      self.modules[aCommand] = importlib.import_module(aCommand)
+
+  # get_tozanguchi.py, get_tozanguchi and /path/to/get_tozanguchi.py are acceptable
+  @staticmethod
+  def getCommand(command):
+    return os.path.splitext(os.path.basename(str(command)))[0]
+
+  # reload the dictionaries updated by tozanguchi_list_mountains.py
+  def reload(self):
+    from get_tozanguchi import DataSnapshot
+    tozanguchiDic = DataSnapshot.reload()
+    for aModule in self.modules.values():
+      if hasattr(aModule, "tozanguchiDic"):
+        aModule.tozanguchiDic = tozanguchiDic
+    print('reloaded the updated dictionaries', file=self.stderr.stream)
+
+  # the park cache updated e.g. by tozanguchi_warm_cache.py is reloaded on demand without waiting for the running queries
+  # the dictionaries are reloaded after the running queries and the new queries wait for it
+  def enter(self):
+    from get_tozanguchi import DataSnapshot, TozanguchiCache
+    if TozanguchiCache.isUpdated():
+      TozanguchiCache.reload()
+    with self.condition:
+      while self.reloading:
+        self.condition.wait()
+      if DataSnapshot.isUpdated():
+        self.reloading = True
+        try:
+          while self.running:
+            self.condition.wait()
+          self.reload()
+        finally:
+          self.reloading = False
+          self.condition.notify_all()
+      self.running = self.running + 1
+
+  def leave(self):
+    with self.condition:
+      self.running = self.running - 1
+      self.condition.notify_all()
+
+  # returns {"exitCode":int, "stdout":str, "stderr":str}. the stale route time is refreshed in background after the return
+  def query(self, command, args):
+    command = QueryServer.getCommand(command)
+    if not command in self.modules:
+      return {"exitCode": 2, "stdout": "", "stderr": f'unknown command {command}\n'}
+    from tozanguchi_stats import Stats
+    with self.lock:
+      self.requests = self.requests + 1
+    self.enter()
+    # --stats and the output are of this query only
+    stats = Stats.bind()
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    self.stdout.setStream(stdout)
+    self.stderr.setStream(stderr)
+    exitCode = 0
+    try:
+      self.modules[command].main([str(anArg) for anArg in args], **QueryServer.COMMANDS[command])
+    except SystemExit as e:
+      exitCode = e.code if isinstance(e.code, int) else (0 if e.code == None else 1)
+    except Exception:
+      traceback.print_exc()
+      exitCode = 1
+    finally:
+      self.stdout.setStream(None)
+      self.stderr.setStream(None)
+      self.leave()
+    with self.lock:
+      self.lastQueryStats = Stats.get(stats)
+    return {"exitCode": exitCode, "stdout": stdout.getvalue(), "stderr": stderr.getvalue()}
+
+  def getStatus(self):
+    with self.lock:
+      return {"pid": os.getpid(), "uptimeSec": time.time() - self.startTime, "requests": self.requests, "running": self.running, "commands": list(self.modules.keys()), "lastQueryStats": self.lastQueryStats}
+
+  def close(self):
+    route = self.modules.get("get_route_time_to_tozanguchi")
+    if route:
+      route.CachedRouteUtil.closeAll()
+
+
+class QueryRequestHandler(BaseHTTPRequestHandler):
+  def sendJson(self, code, data):
+    body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+    self.send_response(code)
+    self.send_header("Content-Type", "application/json; charset=utf-8")
+    self.send_header("Content-Length", str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  # POST /query {"command":"get_tozanguchi.py", "args":["富士山", "-c"]}
+  def do_POST(self):
+    if self.path != "/query":
+      self.sendJson(404, {"error": f'unknown path {self.path}'})
+      return
+    try:
+      request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+      command = request["command"]
+      args = request.get("args", [])
+    except Exception as e:
+      self.sendJson(400, {"error": f'invalid request : {e}'})
+      return
+    self.sendJson(200, self.server.queryServer.query(command, args))
+
+  # GET /status
+  def do_GET(self):
+    if self.path != "/status":
+      self.sendJson(404, {"error": f'unknown path {self.path}'})
+      return
+    self.sendJson(200, self.server.queryServer.getStatus())
+
+  # the access log goes to the server's stderr, not to the query's
+  def log_message(self, format, *args):
+    if self.server.verbose:
+      self.server.queryServer.stderr.stream.write(f'{self.address_string()} - [{self.log_date_time_string()}] {format % args}\n')
+
+
+if __name__=="__main__":
+  parser = argparse.ArgumentParser(description='Serve the queries of get_tozanguchi.py and get_route_time_to_tozanguchi.py as JSON over HTTP')
+  parser.add_argument('-b', '--bind', action='store', default=QueryServer.DEFAULT_HOST, help=f'specify the address to listen e.g. {QueryServer.DEFAULT_HOST}')
+  parser.add_argument('-p', '--port', action='store', type=int, default=QueryServer.DEFAULT_PORT, help=f'specify the port to listen e.g. {QueryServer.DEFAULT_PORT}')
+  parser.add_argument('-v', '--verbose', action='store_true', default=False, help='specify if you want to output the access log on stderr')
+
+  args = parser.parse_args()
+
+  queryServer = QueryServer()
+  queryServer.load()
+  httpServer = ThreadingHTTPServer((args.bind, args.port), QueryRequestHandler)
+  httpServer.daemon_threads = True
+  httpServer.queryServer = queryServer
+  httpServer.verbose = args.verbose
+  print(f'listening on http://{args.bind}:{args.port}', file=sys.stderr)
+  try:
+    httpServer.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    httpServer.server_close()
+    queryServer.close()
@@ -0,0 +1,175 @@
+#   Copyright 2026 hidenorly
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import sys
+import json
+import time
+import threading
+import contextvars
+
+
+class StatsTimer:
+  def __init__(self, func, name):
+    self.func = func
+    self.name = name
+    self.start = None
+
+  def __enter__(self):
+    self.start = time.perf_counter()
+    return self
+
+  def __exit__(self, excType, excValue, traceback):
+    self.func(self.name, time.perf_counter() - self.start)
+    return False
+
+
+class StatsData:
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.startTime = time.perf_counter()
+    # {name:[calls, sec]}
+    self.phases = {}
+    # {name:count}
+    self.counters = {}
+    # {name:[count, sec, minSec, maxSec, [count per bucket + overflow]]}
+    self.latencies = {}
+
+
+# the phase wall time, counters and latency histograms. always collected since the cost is a few usec per event
+# they are process wide unless bind() is called. the threads started by copy_context().run inherit the bound ones
+class Stats:
+  FORMAT_TEXT = "text"
+  FORMAT_JSON = "json"
+  HISTOGRAM_BUCKETS_MSEC = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 60000]
+  processData = StatsData()
+  boundData = contextvars.ContextVar("stats", default=None)
+
+  @staticmethod
+  def getData():
+    data = Stats.boundData.get()
+    return data if data != None else Stats.processData
+
+  # collect the stats of the current context (e.g. the query of the server) separately. returns the bound StatsData
+  @staticmethod
+  def bind():
+    data = StatsData()
+    Stats.boundData.set(data)
+    return data
+
+  @staticmethod
+  def addPhase(name, sec):
+    data = Stats.getData()
+    with data.lock:
+      phase = data.phases.get(name)
+      if phase == None:
+        phase = data.phases[name] = [0, 0.0]
+      phase[0] += 1
+      phase[1] += sec
+
+  @staticmethod
+  def phase(name):
+    return StatsTimer(Stats.addPhase, name)
+
+  @staticmethod
+  def count(name, n = 1):
+    data = Stats.getData()
+    with data.lock:
+      data.counters[name] = data.counters.get(name, 0) + n
+
+  @staticmethod
+  def getBucket(sec):
+    msec = sec * 1000
+    for i, aBucket in enumerate(Stats.HISTOGRAM_BUCKETS_MSEC):
+      if msec <= aBucket:
+        return i
+    return len(Stats.HISTOGRAM_BUCKETS_MSEC)
+
+  @staticmethod
+  def observe(name, sec):
+    bucket = Stats.getBucket(sec)
+    data = Stats.getData()
+    with data.lock:
+      latency = data.latencies.get(name)
+      if latency == None:
+        latency = data.latencies[name] = [0, 0.0, sec, sec, [0] * (len(Stats.HISTOGRAM_BUCKETS_MSEC)+1)]
+      latency[0] += 1
+      latency[1] += sec
+      latency[2] = min(latency[2], sec)
+      latency[3] = max(latency[3], sec)
+      latency[4][bucket] += 1
+
+  @staticmethod
+  def timed(name):
+    return StatsTimer(Stats.observe, name)
+
+  # the upper bound msec of the bucket which contains the percentile
+  @staticmethod
+  def getPercentileMsec(latency, percentile):
+    result = None
+    threshold = latency[0] * percentile
+    n = 0
+    for i, aCount in enumerate(latency[4]):
+      n = n + aCount
+      if n >= threshold:
+        result = Stats.HISTOGRAM_BUCKETS_MSEC[i] if i < len(Stats.HISTOGRAM_BUCKETS_MSEC) else latency[3] * 1000
+        break
+    return result
+
+  @staticmethod
+  def getBucketLabel(i):
+    return f'<={Stats.HISTOGRAM_BUCKETS_MSEC[i]}ms' if i < len(Stats.HISTOGRAM_BUCKETS_MSEC) else f'>{Stats.HISTOGRAM_BUCKETS_MSEC[-1]}ms'
+
+  @staticmethod
+  def get(data = None):
+    data = data if data != None else Stats.getData()
+    with data.lock:
+      latencies = {}
+      for name, latency in data.latencies.items():
+        latencies[name] = {
+          "count": latency[0],
+          "totalMsec": latency[1] * 1000,
+          "meanMsec": latency[1] * 1000 / latency[0],
+          "minMsec": latency[2] * 1000,
+          "maxMsec": latency[3] * 1000,
+          "p50Msec": Stats.getPercentileMsec(latency, 0.5),
+          "p90Msec": Stats.getPercentileMsec(latency, 0.9),
+          "histogram": { Stats.getBucketLabel(i): aCount for i, aCount in enumerate(latency[4]) if aCount }
+        }
+      return {
+        "wallMsec": (time.perf_counter() - data.startTime) * 1000,
+        "phases": { name: {"calls": phase[0], "msec": phase[1] * 1000} for name, phase in data.phases.items() },
+        "counters": dict(data.counters),
+        "latencies": latencies
+      }
+
+  @staticmethod
+  def printReport(format = FORMAT_TEXT, file = sys.stderr):
+    stats = Stats.get()
+    if format == Stats.FORMAT_JSON:
+      print(json.dumps(stats, ensure_ascii=False), file=file)
+      return
+    print(f'total {stats["wallMsec"]:.1f} msec', file=file)
+    if stats["phases"]:
+      print(f'{"phase":40} {"calls":>8} {"msec":>12}', file=file)
+      for name, phase in stats["phases"].items():
+        print(f'  {name:38} {phase["calls"]:8d} {phase["msec"]:12.1f}', file=file)
+    if stats["counters"]:
+      print(f'{"counter":40} {"count":>8}', file=file)
+      for name, count in sorted(stats["counters"].items()):
+        print(f'  {name:38} {count:8d}', file=file)
+    if stats["latencies"]:
+      print(f'{"latency":40} {"count":>8} {"mean":>9} {"min":>9} {"max":>9} {"p50<=":>9} {"p90<=":>9} msec', file=file)
+      for name, latency in stats["latencies"].items():
+        print(f'  {name:38} {latency["count"]:8d} {latency["meanMsec"]:9.1f} {latency["minMsec"]:9.1f} {latency["maxMsec"]:9.1f} {latency["p50Msec"]:9.0f} {latency["p90Msec"]:9.0f}', file=file)
+        print(f'    {" ".join( [ f"{label}:{aCount}" for label, aCount in latency["histogram"].items() ] )}', file=file)
@@ -0,0 +1,168 @@
+#   Copyright 2026 hidenorly
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import sys
+import os
+import time
+import math
+import argparse
+
+from get_tozanguchi import TozanguchiCache
+from get_tozanguchi import TozanguchiFetcher
+from get_tozanguchi import tozanguchiDic
+from tozanguchi_stats import Stats
+
+
+# refresh the park cache before it expires and prefetch the never cached parks by the trickle of each run (e.g. hourly cron)
+class CacheWarmer:
+  DEFAULT_WINDOW_HOURS = 24*3
+  DEFAULT_RUN_INTERVAL_HOURS = 1
+  DEFAULT_MAX_FETCHES = 60
+  DEFAULT_MAX_PER_HOST = 1
+  DEFAULT_INTERVAL_SEC = 2.0
+  LOCK_FILENAME = "warmCache.lock"
+
+  def __init__(self, windowHours = None, runIntervalHours = None, maxFetches = None):
+    self.windowHours = windowHours if windowHours else CacheWarmer.DEFAULT_WINDOW_HOURS
+    self.runIntervalHours = runIntervalHours if runIntervalHours else CacheWarmer.DEFAULT_RUN_INTERVAL_HOURS
+    self.maxFetches = maxFetches if maxFetches!=None else CacheWarmer.DEFAULT_MAX_FETCHES
+
+  @staticmethod
+  def getUrls():
+    result = set()
+    for aMountain in tozanguchiDic:
+      for aTozanguchi, theUrl in tozanguchiDic[aMountain].items():
+        result.add( theUrl )
+    return sorted( result )
+
+  # returns {"expired":[url], "expiring":[url], "expiringSoon":the number of the expiring ones before the next run, "missing":[url]}. the expiring ones are in the expiry order
+  def getCandidates(self, now = None):
+    now = now if now else time.time()
+    records = TozanguchiCache.loadAllCache()
+    expired = []
+    expiring = []
+    missing = []
+    for theUrl in CacheWarmer.getUrls():
+      record = records.get( TozanguchiCache.getCacheFilename(theUrl) )
+      if record == None:
+        missing.append( theUrl )
+      else:
+        expire = TozanguchiCache.getExpire( record )
+        if expire <= now:
+          expired.append( (expire, theUrl) )
+        elif expire <= now + self.windowHours * 3600:
+          expiring.append( (expire, theUrl) )
+    return {
+      "expired": [ theUrl for expire, theUrl in sorted(expired) ],
+      "expiring": [ theUrl for expire, theUrl in sorted(expiring) ],
+      "expiringSoon": len( [ expire for expire, theUrl in expiring if expire <= now + self.runIntervalHours * 3600 ] ),
+      "missing": missing
+    }
+
+  # returns (the urls to refresh, the urls to prefetch) of this run
+  def getPlan(self, candidates):
+    # the expiring ones are spread over the runs within the window. the ones which expire before the next run can't wait
+    runs = max( 1, self.windowHours / self.runIntervalHours )
+    n = max( math.ceil( len(candidates["expiring"]) / runs ), candidates["expiringSoon"] )
+    refreshUrls = candidates["expired"] + candidates["expiring"][0:n]
+    prefetchUrls = candidates["missing"]
+    if self.maxFetches:
+      refreshUrls = refreshUrls[0:self.maxFetches]
+      prefetchUrls = prefetchUrls[0:self.maxFetches - len(refreshUrls)]
+    return refreshUrls, prefetchUrls
+
+  # returns {url:lastUpdate} of the cached parks to know whether they are refreshed
+  @staticmethod
+  def getLastUpdates(urls):
+    result = {}
+    for theUrl in urls:
+      record = TozanguchiCache.getCacheRecord( theUrl )
+      result[theUrl] = record["lastUpdate"] if record != None else None
+    return result
+
+  # returns the urls which are neither refreshed nor fetched. the failed refresh keeps the cached park as is
+  @staticmethod
+  def getFailedUrls(lastUpdates, fetched):
+    result = []
+    for theUrl, lastUpdate in lastUpdates.items():
+      record = TozanguchiCache.getCacheRecord( theUrl )
+      if not theUrl in fetched or record == None or record["lastUpdate"] == lastUpdate:
+        result.append( theUrl )
+    return result
+
+  # returns the file which is locked while the run. None if the other run is in progress
+  @staticmethod
+  def lock():
+    TozanguchiCache.ensureCacheStorage()
+    f = open(os.path.join(TozanguchiCache.CACHE_BASE_DIR, CacheWarmer.LOCK_FILENAME), 'w')
+    try:
+      import fcntl
+      fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except ImportError:
+      pass
+    except OSError:
+      f.close()
+      f = None
+    return f
+
+
+if __name__=="__main__":
+  parser = argparse.ArgumentParser(description='Refresh the park cache before it expires and prefetch the never cached parks e.g. by hourly cron')
+  parser.add_argument('-w', '--window', action='store', type=float, default=CacheWarmer.DEFAULT_WINDOW_HOURS, help='specify the hours before the expiry to start refreshing e.g. 72')
+  parser.add_argument('-e', '--every', action='store', type=float, default=CacheWarmer.DEFAULT_RUN_INTERVAL_HOURS, help='specify the hours between the runs e.g. 1 for hourly cron')
+  parser.add_argument('-m', '--maxFetches', action='store', type=int, default=CacheWarmer.DEFAULT_MAX_FETCHES, help='specify the max number of fetches per run (0:unlimited)')
+  parser.add_argument('-j', '--parallel', action='store', type=int, default=TozanguchiFetcher.DEFAULT_MAX_WORKERS, help='specify the number of concurrent fetches e.g. 4')
+  parser.add_argument('-jh', '--maxPerHost', action='store', type=int, default=CacheWarmer.DEFAULT_MAX_PER_HOST, help='specify the number of concurrent fetches per host e.g. 1')
+  parser.add_argument('-ji', '--interval', action='store', type=float, default=CacheWarmer.DEFAULT_INTERVAL_SEC, help='specify the interval sec between fetches per host e.g. 2.0')
+  parser.add_argument('-n', '--dryRun', action='store_true', default=False, help='specify if you want to output the urls to fetch without fetching')
+  parser.add_argument('-st', '--stats', '--profile', action='store_true', default=False, help='specify if you want to output the phase time, the cache hit/miss and the latency on stderr')
+  parser.add_argument('-sf', '--statsFormat', action='store', default=Stats.FORMAT_TEXT, choices=[Stats.FORMAT_TEXT, Stats.FORMAT_JSON], help='specify the format of --stats e.g. text, json')
+
+  args = parser.parse_args()
+
+  lockFile = CacheWarmer.lock()
+  if not lockFile:
+    print('the other cache warming is in progress', file=sys.stderr)
+    exit(0)
+
+  warmer = CacheWarmer( args.window, args.every, args.maxFetches )
+  with Stats.phase("find candidates"):
+    candidates = warmer.getCandidates()
+  refreshUrls, prefetchUrls = warmer.getPlan( candidates )
+
+  if args.dryRun:
+    for theUrl in refreshUrls:
+      print(f'refresh {theUrl}')
+    for theUrl in prefetchUrls:
+      print(f'prefetch {theUrl}')
+  else:
+    fetcher = TozanguchiFetcher( args.parallel, args.maxPerHost, args.interval )
+    lastUpdates = CacheWarmer.getLastUpdates( refreshUrls + prefetchUrls )
+    # the expiring ones are revalidated by conditional GET
+    with Stats.phase("fetch"):
+      fetched = fetcher.fetch( refreshUrls + prefetchUrls )
+    failedUrls = CacheWarmer.getFailedUrls( lastUpdates, fetched )
+    for theUrl in failedUrls:
+      print(f'failed to {"refresh" if lastUpdates[theUrl] != None else "prefetch"} {theUrl}', file=sys.stderr)
+    refreshed = len( [ theUrl for theUrl in refreshUrls if not theUrl in failedUrls ] )
+    prefetched = len( [ theUrl for theUrl in prefetchUrls if not theUrl in failedUrls ] )
+    print(f'{refreshed}/{len(refreshUrls)} expiring parks are refreshed, {prefetched}/{len(prefetchUrls)} uncached parks are prefetched', file=sys.stderr)
+  print(f'{len(candidates["expired"])} expired, {len(candidates["expiring"])} expiring in {args.window:g} hours and {len(candidates["missing"])} uncached parks were found', file=sys.stderr)
+
+  if args.stats:
+    Stats.printReport( args.statsFormat )
+  lockFile.close()
+  # let cron report the failed run
+  if not args.dryRun and failedUrls:
+    exit(1)
@@ -1,2 +1,2 @@
 #!/bin/sh
-python3 tozanguchi_list_mountains.py "https://tozanguchinavi.com/mt" "https://tozanguchinavi.com/mt/page/" 2 96 > tozanguchiDic.py
+python3 tozanguchi_list_mountains.py --output tozanguchiDic.py --invalidate "https://tozanguchinavi.com/mt" "https://tozanguchinavi.com/mt/page/" 2 96